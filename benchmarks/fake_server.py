@@ -0,0 +1,349 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" An in-process fake ListenBrainz API server, for benchmarking the client without the network.
+
+The server serves generated data for the endpoints used by the benchmarks, and can be configured
+to add latency, enforce a rate limit with the ``X-RateLimit-*`` headers, and inject 429 and 5xx errors.
+"""
+
+import bisect
+import json
+import random
+import re
+import threading
+import time
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from liblistenbrainz.listen import MAX_LISTENS_PER_REQUEST
+from urllib.parse import parse_qs, urlparse
+
+# the timestamp of the newest generated listen of every user
+NEWEST_LISTEN_TS = 1700000000
+
+_LISTENS = re.compile(r'^/1/user/([^/]+)/listens$')
+_LISTEN_COUNT = re.compile(r'^/1/user/([^/]+)/listen-count$')
+_PLAYING_NOW = re.compile(r'^/1/user/([^/]+)/playing-now$')
+_STATS = re.compile(r'^/1/stats/user/([^/]+)/(artists|recordings|releases)$')
+
+
+def _generate_listen(username, index, listened_at, padding):
+    additional_info = {
+        'recording_mbid': '%08x-0000-4000-8000-%012x' % (index % 5000, index % 5000),
+        'artist_mbids': ['%08x-0000-4000-8000-000000000000' % (index % 300)],
+        'tracknumber': index % 12 + 1,
+        'listening_from': 'benchmark',
+    }
+    if padding:
+        additional_info['padding'] = 'x' * padding
+    return {
+        'listened_at': listened_at,
+        'recording_msid': '%08x-%04x-4000-8000-000000000000' % (index, len(username)),
+        'user_name': username,
+        'track_metadata': {
+            'track_name': 'Track %d' % (index % 5000),
+            'artist_name': 'Artist %d' % (index % 300),
+            'release_name': 'Release %d' % (index % 800),
+            'additional_info': additional_info,
+        },
+    }
+
+
+class FakeListenBrainz:
+    """ A fake ListenBrainz API server running in a background thread.
+
+    Every user has `listens_per_user` listens, one every `listen_spacing` seconds back from
+    ``NEWEST_LISTEN_TS``, and `stats_entities_per_user` entities in each of their stats.
+    The data is generated deterministically and the injected errors are drawn from a random
+    generator seeded with `seed`, so runs are reproducible.
+
+    Use as a context manager, and point a client at :attr:`url`::
+
+        with FakeListenBrainz(latency=0.005) as server:
+            client = liblistenbrainz.ListenBrainz(api_base_url=server.url)
+
+    :param latency: seconds added to the handling of every request
+    :type latency: float, optional
+    :param rate_limit: the number of requests allowed per `rate_limit_window`, None for no limit
+    :type rate_limit: int, optional
+    :param rate_limit_window: the length in seconds of a rate limit window
+    :type rate_limit_window: int, optional
+    :param error_rate: the probability that a request fails with one of `error_statuses`
+    :type error_rate: float, optional
+    :param error_statuses: the status codes of the injected errors
+    :type error_statuses: Tuple[int], optional
+    :param listens_per_user: the number of listens in the history of every user
+    :type listens_per_user: int, optional
+    :param listen_spacing: the number of seconds between two listens, 0 makes all the listens share a timestamp
+    :type listen_spacing: int, optional
+    :param listen_padding: the number of bytes of filler added to the additional_info of every listen
+    :type listen_padding: int, optional
+    :param stats_entities_per_user: the number of entities in the stats of every user
+    :type stats_entities_per_user: int, optional
+    :param no_stats_users: usernames for which stats requests return 204, as if they were not calculated yet
+    :type no_stats_users: Iterable[str], optional
+    :param seed: the seed of the random generator used to inject errors
+    :type seed: int, optional
+    """
+
+    def __init__(
+        self,
+        latency=0,
+        rate_limit=None,
+        rate_limit_window=10,
+        error_rate=0,
+        error_statuses=(429, 500, 503),
+        listens_per_user=1000,
+        listen_spacing=180,
+        listen_padding=0,
+        stats_entities_per_user=1000,
+        no_stats_users=(),
+        seed=0,
+    ):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.error_rate = error_rate
+        self.error_statuses = error_statuses
+        self.listens_per_user = listens_per_user
+        self.listen_spacing = listen_spacing
+        self.listen_padding = listen_padding
+        self.stats_entities_per_user = stats_entities_per_user
+        self.no_stats_users = set(no_stats_users)
+
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._window_started_at = time.monotonic()
+        self._window_requests = 0
+        self._histories = {}
+
+        self.requests = Counter()   # by endpoint pattern
+        self.responses = Counter()  # by status code
+        self.submitted_listens = 0
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+
+    def __enter__(self):
+        self.start()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+        self._thread.start()
+
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests.clear()
+            self.responses.clear()
+            self.submitted_listens = 0
+
+
+    def _history(self, username):
+        """ Returns the timestamps of the listens of user `username`, oldest first, and their encoded JSON. """
+        with self._lock:
+            history = self._histories.get(username)
+        if history is None:
+            count = self.listens_per_user
+            timestamps = [NEWEST_LISTEN_TS - (count - 1 - i) * self.listen_spacing for i in range(count)]
+            encoded = [
+                json.dumps(_generate_listen(username, i, ts, self.listen_padding)).encode('utf-8')
+                for i, ts in enumerate(timestamps)
+            ]
+            history = (timestamps, encoded)
+            with self._lock:
+                self._histories.setdefault(username, history)
+        return history
+
+
+    def _check_limits(self):
+        """ Returns the rate limit headers, and the status code of an injected error or None. """
+        with self._lock:
+            headers = {}
+            if self.rate_limit is not None:
+                now = time.monotonic()
+                if now - self._window_started_at >= self.rate_limit_window:
+                    self._window_started_at = now
+                    self._window_requests = 0
+                self._window_requests += 1
+                reset_in = max(int(self._window_started_at + self.rate_limit_window - now + 0.999), 1)
+                headers = {
+                    'X-RateLimit-Limit': str(self.rate_limit),
+                    'X-RateLimit-Remaining': str(max(self.rate_limit - self._window_requests, 0)),
+                    'X-RateLimit-Reset-In': str(reset_in),
+                }
+                if self._window_requests > self.rate_limit:
+                    return headers, 429
+            if self.error_rate and self._random.random() < self.error_rate:
+                return headers, self._random.choice(self.error_statuses)
+            return headers, None
+
+
+    def handle(self, method, path, params, body):
+        """ Returns the status code, the headers and the body of the response to a request. """
+        if self.latency:
+            time.sleep(self.latency)
+        headers, error_status = self._check_limits()
+        if error_status is not None:
+            self._count('error', error_status)
+            return error_status, headers, json.dumps({'code': error_status, 'error': 'Injected error'}).encode('utf-8')
+
+        if method == 'POST' and path == '/1/submit-listens':
+            listens = len(json.loads(body)['payload'])
+            if listens > MAX_LISTENS_PER_REQUEST:
+                self._count('submit-listens', 400)
+                return 400, headers, json.dumps({'code': 400, 'error': 'Too many listens'}).encode('utf-8')
+            with self._lock:
+                self.submitted_listens += listens
+            return self._respond('submit-listens', headers, {'status': 'ok'})
+
+        if path == '/1/validate-token':
+            return self._respond('validate-token', headers, {'code': 200, 'valid': True, 'user_name': 'benchmark'})
+
+        match = _LISTENS.match(path)
+        if match:
+            return self._listens(match.group(1), params, headers)
+
+        match = _LISTEN_COUNT.match(path)
+        if match:
+            return self._respond('listen-count', headers, {'payload': {'count': self.listens_per_user}})
+
+        match = _PLAYING_NOW.match(path)
+        if match:
+            return self._respond('playing-now', headers, {'payload': {'count': 0, 'listens': [], 'playing_now': True}})
+
+        match = _STATS.match(path)
+        if match:
+            return self._stats(match.group(1), match.group(2), params, headers)
+
+        self._count('unknown', 404)
+        return 404, headers, b'{"code": 404, "error": "Not found"}'
+
+
+    def _count(self, endpoint, status):
+        with self._lock:
+            self.requests[endpoint] += 1
+            self.responses[status] += 1
+
+
+    def _respond(self, endpoint, headers, data):
+        self._count(endpoint, 200)
+        return 200, headers, json.dumps(data).encode('utf-8')
+
+
+    def _listens(self, username, params, headers):
+        timestamps, encoded = self._history(username)
+        count = int(params.get('count', 25))
+        if 'max_ts' in params:
+            end = bisect.bisect_left(timestamps, int(params['max_ts']))
+            start = max(end - count, 0)
+        elif 'min_ts' in params:
+            # the listens right after min_ts
+            start = bisect.bisect_right(timestamps, int(params['min_ts']))
+            end = min(start + count, len(timestamps))
+        else:
+            end = len(timestamps)
+            start = max(end - count, 0)
+
+        page = encoded[start:end][::-1]
+        self._count('listens', 200)
+        body = b'{"payload":{"count":%d,"user_id":%s,"latest_listen_ts":%d,"oldest_listen_ts":%d,"listens":[%s]}}' % (
+            len(page),
+            json.dumps(username).encode('utf-8'),
+            timestamps[-1] if timestamps else 0,
+            timestamps[0] if timestamps else 0,
+            b','.join(page),
+        )
+        return 200, headers, body
+
+
+    def _stats(self, username, entity, params, headers):
+        if username in self.no_stats_users:
+            self._count('stats', 204)
+            return 204, headers, b''
+        count = int(params.get('count', 25))
+        offset = int(params.get('offset', 0))
+        total = self.stats_entities_per_user
+        name_key = {'artists': 'artist_name', 'recordings': 'track_name', 'releases': 'release_name'}[entity]
+        entities = [
+            {name_key: '%s %d' % (entity[:-1].title(), i), 'listen_count': total - i}
+            for i in range(offset, min(offset + count, total))
+        ]
+        return self._respond('stats', headers, {'payload': {
+            entity: entities,
+            'count': len(entities),
+            'offset': offset,
+            'range': params.get('range', 'all_time'),
+            'total_%s_count' % entity[:-1]: total,
+            'user_id': username,
+        }})
+
+
+def _make_handler(server):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # headers and body are written separately, don't let Nagle's algorithm delay the body
+        disable_nagle_algorithm = True
+
+        def _handle(self, method):
+            url = urlparse(self.path)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+
+            status, headers, body = server.handle(method, url.path, params, body)
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            if status != 204:
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if status != 204:
+                self.wfile.write(body)
+
+        def do_GET(self):
+            self._handle('GET')
+
+        def do_POST(self):
+            self._handle('POST')
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
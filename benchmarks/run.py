@@ -0,0 +1,195 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+""" Benchmarks of the hot paths of the client, against an in-process fake ListenBrainz server.
+
+Run all the scenarios with::
+
+    python -m benchmarks.run
+
+or some of them, with a different configuration of the server::
+
+    python -m benchmarks.run export stats --latency 0.02 --error-rate 0.01
+
+Each scenario reports its wall time, the requests per second and the latency percentiles of
+the requests as seen by the client, and with ``--memory`` the peak memory allocated by Python.
+Use ``--json`` to get machine readable results, to compare runs.
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+import tracemalloc
+
+import liblistenbrainz
+
+from benchmarks.fake_server import FakeListenBrainz, NEWEST_LISTEN_TS, _generate_listen
+from liblistenbrainz.utils import _convert_api_payload_to_listen
+
+
+class LatencyRecorder:
+    """ Records the time until the response headers of every request made by a client. """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+
+
+    def install(self, client):
+        client._session.hooks['response'].append(self._record)
+
+
+    def _record(self, response, *args, **kwargs):
+        with self._lock:
+            self.latencies.append(response.elapsed.total_seconds())
+
+
+    def percentiles(self, *percents):
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return {percent: None for percent in percents}
+        return {
+            percent: latencies[min(int(len(latencies) * percent / 100), len(latencies) - 1)]
+            for percent in percents
+        }
+
+
+def _make_client(server, recorder):
+    client = liblistenbrainz.ListenBrainz(api_base_url=server.url, pool_maxsize=32)
+    client.set_auth_token('benchmark', check_validity=False)
+    recorder.install(client)
+    return client
+
+
+def scenario_submit(server, client, options):
+    """ Submit listens in import batches. """
+    listens = [
+        liblistenbrainz.Listen(
+            track_name='Track %d' % i,
+            artist_name='Artist %d' % (i % 300),
+            release_name='Release %d' % (i % 800),
+            listened_at=NEWEST_LISTEN_TS - i,
+            recording_mbid='%08x-0000-4000-8000-%012x' % (i, i),
+        )
+        for i in range(options.listens)
+    ]
+    batches = sum(1 for _ in client.submit_listens_in_batches(listens))
+    return {'listens': server.submitted_listens, 'batches': batches}
+
+
+def scenario_export(server, client, options):
+    """ Export the full listen history of a user. """
+    listens = client.export_listens('benchmark', max_workers=options.workers)
+    return {'listens': len(listens)}
+
+
+def scenario_stats(server, client, options):
+    """ Fetch the stats of many users for every entity and time range. """
+    usernames = ['user%d' % i for i in range(options.users)]
+    results = list(client.iter_users_stats(usernames, max_workers=options.workers))
+    return {'results': len(results), 'errors': sum(1 for result in results if result.error)}
+
+
+def scenario_decode(server, client, options):
+    """ Convert API payloads to listens, without any request. """
+    payloads = [json.loads(json.dumps(_generate_listen('benchmark', i, NEWEST_LISTEN_TS - i, options.padding))) for i in range(options.listens)]
+    started_at = time.perf_counter()
+    listens = [_convert_api_payload_to_listen(payload) for payload in payloads]
+    elapsed = time.perf_counter() - started_at
+    return {'listens': len(listens), 'listens_per_second': round(len(listens) / elapsed)}
+
+
+SCENARIOS = {
+    'submit': scenario_submit,
+    'export': scenario_export,
+    'stats': scenario_stats,
+    'decode': scenario_decode,
+}
+
+
+def run_scenario(name, options):
+    """ Run the scenario `name` against a new fake server, and return its results. """
+    with FakeListenBrainz(
+        latency=options.latency,
+        rate_limit=options.rate_limit,
+        error_rate=options.error_rate,
+        listens_per_user=options.listens,
+        listen_padding=options.padding,
+        stats_entities_per_user=options.entities,
+        seed=options.seed,
+    ) as server:
+        recorder = LatencyRecorder()
+        with _make_client(server, recorder) as client:
+            if options.memory:
+                tracemalloc.start()
+            started_at = time.perf_counter()
+            results = SCENARIOS[name](server, client, options)
+            elapsed = time.perf_counter() - started_at
+            if options.memory:
+                results['peak_memory_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+                tracemalloc.stop()
+
+        requests = sum(server.requests.values())
+        results.update({
+            'scenario': name,
+            'seconds': round(elapsed, 3),
+            'requests': requests,
+            'requests_per_second': round(requests / elapsed, 1),
+            'errors_injected': server.requests['error'],
+        })
+        for percent, latency in recorder.percentiles(50, 90, 99).items():
+            results['p%d_ms' % percent] = None if latency is None else round(latency * 1000, 2)
+        return results
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the liblistenbrainz client against a fake ListenBrainz server.")
+    parser.add_argument('scenarios', nargs='*', help="the scenarios to run, among %s, defaults to all of them" % ", ".join(SCENARIOS))
+    parser.add_argument('--latency', type=float, default=0.002, help="seconds added by the server to every request")
+    parser.add_argument('--rate-limit', type=int, default=None, help="requests allowed by the server per 10 second window")
+    parser.add_argument('--error-rate', type=float, default=0, help="probability that the server fails a request with a 429 or 5xx")
+    parser.add_argument('--listens', type=int, default=10000, help="listens submitted, decoded, or in the history of the user")
+    parser.add_argument('--padding', type=int, default=0, help="bytes of filler added to every listen served")
+    parser.add_argument('--entities', type=int, default=100, help="entities in the stats of every user")
+    parser.add_argument('--users', type=int, default=50, help="users whose stats are fetched")
+    parser.add_argument('--workers', type=int, default=4, help="concurrent requests for the export and stats scenarios")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the injected errors")
+    parser.add_argument('--memory', action='store_true', help="measure the peak memory, this slows the scenarios down")
+    parser.add_argument('--json', action='store_true', help="print the results as JSON lines")
+    options = parser.parse_args(argv)
+    for name in options.scenarios:
+        if name not in SCENARIOS:
+            parser.error("unknown scenario: %s" % name)
+    return options
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    for name in options.scenarios or list(SCENARIOS):
+        results = run_scenario(name, options)
+        if options.json:
+            print(json.dumps(results))
+        else:
+            print(name)
+            for key, value in results.items():
+                if key != 'scenario':
+                    print('  %-22s %s' % (key, value))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
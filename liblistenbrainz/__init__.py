@@ -28,6 +28,20 @@ except PackageNotFoundError:
     # package is not installed?
     __version__ = "unknown"
 
-from liblistenbrainz.client import ListenBrainz
+from liblistenbrainz.archive import ListenArchive
+from liblistenbrainz.batch import ListenBatch
+from liblistenbrainz.cache import MemoryCache, DiskCache
+from liblistenbrainz.client import ListenBrainz, UserStatsResult
+from liblistenbrainz.instrumentation import MetricsCollector, StatsdHook
+from liblistenbrainz.feedback import Feedback, FEEDBACK_HATED, FEEDBACK_LOVED
 from liblistenbrainz.listen import Listen
+from liblistenbrainz.ratelimit import RateLimiter, FileRateLimiter
+from liblistenbrainz.retry import RetryPolicy
+from liblistenbrainz.serialization import JSONSerializer, OrjsonSerializer, UjsonSerializer
 from liblistenbrainz.listen import LISTEN_TYPE_IMPORT, LISTEN_TYPE_PLAYING_NOW, LISTEN_TYPE_SINGLE
+from liblistenbrainz.listen import MAX_LISTENS_PER_REQUEST, MAX_LISTEN_SIZE, MAX_SUBMIT_PAYLOAD_SIZE
+from liblistenbrainz.submitter import MultiUserSubmitter
+from liblistenbrainz.async_client import AsyncListenBrainz
+from liblistenbrainz.spool import SubmissionQueue
+from liblistenbrainz.sync import ListenSync
+from liblistenbrainz.watcher import PlayingNowWatcher, PlayingNowChange
@@ -0,0 +1,319 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import sqlite3
+import threading
+
+from liblistenbrainz.batch import ListenBatch
+from liblistenbrainz.listen import Listen
+from liblistenbrainz.sync import ListenSync
+from liblistenbrainz.utils import _convert_api_payload_to_listen, _listen_identity
+
+# the number of rows read from the database at a time while iterating over the results of a query
+_FETCH_SIZE = 1000
+
+
+class ListenArchive:
+
+    def __init__(self, path, client=None, page_size=100):
+        """ Stores the listens of users in a local SQLite database, to answer questions about their
+        listen history without requesting it from ListenBrainz each time.
+
+        Listens are keyed by user, timestamp and recording MSID (or track and artist names, for
+        listens without one), so storing a listen twice keeps a single copy. The database is indexed
+        for queries by user, by time, by artist name and by recording MBID.
+
+        The archive is filled with :meth:`update`, which only fetches the listens submitted since
+        the previous update of each user, or with :meth:`add`.
+
+        :param path: the path of the database file, created if it does not exist
+        :type path: str
+        :param client: the client used by :meth:`update` to fetch listens, can be None if the
+            archive is only queried
+        :type client: liblistenbrainz.ListenBrainz, optional
+        :param page_size: the number of listens to fetch per request by :meth:`update`, maximum is 100.
+        :type page_size: int, optional
+        """
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS listens (
+                username TEXT NOT NULL,
+                listened_at INTEGER NOT NULL,
+                identity TEXT NOT NULL,
+                track_name TEXT NOT NULL,
+                artist_name TEXT NOT NULL,
+                release_name TEXT,
+                recording_mbid TEXT,
+                release_mbid TEXT,
+                recording_msid TEXT,
+                track_metadata TEXT NOT NULL,
+                PRIMARY KEY (username, listened_at, identity)
+            )
+        """)
+        self._connection.execute("CREATE INDEX IF NOT EXISTS listens_listened_at ON listens (listened_at)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS listens_artist_name ON listens (artist_name, listened_at)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS listens_recording_mbid ON listens (recording_mbid, listened_at)")
+
+        # the high-water marks of the users are kept in the same database as their listens
+        self._sync = ListenSync(path, client, page_size=page_size) if client is not None else None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def __len__(self):
+        return self.get_listen_count()
+
+
+    def add(self, listens, username=None):
+        """ Store listens in the archive. Listens that are already stored are ignored.
+
+        :param listens: the listens to store, they must have a `listened_at` timestamp
+        :type listens: Iterable[liblistenbrainz.Listen]
+        :param username: the user the listens belong to, defaults to the `username` of each listen
+        :type username: str, optional
+        :return: the number of listens that were not already stored
+        :rtype: int
+        :raises ValueError: if a listen has no `listened_at` timestamp or no user
+        """
+        rows = []
+        for listen in listens:
+            listen_username = username or listen.username
+            if listen.listened_at is None or not listen_username:
+                raise ValueError("Archived listens must have a listened_at timestamp and a username")
+            rows.append((
+                listen_username,
+                listen.listened_at,
+                json.dumps(_listen_identity(listen)),
+                listen.track_name,
+                listen.artist_name,
+                listen.release_name,
+                listen.recording_mbid,
+                listen.release_mbid,
+                listen.recording_msid,
+                json.dumps(listen._to_submit_payload()['track_metadata'], separators=(',', ':')),
+            ))
+
+        with self._lock:
+            before = self._connection.total_changes
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.executemany("INSERT OR IGNORE INTO listens VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+            return self._connection.total_changes - before
+
+
+    def update(self, username):
+        """ Fetch the listens that user `username` submitted since the previous update and store them.
+
+        The first update of a user fetches their whole listen history. See :class:`~liblistenbrainz.ListenSync`
+        for how the listens to fetch are found.
+
+        :param username: the username of the user
+        :type username: str
+        :return: the number of listens that were added to the archive
+        :rtype: int
+        :raises ListenBrainzAPIException: if the ListenBrainz API returns a non 2xx return code,
+            nothing is added then
+        """
+        return self._update([username], skip_errors=False)
+
+
+    def update_many(self, usernames):
+        """ Update the listens of several users, see :meth:`update`.
+
+        Users whose listens cannot be fetched are logged and skipped, see
+        :meth:`liblistenbrainz.ListenSync.iter_new_listens`.
+
+        :param usernames: the usernames of the users
+        :type usernames: Iterable[str]
+        :return: the number of listens that were added to the archive
+        :rtype: int
+        """
+        return self._update(usernames, skip_errors=True)
+
+
+    def _update(self, usernames, skip_errors):
+        if self._sync is None:
+            raise ValueError("A client is needed to update the archive")
+        added = 0
+        # the high-water mark of a user only moves once their listens have been stored
+        for username, listens in self._sync.iter_new_listens(usernames, skip_errors=skip_errors):
+            added += self.add(listens, username=username)
+        return added
+
+
+    def update_all(self):
+        """ Update the listens of every user that was updated before, see :meth:`update`.
+
+        :return: the number of listens that were added to the archive
+        :rtype: int
+        """
+        return self.update_many(self.get_usernames())
+
+
+    def get_usernames(self):
+        """ Get the users with listens in the archive, or that were updated.
+
+        :rtype: List[str]
+        """
+        query = "SELECT DISTINCT username FROM listens"
+        if self._sync is not None:
+            query += " UNION SELECT username FROM high_water_marks"
+        with self._lock:
+            rows = self._connection.execute(query + " ORDER BY username").fetchall()
+        return [row[0] for row in rows]
+
+
+    def _where(self, username, artist_name, recording_mbid, min_ts, max_ts):
+        conditions, parameters = [], []
+        for column, value in (('username', username), ('artist_name', artist_name), ('recording_mbid', recording_mbid)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        # like the API, min_ts and max_ts are excluded
+        if min_ts is not None:
+            conditions.append("listened_at > ?")
+            parameters.append(min_ts)
+        if max_ts is not None:
+            conditions.append("listened_at < ?")
+            parameters.append(max_ts)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return where, parameters
+
+
+    def _iter_rows(self, columns, username, artist_name, recording_mbid, min_ts, max_ts, newest_first, limit):
+        where, parameters = self._where(username, artist_name, recording_mbid, min_ts, max_ts)
+        order = "DESC" if newest_first else "ASC"
+        query = f"SELECT {columns} FROM listens{where} ORDER BY listened_at {order}"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+
+        with self._lock:
+            cursor = self._connection.execute(query, parameters)
+        try:
+            while True:
+                with self._lock:
+                    rows = cursor.fetchmany(_FETCH_SIZE)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            with self._lock:
+                cursor.close()
+
+
+    def iter_listens(self, username=None, artist_name=None, recording_mbid=None, min_ts=None, max_ts=None, newest_first=True, limit=None):
+        """ Iterate over the stored listens that match all the given filters.
+
+        The listens are read from the database a thousand at a time as the iterator advances, so the
+        whole result does not have to fit in memory.
+
+        :param username: only return the listens of this user
+        :type username: str, optional
+        :param artist_name: only return the listens of tracks by an artist with exactly this name
+        :type artist_name: str, optional
+        :param recording_mbid: only return the listens of this recording
+        :type recording_mbid: str, optional
+        :param min_ts: only return listens with listened_at greater than this timestamp
+        :type min_ts: int, optional
+        :param max_ts: only return listens with listened_at less than this timestamp
+        :type max_ts: int, optional
+        :param newest_first: whether the newest or the oldest listens come first
+        :type newest_first: bool, optional
+        :param limit: the maximum number of listens to return, None for all of them
+        :type limit: int, optional
+        :rtype: Iterator[liblistenbrainz.Listen]
+        """
+        rows = self._iter_rows(
+            "username, listened_at, recording_msid, track_metadata",
+            username, artist_name, recording_mbid, min_ts, max_ts, newest_first, limit,
+        )
+        for listen_username, listened_at, recording_msid, track_metadata in rows:
+            yield _convert_api_payload_to_listen({
+                'username': listen_username,
+                'listened_at': listened_at,
+                'recording_msid': recording_msid,
+                'track_metadata': json.loads(track_metadata),
+            })
+
+
+    def get_listens(self, username=None, artist_name=None, recording_mbid=None, min_ts=None, max_ts=None, newest_first=True, limit=None):
+        """ Get the stored listens that match all the given filters, see :meth:`iter_listens`.
+
+        :rtype: List[liblistenbrainz.Listen]
+        """
+        return list(self.iter_listens(username, artist_name, recording_mbid, min_ts, max_ts, newest_first, limit))
+
+
+    def get_listen_batch(self, username=None, artist_name=None, recording_mbid=None, min_ts=None, max_ts=None, newest_first=True, limit=None):
+        """ Get the stored listens that match all the given filters as a :class:`~liblistenbrainz.ListenBatch`,
+        see :meth:`iter_listens` for the filters.
+
+        Only the fields kept by the batch are read from the database, which is much faster than
+        building the batch from the listens returned by :meth:`get_listens`. Requires NumPy.
+
+        :rtype: liblistenbrainz.ListenBatch
+        """
+        rows = self._iter_rows(
+            "username, listened_at, track_name, artist_name, release_name, recording_mbid, release_mbid, recording_msid",
+            username, artist_name, recording_mbid, min_ts, max_ts, newest_first, limit,
+        )
+        return ListenBatch.from_listens(
+            Listen(
+                username=row[0],
+                listened_at=row[1],
+                track_name=row[2],
+                artist_name=row[3],
+                release_name=row[4],
+                recording_mbid=row[5],
+                release_mbid=row[6],
+                recording_msid=row[7],
+            )
+            for row in rows
+        )
+
+
+    def get_listen_count(self, username=None, artist_name=None, recording_mbid=None, min_ts=None, max_ts=None):
+        """ Get the number of stored listens that match all the given filters, see :meth:`iter_listens`.
+
+        :rtype: int
+        """
+        where, parameters = self._where(username, artist_name, recording_mbid, min_ts, max_ts)
+        with self._lock:
+            return self._connection.execute(f"SELECT count(*) FROM listens{where}", parameters).fetchone()[0]
+
+
+    def close(self):
+        """ Close the database. """
+        if self._sync is not None:
+            self._sync.close()
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,224 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import copy
+import functools
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from liblistenbrainz import errors
+from liblistenbrainz.client import ListenBrainz, API_BASE_URL, DEFAULT_POOL_CONNECTIONS, DEFAULT_TIMEOUT
+from liblistenbrainz.instrumentation import RateLimitWaitEvent
+
+DEFAULT_MAX_CONCURRENCY = 32
+
+# methods of ListenBrainz that are exposed as coroutines on AsyncListenBrainz
+_COROUTINE_METHODS = (
+    'set_auth_token',
+    'is_token_valid',
+    'submit_multiple_listens',
+    'submit_single_listen',
+    'submit_playing_now',
+    'submit_user_feedback',
+    'submit_user_feedback_bulk',
+    'delete_listen',
+    'get_playing_now',
+    'get_listens',
+    'export_listens',
+    'get_user_artists',
+    'get_user_recordings',
+    'get_user_releases',
+    'get_user_top_entities',
+    'get_user_recommendation_recordings',
+    'get_user_listen_count',
+    'get_user_feedback',
+)
+
+# generator methods of ListenBrainz that are exposed as async generators on AsyncListenBrainz
+_ASYNC_GENERATOR_METHODS = (
+    'submit_listens_in_batches',
+    'iter_listens',
+    'iter_listens_sharded',
+    'stream_listens',
+    'iter_user_feedback',
+    'iter_users_stats',
+)
+
+_EXHAUSTED = object()
+
+
+class AsyncListenBrainz:
+
+    def __init__(
+        self,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        session=None,
+        rate_limiter=None,
+        cache=None,
+        cache_ttls=None,
+        serializer=None,
+        api_base_url=API_BASE_URL,
+        hooks=None,
+        retry_policy=None,
+        timeout=DEFAULT_TIMEOUT,
+        deadline=None,
+    ):
+        """ Creates an asyncio ListenBrainz client.
+
+        ``AsyncListenBrainz`` has the same methods as :class:`~liblistenbrainz.ListenBrainz`, as
+        coroutines (or async generators, for methods that return iterators). Requests are made
+        over a connection pool shared by all calls and run on a pool of `max_concurrency` threads,
+        so up to that many requests can be in flight at once without blocking the event loop.
+        Waiting for the rate limit to reset is done with ``asyncio.sleep``.
+
+        The other arguments are the same as the ones of :meth:`liblistenbrainz.ListenBrainz.__init__`.
+
+        :param max_concurrency: the maximum number of requests in flight at the same time
+        :type max_concurrency: int, optional
+        :param session: a session to use for all requests instead of the one created by the client.
+            The client does not close a session passed in this way.
+        :type session: requests.Session, optional
+        :param rate_limiter: the rate limiter used to pace requests, can be shared with other clients
+        :type rate_limiter: liblistenbrainz.RateLimiter, optional
+        :param cache: a cache for the responses of the stats, recommendation and listen count endpoints
+        :type cache: liblistenbrainz.MemoryCache, optional
+        :param cache_ttls: the number of seconds responses are cached for, by endpoint group
+        :type cache_ttls: dict, optional
+        :param serializer: the JSON serializer used for request and response bodies
+        :type serializer: liblistenbrainz.JSONSerializer, optional
+        :param api_base_url: the root URL of the ListenBrainz API
+        :type api_base_url: str, optional
+        :param hooks: callables that are passed an event after each request
+        :type hooks: Iterable[Callable], optional
+        :param retry_policy: how failed requests are retried
+        :type retry_policy: liblistenbrainz.RetryPolicy, optional
+        :param timeout: the connect and read timeouts of each request
+        :type timeout: float or Tuple[float, float], optional
+        :param deadline: the maximum number of seconds a request can take once it has started running,
+            including its retries, None for no limit. Use :func:`asyncio.wait_for` to also bound the time
+            spent waiting for a free thread.
+        :type deadline: float, optional
+        """
+        self._client = ListenBrainz(
+            session=session,
+            pool_connections=DEFAULT_POOL_CONNECTIONS,
+            pool_maxsize=max_concurrency,
+            rate_limiter=rate_limiter,
+            cache=cache,
+            cache_ttls=cache_ttls,
+            serializer=serializer,
+            api_base_url=api_base_url,
+            hooks=hooks,
+            retry_policy=retry_policy,
+            timeout=timeout,
+            deadline=deadline,
+        )
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._owns_executor = True
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def close(self):
+        """ Wait for requests in flight to finish and release the pooled connections. """
+        if self._owns_executor:
+            self._executor.shutdown(wait=True)
+        self._client.close()
+
+
+    def with_timeout(self, timeout=None, deadline=None):
+        """ Get a client that shares the threads, session, rate limiter, cache and hooks of this one,
+        with other timeouts, see :meth:`liblistenbrainz.ListenBrainz.with_timeout`.
+
+        Waiting for the rate limit to reset is bounded by the deadline too.
+
+        :rtype: AsyncListenBrainz
+        """
+        client = copy.copy(self)
+        client._client = self._client.with_timeout(timeout=timeout, deadline=deadline)
+        # the threads belong to this client, they must not be stopped with the copy
+        client._owns_executor = False
+        return client
+
+
+    def add_hook(self, hook):
+        """ Add a hook, see :meth:`liblistenbrainz.ListenBrainz.add_hook`. """
+        self._client.add_hook(hook)
+
+
+    def remove_hook(self, hook):
+        """ Remove a hook added with :meth:`add_hook`. """
+        self._client.remove_hook(hook)
+
+
+    async def _wait_until_rate_limit(self):
+        waited = 0
+        delay = self._client._rate_limit_delay()
+        while delay > 0:
+            deadline_at = self._client._deadline_at
+            if deadline_at is not None and time.monotonic() + delay > deadline_at:
+                raise errors.ListenBrainzTimeoutException("Timed out waiting for the rate limit to reset")
+            await asyncio.sleep(delay)
+            waited += delay
+            delay = self._client._rate_limit_delay()
+        if waited and self._client._hooks:
+            self._client._emit(RateLimitWaitEvent(duration=waited))
+
+
+    async def _run(self, func, *args, **kwargs):
+        await self._wait_until_rate_limit()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+
+    async def _iterate(self, iterator):
+        while True:
+            item = await self._run(next, iterator, _EXHAUSTED)
+            if item is _EXHAUSTED:
+                return
+            yield item
+
+
+def _make_coroutine_method(name):
+    method = getattr(ListenBrainz, name)
+
+    @functools.wraps(method)
+    async def coroutine_method(self, *args, **kwargs):
+        return await self._run(getattr(self._client, name), *args, **kwargs)
+    return coroutine_method
+
+
+def _make_async_generator_method(name):
+    method = getattr(ListenBrainz, name)
+
+    @functools.wraps(method)
+    def async_generator_method(self, *args, **kwargs):
+        return self._iterate(getattr(self._client, name)(*args, **kwargs))
+    return async_generator_method
+
+
+for _name in _COROUTINE_METHODS:
+    setattr(AsyncListenBrainz, _name, _make_coroutine_method(_name))
+
+for _name in _ASYNC_GENERATOR_METHODS:
+    setattr(AsyncListenBrainz, _name, _make_async_generator_method(_name))
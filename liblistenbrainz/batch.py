@@ -0,0 +1,258 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import uuid
+
+from liblistenbrainz import errors
+from liblistenbrainz.listen import Listen
+
+try:
+    import numpy as np
+except ImportError:
+    # numpy is an optional dependency, only needed for ListenBatch
+    np = None
+
+# stored in the listened_at column for listens without a timestamp
+MISSING_TIMESTAMP = -1
+
+# stored in the code columns of dictionary encoded strings for missing values
+_MISSING_CODE = -1
+
+_STRING_COLUMNS = ('track_name', 'artist_name', 'release_name', 'username')
+_MBID_COLUMNS = ('recording_mbid', 'release_mbid', 'recording_msid')
+
+
+def _encode_mbid(value):
+    # MBIDs are stored as their 16 raw bytes, anything that is not a UUID is stored as missing
+    try:
+        return uuid.UUID(value).bytes
+    except (TypeError, ValueError, AttributeError):
+        return b''
+
+
+def _decode_mbid(value):
+    # numpy strips trailing null bytes from fixed-width bytes
+    if not value:
+        return None
+    return str(uuid.UUID(bytes=value.ljust(16, b'\0')))
+
+
+class ListenBatch:
+    """ A column-oriented collection of listens, for filtering and aggregating large numbers of listens.
+
+    Timestamps are stored in a NumPy ``int64`` array, track, artist and release names and usernames
+    are dictionary encoded (an ``int32`` array of codes into a list of distinct values), and MBIDs
+    are stored as 16 byte fixed-width bytes. Only these fields are kept: tags, additional_info and
+    the other optional fields of a :class:`~liblistenbrainz.Listen` are dropped.
+
+    Requires NumPy (``pip install liblistenbrainz[analytics]``). Create batches with :meth:`from_listens`.
+    """
+
+    def __init__(self, listened_at, codes, dictionaries, mbids):
+        if np is None:
+            raise errors.ListenBrainzException("ListenBatch requires numpy, install it with `pip install liblistenbrainz[analytics]`")
+        self.listened_at = listened_at
+        self._codes = codes
+        self._dictionaries = dictionaries
+        self._mbids = mbids
+
+
+    @classmethod
+    def from_listens(cls, listens):
+        """ Create a batch from listens.
+
+        :param listens: the listens
+        :type listens: Iterable[liblistenbrainz.Listen]
+        :rtype: ListenBatch
+        """
+        if np is None:
+            raise errors.ListenBrainzException("ListenBatch requires numpy, install it with `pip install liblistenbrainz[analytics]`")
+
+        timestamps = []
+        codes = {name: [] for name in _STRING_COLUMNS}
+        lookups = {name: {} for name in _STRING_COLUMNS}
+        mbids = {name: [] for name in _MBID_COLUMNS}
+        for listen in listens:
+            timestamps.append(MISSING_TIMESTAMP if listen.listened_at is None else listen.listened_at)
+            for name in _STRING_COLUMNS:
+                value = getattr(listen, name)
+                if value is None:
+                    codes[name].append(_MISSING_CODE)
+                else:
+                    lookup = lookups[name]
+                    codes[name].append(lookup.setdefault(value, len(lookup)))
+            for name in _MBID_COLUMNS:
+                mbids[name].append(_encode_mbid(getattr(listen, name)))
+
+        return cls(
+            listened_at=np.array(timestamps, dtype=np.int64),
+            codes={name: np.array(values, dtype=np.int32) for name, values in codes.items()},
+            dictionaries={name: list(lookup) for name, lookup in lookups.items()},
+            mbids={name: np.array(values, dtype='S16') for name, values in mbids.items()},
+        )
+
+
+    def __len__(self):
+        return len(self.listened_at)
+
+
+    def to_listens(self):
+        """ Convert the batch back to listens.
+
+        :rtype: List[liblistenbrainz.Listen]
+        """
+        columns = {name: self.column(name) for name in _STRING_COLUMNS + _MBID_COLUMNS}
+        return [
+            Listen(
+                listened_at=None if ts == MISSING_TIMESTAMP else int(ts),
+                **{name: values[i] for name, values in columns.items()}
+            )
+            for i, ts in enumerate(self.listened_at)
+        ]
+
+
+    def column(self, name):
+        """ Get the decoded values of a column.
+
+        :param name: the name of a Listen field stored in the batch, like ``'artist_name'`` or ``'recording_mbid'``
+        :type name: str
+        :return: the values of the column, with None for missing values
+        :rtype: list
+        """
+        if name == 'listened_at':
+            return [None if ts == MISSING_TIMESTAMP else int(ts) for ts in self.listened_at]
+        if name in self._mbids:
+            return [_decode_mbid(value) for value in self._mbids[name]]
+        dictionary = self._dictionaries[name]
+        return [None if code == _MISSING_CODE else dictionary[code] for code in self._codes[name]]
+
+
+    def take(self, selection):
+        """ Create a batch from a subset of the listens of this batch.
+
+        The new batch shares the string dictionaries of this batch.
+
+        :param selection: a boolean mask or an array of indices
+        :type selection: numpy.ndarray
+        :rtype: ListenBatch
+        """
+        return ListenBatch(
+            listened_at=self.listened_at[selection],
+            codes={name: codes[selection] for name, codes in self._codes.items()},
+            dictionaries=self._dictionaries,
+            mbids={name: mbids[selection] for name, mbids in self._mbids.items()},
+        )
+
+
+    def filter_time_range(self, min_ts=None, max_ts=None):
+        """ Get the listens with listened_at between `min_ts` and `max_ts`, both excluded, like :meth:`~liblistenbrainz.ListenBrainz.get_listens`.
+
+        :rtype: ListenBatch
+        """
+        mask = self.listened_at != MISSING_TIMESTAMP
+        if min_ts is not None:
+            mask &= self.listened_at > min_ts
+        if max_ts is not None:
+            mask &= self.listened_at < max_ts
+        return self.take(mask)
+
+
+    def _mask_equal(self, name, value):
+        try:
+            code = self._dictionaries[name].index(value)
+        except ValueError:
+            return np.zeros(len(self), dtype=bool)
+        return self._codes[name] == code
+
+
+    def filter_artist(self, artist_name):
+        """ Get the listens of the artist `artist_name`.
+
+        :rtype: ListenBatch
+        """
+        return self.take(self._mask_equal('artist_name', artist_name))
+
+
+    def filter_recording(self, recording_mbid):
+        """ Get the listens of the recording with MBID `recording_mbid`. The batch is empty if
+        `recording_mbid` is not a valid MBID.
+
+        :rtype: ListenBatch
+        """
+        mbid = _encode_mbid(recording_mbid)
+        if not mbid:
+            # listens without a recording MBID are stored as empty bytes too
+            return self.take(np.zeros(len(self), dtype=bool))
+        return self.take(self._mbids['recording_mbid'] == mbid)
+
+
+    def sort_by_time(self, descending=True):
+        """ Sort the listens by listened_at, newest first unless `descending` is False.
+
+        :rtype: ListenBatch
+        """
+        # listens with the same timestamp keep their order in both directions
+        order = np.argsort(-self.listened_at if descending else self.listened_at, kind='stable')
+        return self.take(order)
+
+
+    def count_by(self, name):
+        """ Count the listens for each value of the dictionary encoded column `name`,
+        for example ``batch.count_by('artist_name')``.
+
+        :return: the number of listens for each value, in descending order of count
+        :rtype: List[Tuple[str, int]]
+        """
+        codes = self._codes[name]
+        counts = np.bincount(codes[codes != _MISSING_CODE], minlength=len(self._dictionaries[name]))
+        order = np.argsort(-counts, kind='stable')
+        dictionary = self._dictionaries[name]
+        return [(dictionary[code], int(counts[code])) for code in order if counts[code] > 0]
+
+
+    def to_pandas(self):
+        """ Convert the batch to a pandas DataFrame, with categorical columns for the dictionary encoded strings.
+
+        Requires pandas.
+
+        :rtype: pandas.DataFrame
+        """
+        import pandas as pd
+
+        data = {'listened_at': self.listened_at}
+        for name, codes in self._codes.items():
+            data[name] = pd.Categorical.from_codes(codes, categories=self._dictionaries[name])
+        for name in self._mbids:
+            data[name] = self.column(name)
+        return pd.DataFrame(data)
+
+
+    def to_arrow(self):
+        """ Convert the batch to a pyarrow Table, with dictionary arrays for the dictionary encoded strings.
+
+        Requires pyarrow.
+
+        :rtype: pyarrow.Table
+        """
+        import pyarrow as pa
+
+        arrays = {'listened_at': pa.array(self.listened_at)}
+        for name, codes in self._codes.items():
+            indices = pa.array(codes, mask=codes == _MISSING_CODE)
+            arrays[name] = pa.DictionaryArray.from_arrays(indices, pa.array(self._dictionaries[name], type=pa.string()))
+        for name in self._mbids:
+            arrays[name] = pa.array(self.column(name), type=pa.string())
+        return pa.table(arrays)
@@ -0,0 +1,162 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import copy
+import json
+import re
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict, namedtuple
+
+# endpoints whose responses can be cached, grouped so that they share a TTL
+CACHEABLE_ENDPOINTS = (
+    ('stats', re.compile(r'^/1/stats/')),
+    ('recommendations', re.compile(r'^/1/cf/recommendation/')),
+    ('listen_count', re.compile(r'^/1/user/[^/]+/listen-count$')),
+)
+
+# TTLs in seconds, stats are only recalculated daily by ListenBrainz
+DEFAULT_CACHE_TTLS = {
+    'stats': 60 * 60,
+    'recommendations': 60 * 60,
+    'listen_count': 60,
+}
+
+DEFAULT_CACHE_MAXSIZE = 1024
+
+CacheEntry = namedtuple('CacheEntry', ['data', 'expires_at', 'etag', 'last_modified'])
+
+
+def _get_cache_group(endpoint):
+    for group, pattern in CACHEABLE_ENDPOINTS:
+        if pattern.match(endpoint):
+            return group
+    return None
+
+
+def _make_cache_key(api_base_url, endpoint, params):
+    # clients of different ListenBrainz servers can share a cache
+    return json.dumps([api_base_url, endpoint, sorted(params.items())], default=str)
+
+
+class MemoryCache:
+    """ An in-memory LRU cache of API responses.
+
+    Responses are copied when they are stored and when they are returned, so callers can modify
+    them without changing the cached ones.
+
+    :param maxsize: the maximum number of responses kept in the cache
+    :type maxsize: int, optional
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_MAXSIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        return entry._replace(data=copy.deepcopy(entry.data))
+
+
+    def set(self, key, entry):
+        entry = entry._replace(data=copy.deepcopy(entry.data))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskCache:
+    """ An LRU cache of API responses stored in an SQLite database, so that it survives restarts
+    and can be shared by several processes.
+
+    :param path: the path of the database file, created if it does not exist
+    :type path: str
+    :param maxsize: the maximum number of responses kept in the cache
+    :type maxsize: int, optional
+    """
+
+    def __init__(self, path, maxsize=DEFAULT_CACHE_MAXSIZE):
+        self.path = path
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._connection.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+
+
+    def get(self, key):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT data, expires_at, etag, last_modified FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        data, expires_at, etag, last_modified = row
+        return CacheEntry(json.loads(data), expires_at, etag, last_modified)
+
+
+    def set(self, key, entry):
+        data = json.dumps(entry.data)
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO cache (key, data, expires_at, etag, last_modified, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, data, entry.expires_at, entry.etag, entry.last_modified, time.time()),
+                )
+                self._connection.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.maxsize,),
+                )
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM cache")
+
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
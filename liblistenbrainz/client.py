@@ -14,21 +14,47 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-import json
+import copy
+import itertools
+import logging
+import re
 import requests
 from requests.adapters import HTTPAdapter
 import time
-from urllib3.util import Retry
 
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime
 from enum import Enum
 from liblistenbrainz import errors
+from liblistenbrainz.cache import CacheEntry, DEFAULT_CACHE_TTLS, _get_cache_group, _make_cache_key
+from liblistenbrainz.instrumentation import RateLimitWaitEvent, RequestEvent
 from liblistenbrainz.listen import LISTEN_TYPE_IMPORT, LISTEN_TYPE_PLAYING_NOW, LISTEN_TYPE_SINGLE
+from liblistenbrainz.listen import MAX_LISTENS_PER_REQUEST, MAX_SUBMIT_PAYLOAD_SIZE
+from liblistenbrainz.ratelimit import RateLimiter
+from liblistenbrainz.retry import RetryPolicy
+from liblistenbrainz.serialization import get_default_serializer
 from liblistenbrainz.utils import _validate_submit_listens_payload, _convert_api_payload_to_listen
+from liblistenbrainz.utils import _batch_listens_for_submission, _encode_submit_listens_body
+from liblistenbrainz.utils import _convert_api_payload_to_feedback, _listen_identity, _map_concurrently, _prefetch
+from liblistenbrainz.utils import _decode_utf8_chunks, _iter_streamed_json_array
 from urllib.parse import urljoin
+from urllib3.exceptions import ReadTimeoutError
 
-retry_strategy = Retry(total=5, allowed_methods=('GET', 'POST'), status_forcelist=[429, 500, 502, 503, 504])
-adapter = HTTPAdapter(max_retries=retry_strategy)
+# seconds to wait for a connection to be opened, and between two bytes of a response
+DEFAULT_TIMEOUT = (10, 60)
+
+# defaults for the connection pool owned by each client, see ListenBrainz.__init__
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+
+UserStatsResult = namedtuple('UserStatsResult', ['username', 'entity', 'time_range', 'data', 'error'])
+
+STATS_TOP_ENTITIES = (
+    'artists',
+    'recordings',
+    'releases',
+)
 
 STATS_SUPPORTED_TIME_RANGES = (
     'week',
@@ -43,43 +69,240 @@ STATS_SUPPORTED_TIME_RANGES = (
 )
 
 
+logger = logging.getLogger(__name__)
+
 API_BASE_URL = 'https://api.listenbrainz.org'
 
+# size of the chunks in which streamed response bodies are read
+STREAM_CHUNK_SIZE = 16 * 1024
+
+_LISTENS_ARRAY_START = re.compile(r'"listens"\s*:\s*\[')
+
+def _iter_response_content(response, chunk_size):
+    # requests raises a ConnectionError when reading the body of a streamed response times out
+    try:
+        yield from response.iter_content(chunk_size=chunk_size)
+    except requests.ConnectionError as e:
+        if e.args and isinstance(e.args[0], ReadTimeoutError):
+            raise errors.ListenBrainzTimeoutException("Reading the response body timed out") from e
+        raise
+
+
+def _clamp_timeout(timeout, maximum):
+    """ Returns the requests `timeout` with both the connect and read timeouts at most `maximum`. """
+    if timeout is None:
+        return maximum
+    if isinstance(timeout, tuple):
+        return tuple(maximum if t is None else min(t, maximum) for t in timeout)
+    return min(timeout, maximum)
+
+
 class ListenBrainz:
 
-    def __init__(self):
+    def __init__(
+        self,
+        session=None,
+        pool_connections=DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        pool_block=False,
+        keep_alive=True,
+        rate_limiter=None,
+        cache=None,
+        cache_ttls=None,
+        serializer=None,
+        api_base_url=API_BASE_URL,
+        hooks=None,
+        retry_policy=None,
+        timeout=DEFAULT_TIMEOUT,
+        deadline=None,
+    ):
+        """ Creates a ListenBrainz client.
+
+        The client owns a ``requests.Session`` with a connection pool that is shared by all
+        endpoints, so consecutive requests reuse the same TCP/TLS connections. Call :meth:`close`
+        (or use the client as a context manager) to release the pooled connections.
+
+        :param session: a session to use for all requests instead of the one created by the client.
+            The client does not configure or close a session passed in this way.
+        :type session: requests.Session, optional
+        :param pool_connections: the number of hosts for which connection pools are cached
+        :type pool_connections: int, optional
+        :param pool_maxsize: the maximum number of connections kept alive per host, this should be
+            at least the number of threads using the client concurrently
+        :type pool_maxsize: int, optional
+        :param pool_block: if True, block when all ``pool_maxsize`` connections to a host are in use
+            instead of opening extra connections that are discarded afterwards
+        :type pool_block: bool, optional
+        :param keep_alive: if False, connections are closed after every request
+        :type keep_alive: bool, optional
+        :param rate_limiter: the rate limiter used to pace requests, defaults to a new
+            :class:`~liblistenbrainz.RateLimiter`. Pass the same rate limiter to several clients,
+            or a :class:`~liblistenbrainz.FileRateLimiter`, to make them share a budget.
+        :type rate_limiter: liblistenbrainz.RateLimiter, optional
+        :param cache: a cache for the responses of the stats, recommendation and listen count endpoints,
+            for example :class:`~liblistenbrainz.MemoryCache` or :class:`~liblistenbrainz.DiskCache`.
+            Responses are not cached by default.
+        :type cache: liblistenbrainz.MemoryCache, optional
+        :param cache_ttls: the number of seconds responses are cached for, by endpoint group
+            (``'stats'``, ``'recommendations'`` or ``'listen_count'``), overriding ``DEFAULT_CACHE_TTLS``.
+            A TTL of 0 disables caching for the group.
+        :type cache_ttls: dict, optional
+        :param serializer: the JSON serializer used for request and response bodies, defaults to
+            the fastest one installed, see :func:`~liblistenbrainz.serialization.get_default_serializer`
+        :type serializer: liblistenbrainz.JSONSerializer, optional
+        :param api_base_url: the root URL of the ListenBrainz API, to use another ListenBrainz server
+            or a local development one
+        :type api_base_url: str, optional
+        :param hooks: callables that are passed an event after each request, see :meth:`add_hook`
+        :type hooks: Iterable[Callable], optional
+        :param retry_policy: how failed requests are retried, defaults to :class:`~liblistenbrainz.RetryPolicy`
+            with its default settings
+        :type retry_policy: liblistenbrainz.RetryPolicy, optional
+        :param timeout: the number of seconds to wait for a connection to be opened and then between two
+            bytes of a response, as a (connect, read) tuple or a single number for both, None to wait forever
+        :type timeout: float or Tuple[float, float], optional
+        :param deadline: the maximum number of seconds a request can take, including the waits for the
+            rate limit to reset and the retries, None for no limit. See also :meth:`with_timeout`.
+        :type deadline: float, optional
+        """
         self._auth_token = None
+        self.api_base_url = api_base_url
 
-        # initialize rate limit variables with None
+        if session is None:
+            self._session = self._create_session(pool_connections, pool_maxsize, pool_block, keep_alive)
+            self._owns_session = True
+        else:
+            self._session = session
+            self._owns_session = False
+
+        self._rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self._cache = cache
+        self._serializer = serializer if serializer is not None else get_default_serializer()
+        self._cache_ttls = dict(DEFAULT_CACHE_TTLS, **(cache_ttls or {}))
+        self._hooks = list(hooks or ())
+        self._retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self._timeout = timeout
+        self._deadline = deadline
+        self._deadline_at = None
+
+        # initialize rate limit variables with None, these only report the
+        # state of the last request, the rate limiter does the waiting
         self._last_request_ts = None
         self.remaining_requests = None
         self.ratelimit_reset_in = None
 
 
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    @staticmethod
+    def _create_session(pool_connections, pool_maxsize, pool_block, keep_alive):
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+        )
+        session = requests.Session()
+        session.mount("http://", adapter) # http is not used, but in case someone needs to use to for dev work, its included here
+        session.mount("https://", adapter)
+        if not keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+
+    def close(self):
+        """ Close the pooled connections of this client.
+
+        Sessions passed in by the caller are left open.
+        """
+        if self._owns_session:
+            self._session.close()
+
+
     def _require_auth_token(self):
         if not self._auth_token:
             raise errors.AuthTokenRequiredException
 
 
-    def _wait_until_rate_limit(self):
-        # if we haven't made any request before this, return
-        if self._last_request_ts is None:
-            return
+    def _rate_limit_delay(self):
+        """ Returns the number of seconds to wait before the next request can be made. """
+        return self._rate_limiter.delay()
 
-        # if we have available requests in this window, return
-        if self.remaining_requests and self.remaining_requests > 0:
-            return
 
-        # if we don't have available requests and we know when the
-        # window is reset, backoff until the window gets reset
-        if self.ratelimit_reset_in is not None:
-            reset_ts = self._last_request_ts + self.ratelimit_reset_in
-            current_ts = int(time.time())
-            if current_ts < reset_ts:
-                time.sleep(reset_ts - current_ts)
+    def with_timeout(self, timeout=None, deadline=None):
+        """ Get a client that shares the session, rate limiter, cache and hooks of this one,
+        with other timeouts.
+
+        Use it to bound the time taken by one call, or a group of calls, including the ones that make
+        many requests like :meth:`export_listens`::
+
+            listens = client.with_timeout(deadline=60).export_listens('iliekcomputers')
+
+        :param timeout: the connect and read timeouts of the requests, see :meth:`__init__`,
+            defaults to the ones of this client
+        :type timeout: float or Tuple[float, float], optional
+        :param deadline: the number of seconds from now after which requests made with the returned
+            client fail with a :class:`~liblistenbrainz.errors.ListenBrainzTimeoutException`
+        :type deadline: float, optional
+        :rtype: ListenBrainz
+        """
+        client = copy.copy(self)
+        # the session belongs to this client, it must not be closed with the copy
+        client._owns_session = False
+        if timeout is not None:
+            client._timeout = timeout
+        if deadline is not None:
+            deadline_at = time.monotonic() + deadline
+            client._deadline_at = deadline_at if self._deadline_at is None else min(self._deadline_at, deadline_at)
+        return client
+
+
+    def _wait_until_rate_limit(self, expires_at=None):
+        timeout = None if expires_at is None else max(expires_at - time.monotonic(), 0)
+        waited = self._rate_limiter.acquire(timeout=timeout)
+        if waited is None:
+            raise errors.ListenBrainzTimeoutException("Timed out waiting for the rate limit to reset")
+        if waited and self._hooks:
+            self._emit(RateLimitWaitEvent(duration=waited))
+
+
+    def add_hook(self, hook):
+        """ Add a hook, a callable that is passed an event after each request made by this client.
+
+        A :class:`~liblistenbrainz.instrumentation.RequestEvent` is passed after each request, with its
+        duration, status code, attempt number and body sizes. Retries are the requests with an attempt
+        number greater than 1. A :class:`~liblistenbrainz.instrumentation.RateLimitWaitEvent` is passed
+        after each wait for the rate limit to reset, including the waits before retrying a request
+        that got a 429 response. Hooks are called from the thread that made the request, and the exceptions they
+        raise are logged and ignored. See :class:`~liblistenbrainz.MetricsCollector` for a hook that
+        aggregates metrics.
+
+        :param hook: the hook
+        :type hook: Callable
+        """
+        self._hooks.append(hook)
+
+
+    def remove_hook(self, hook):
+        """ Remove a hook added with :meth:`add_hook`. """
+        self._hooks.remove(hook)
+
+
+    def _emit(self, event):
+        for hook in self._hooks:
+            try:
+                hook(event)
+            except Exception:
+                logger.exception("Error in hook %r", hook)
 
 
     def _update_rate_limit_variables(self, response):
+        self._rate_limiter.update(response.headers)
         self._last_request_ts = int(time.time())
         try:
             self.remaining_requests = int(response.headers.get('X-RateLimit-Remaining'))
@@ -92,26 +315,54 @@ class ListenBrainz:
             self.ratelimit_reset_in = None
 
 
-    def _get(self, endpoint, params=None, headers=None):
-        if not params:
-            params = {}
+    def _request(self, method, endpoint, headers=None, idempotent=None, **kwargs):
+        """ Sends a request, retrying it as allowed by the retry policy of the client.
+
+        `idempotent` defaults to True for GET requests and False for the others.
+        """
         if not headers:
             headers = {}
         if self._auth_token:
             headers['Authorization'] = f'Token {self._auth_token}'
-
-        session = requests.Session()
-        session.mount("http://", adapter) # http is not used, but in case someone needs to use to for dev work, its included here
-        session.mount("https://", adapter)
-
+        if idempotent is None:
+            idempotent = method == 'get'
+        policy = self._retry_policy.for_endpoint(endpoint)
+
+        first_sent_at = time.monotonic()
+        expires_at = self._deadline_at
+        if self._deadline is not None:
+            expires_at = min(first_sent_at + self._deadline, expires_at or float('inf'))
+
+        attempt = 1
+        while True:
+            response = error = None
+            try:
+                response = self._send(method, endpoint, headers, attempt, expires_at, kwargs)
+            except requests.RequestException as e:
+                error = e
+
+            delay = policy.get_retry_delay(attempt, response=response, error=error, idempotent=idempotent)
+            if delay is not None and policy.deadline is not None:
+                if time.monotonic() + delay - first_sent_at > policy.deadline:
+                    delay = None
+            if delay is None:
+                break
+            if expires_at is not None and time.monotonic() + delay >= expires_at:
+                raise errors.ListenBrainzTimeoutException(f"Deadline exceeded before {endpoint} could be retried") from error
+            if response is not None:
+                response.close()
+            # after a 429, the rate limiter knows when the limit is reset and waits for it before the next attempt
+            sleep = max(delay - self._rate_limiter.delay(), 0)
+            time.sleep(sleep)
+            if sleep and response is not None and response.status_code == 429 and self._hooks:
+                self._emit(RateLimitWaitEvent(duration=sleep))
+            attempt += 1
+
+        if isinstance(error, requests.Timeout):
+            raise errors.ListenBrainzTimeoutException(f"Request to {endpoint} timed out") from error
+        if error is not None:
+            raise error
         try:
-            self._wait_until_rate_limit()
-            response = session.get(
-                urljoin(API_BASE_URL, endpoint),
-                params=params,
-                headers=headers,
-            )
-            self._update_rate_limit_variables(response)
             response.raise_for_status()
         except requests.HTTPError as e:
             status_code = e.response.status_code
@@ -123,54 +374,130 @@ class ListenBrainz:
                 message = None
             raise errors.ListenBrainzAPIException(status_code=status_code, message=message) from e
 
-        if response.status_code == 204:
-            raise errors.ListenBrainzAPIException(status_code=204)
-        return response.json()
-
-
-    def _post(self, endpoint, data=None, headers=None):
-        if not headers:
-            headers = {}
-        if self._auth_token:
-            headers['Authorization'] = f'Token {self._auth_token}'
+        return response
 
-        session = requests.Session()
-        session.mount("http://", adapter) # http is not used, but in case someone needs to use to for dev work, its included here
-        session.mount("https://", adapter)
 
+    def _send(self, method, endpoint, headers, attempt, expires_at, kwargs):
+        self._wait_until_rate_limit(expires_at)
+        started_at = time.monotonic()
+        timeout = self._timeout
+        if expires_at is not None:
+            remaining = expires_at - started_at
+            if remaining <= 0:
+                self._rate_limiter.release()
+                raise errors.ListenBrainzTimeoutException(f"Deadline exceeded before {endpoint} could be requested")
+            timeout = _clamp_timeout(timeout, remaining)
         try:
-            self._wait_until_rate_limit()
-            response = session.post(
-                urljoin(API_BASE_URL, endpoint),
-                data=data,
+            response = getattr(self._session, method)(
+                urljoin(self.api_base_url, endpoint),
                 headers=headers,
+                timeout=timeout,
+                **kwargs,
             )
-            self._update_rate_limit_variables(response)
-            response.raise_for_status()
-        except requests.HTTPError as e:
-            status_code = e.response.status_code
-
-            # get message from the json in the response if possible
+        except Exception as e:
+            # the request never got a response, so give its token back to the rate limiter
+            self._rate_limiter.release()
+            if self._hooks:
+                self._emit_request_event(method, endpoint, started_at, attempt, kwargs, None, e)
+            raise
+        if self._hooks:
+            self._emit_request_event(method, endpoint, started_at, attempt, kwargs, response, None)
+        self._update_rate_limit_variables(response)
+        return response
+
+
+    def _emit_request_event(self, method, endpoint, started_at, attempt, kwargs, response, error):
+        duration = time.monotonic() - started_at
+        data = kwargs.get('data')
+        bytes_sent = len(data) if isinstance(data, (bytes, str)) else 0
+        bytes_received = 0
+        status_code = None
+        if response is not None:
+            status_code = response.status_code
             try:
-                message = e.response.json().get('error', '')
-            except Exception:
-                message = None
-            raise errors.ListenBrainzAPIException(status_code=status_code, message=message) from e
+                bytes_received = int(response.headers.get('Content-Length'))
+            except (TypeError, ValueError):
+                # streamed bodies are not read yet, only count them when their size was announced
+                bytes_received = 0 if kwargs.get('stream') else len(response.content or b'')
+        self._emit(RequestEvent(
+            method=method.upper(),
+            endpoint=endpoint,
+            status_code=status_code,
+            duration=duration,
+            attempt=attempt,
+            bytes_sent=bytes_sent,
+            bytes_received=bytes_received,
+            error=error,
+        ))
+
+
+    def _get(self, endpoint, params=None, headers=None, allow_no_content=False):
+        """ Returns the decoded response body, or None for a 204 response if `allow_no_content`
+        is True, else a 204 response raises a ListenBrainzAPIException.
+        """
+        if not params:
+            params = {}
+        ttl = self._cache_ttls.get(_get_cache_group(endpoint)) if self._cache is not None else None
+        if ttl:
+            data = self._get_cached(endpoint, params, headers, ttl)
+        else:
+            response = self._request('get', endpoint, params=params, headers=headers)
+            data = None if response.status_code == 204 else self._serializer.decode_response(response)
+
+        if data is None and not allow_no_content:
+            raise errors.ListenBrainzAPIException(status_code=204)
+        return data
 
-        return response.json()
+
+    def _get_cached(self, endpoint, params, headers, ttl):
+        key = _make_cache_key(self.api_base_url, endpoint, params)
+        entry = self._cache.get(key)
+        if entry is not None and entry.expires_at > time.time():
+            return entry.data
+
+        # revalidate a stale response if the server gave us validators for it
+        headers = dict(headers or {})
+        if entry is not None:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+
+        response = self._request('get', endpoint, params=params, headers=headers)
+        if response.status_code == 304 and entry is not None:
+            self._cache.set(key, entry._replace(expires_at=time.time() + ttl))
+            return entry.data
+
+        # 204 responses are cached too, as None, stats that are not calculated yet stay so for a while
+        data = None if response.status_code == 204 else self._serializer.decode_response(response)
+        self._cache.set(key, CacheEntry(
+            data=data,
+            expires_at=time.time() + ttl,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified'),
+        ))
+        return data
+
+
+    def _post(self, endpoint, data=None, headers=None, idempotent=False):
+        response = self._request('post', endpoint, data=data, headers=headers, idempotent=idempotent)
+        return self._serializer.decode_response(response)
 
 
     def _post_submit_listens(self, listens, listen_type):
         self._require_auth_token()
         _validate_submit_listens_payload(listen_type, listens)
-        listen_payload = [listen._to_submit_payload() for listen in listens]
-        submit_json = {
-            'listen_type': listen_type,
-            'payload': listen_payload
-        }
+        return self._post_encoded_listens([self._serializer.encode_listen(listen) for listen in listens], listen_type)
+
+
+    def _post_encoded_listens(self, encoded_listens, listen_type, idempotent=None):
+        # a playing now listen replaces the previous one, but a listen submitted twice could be stored twice
+        if idempotent is None:
+            idempotent = listen_type == LISTEN_TYPE_PLAYING_NOW
         return self._post(
             '/1/submit-listens',
-            data=json.dumps(submit_json),
+            data=_encode_submit_listens_body(listen_type, encoded_listens),
+            idempotent=idempotent,
         )
 
 
@@ -208,6 +535,34 @@ class ListenBrainz:
         return self._post_submit_listens(listens, LISTEN_TYPE_IMPORT)
 
 
+    def submit_listens_in_batches(self, listens, max_listens_per_batch=MAX_LISTENS_PER_REQUEST, max_batch_size=MAX_SUBMIT_PAYLOAD_SIZE):
+        """ Submit an arbitrary number of listens to ListenBrainz, split into as few requests as possible.
+
+        Listens are read lazily from `listens` and packed into import batches that stay within both
+        the listen count and the request body size limits of ListenBrainz.
+
+        This is a generator: each batch is submitted when the next result is requested, so the
+        returned iterator must be consumed for the listens to be submitted, for example with
+        ``for batch, response in client.submit_listens_in_batches(listens): ...``.
+
+        Requires that the auth token for the user whose listens are being submitted has been set.
+
+        :param listens: the listens to be submitted, can be any iterable including a generator
+        :type listens: Iterable[liblistenbrainz.Listen]
+        :param max_listens_per_batch: the maximum number of listens in one request, defaults to the ListenBrainz limit
+        :type max_listens_per_batch: int, optional
+        :param max_batch_size: the maximum size in bytes of one request body, defaults to the ListenBrainz limit
+        :type max_batch_size: int, optional
+        :return: an iterator of (listens submitted in the batch, API response) tuples
+        :rtype: Iterator[Tuple[List[liblistenbrainz.Listen], dict]]
+        :raises ListenBrainzAPIException: if the ListenBrainz API returns a non 2xx return code
+        :raises ListenTooLargeException: if a single listen is too large to be submitted
+        """
+        self._require_auth_token()
+        for batch, encoded_batch in _batch_listens_for_submission(listens, LISTEN_TYPE_IMPORT, max_listens_per_batch, max_batch_size, self._serializer):
+            yield batch, self._post_encoded_listens(encoded_batch, LISTEN_TYPE_IMPORT)
+
+
     def submit_single_listen(self, listen):
         """ Submit a single listen to ListenBrainz.
 
@@ -250,11 +605,80 @@ class ListenBrainz:
         }
         return self._post(
             '/1/feedback/recording-feedback',
-            data=json.dumps(data),
+            data=self._serializer.dumps(data),
             headers=headers,
+            idempotent=True,
         )
 
 
+    def _get_token_username(self):
+        return self._get('/1/validate-token', params={'token': self._auth_token})['user_name']
+
+
+    def _get_all_user_feedback_scores(self, username, page_size=100):
+        return {
+            feedback.recording_mbid: feedback.score
+            for feedback in self.iter_user_feedback(username, page_size=page_size, prefetch=False)
+            if feedback.recording_mbid
+        }
+
+
+    def submit_user_feedback_bulk(self, feedback, username=None, max_workers=4):
+        """ Submit many recording feedbacks to ListenBrainz, skipping the ones that are already up to date.
+
+        The existing feedback of the user is fetched first, and only the recordings whose score
+        differs are submitted, concurrently from `max_workers` threads under the rate limit of the client.
+        If a recording appears several times in `feedback`, the last score is used.
+
+        Requires that the auth token for the user whose data is being submitted has been set.
+
+        :param feedback: (recording_mbid, score) pairs, where score is 1 = loved, -1 = hated, 0 = delete feedback if any
+        :type feedback: Iterable[Tuple[str, int]]
+        :param username: the username of the user whose auth token has been set, looked up from the
+            auth token if not given
+        :type username: str, optional
+        :param max_workers: the number of feedbacks submitted concurrently
+        :type max_workers: int, optional
+        :return: a dict with the recording MBIDs that were ``'submitted'`` and ``'skipped'``, and a
+            ``'failed'`` dict mapping the recording MBIDs that could not be submitted to the exception raised
+        :rtype: dict
+        :raises ListenBrainzAPIException: if fetching the existing feedback of the user fails
+        """
+        self._require_auth_token()
+        wanted = dict(feedback)
+        if username is None:
+            username = self._get_token_username()
+        existing = self._get_all_user_feedback_scores(username)
+
+        changed, skipped = [], []
+        for recording_mbid, score in wanted.items():
+            if existing.get(recording_mbid, 0) == score:
+                skipped.append(recording_mbid)
+            else:
+                changed.append(recording_mbid)
+
+        submitted, failed = [], {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self.submit_user_feedback, wanted[recording_mbid], recording_mbid): recording_mbid
+                for recording_mbid in changed
+            }
+            for future in as_completed(futures):
+                recording_mbid = futures[future]
+                try:
+                    future.result()
+                except (errors.ListenBrainzException, requests.RequestException) as e:
+                    failed[recording_mbid] = e
+                else:
+                    submitted.append(recording_mbid)
+
+        return {
+            'submitted': submitted,
+            'skipped': skipped,
+            'failed': failed,
+        }
+
+
     def delete_listen(self, listen):
         """ Delete a particular listen from a user’s listen history.
 
@@ -276,8 +700,9 @@ class ListenBrainz:
         }
         return self._post(
             '/1/delete-listen',
-            data=json.dumps(data),
+            data=self._serializer.dumps(data),
             headers=headers,
+            idempotent=True,
         )
 
 
@@ -330,6 +755,59 @@ class ListenBrainz:
         :rtype: List[liblistenbrainz.Listen]
         :raises ListenBrainzAPIException: if the ListenBrainz API returns a non 2xx return code
         """
+        listens = self._get_listens_payload(username, max_ts=max_ts, min_ts=min_ts, count=count)['listens']
+        return [_convert_api_payload_to_listen(listen_data) for listen_data in listens]
+
+
+    def stream_listens(self, username, max_ts=None, min_ts=None, count=None):
+        """ Get listens for user `username`, decoding them while the response is being downloaded.
+
+        Takes the same arguments as :meth:`get_listens`, but returns an iterator instead of a list.
+        Each listen is yielded as soon as it has been received and decoded, and the raw response is
+        never held in memory as a whole, so memory use stays flat regardless of the page size.
+        The response body is always decoded with the ``json`` module of the standard library.
+
+        The timeout and deadline of the client bound the wait for the response headers and for each
+        read of the body, but not the time taken to download the whole body.
+
+        :param username: the username of the user whose data is to be fetched
+        :type username: str
+        :param max_ts: If you specify a max_ts timestamp, listens with listened_at less than (but not including) this value will be returned.
+        :type max_ts: int, optional
+        :param min_ts: If you specify a min_ts timestamp, listens with listened_at greater than (but not including) this value will be returned.
+        :type min_ts: int, optional
+        :param count: the number of listens to return. Defaults to 25, maximum is 100.
+        :type count: int, optional
+        :return: An iterator over the listens for the user `username`
+        :rtype: Iterator[liblistenbrainz.Listen]
+        :raises ListenBrainzAPIException: if the ListenBrainz API returns a non 2xx return code
+        :raises ListenBrainzTimeoutException: if the server stops sending the body for longer than the timeout
+        """
+        params = {}
+        if max_ts is not None:
+            params['max_ts'] = max_ts
+        if min_ts is not None:
+            params['min_ts'] = min_ts
+        if count is not None:
+            params['count'] = count
+
+        response = self._request(
+            'get',
+            '/1/user/{username}/listens'.format(username=username),
+            params=params,
+            stream=True,
+        )
+        try:
+            if response.status_code == 204:
+                raise errors.ListenBrainzAPIException(status_code=204)
+            chunks = _decode_utf8_chunks(_iter_response_content(response, STREAM_CHUNK_SIZE))
+            for listen_data in _iter_streamed_json_array(chunks, _LISTENS_ARRAY_START):
+                yield _convert_api_payload_to_listen(listen_data)
+        finally:
+            response.close()
+
+
+    def _get_listens_payload(self, username, max_ts=None, min_ts=None, count=None):
         params = {}
         if max_ts is not None:
             params['max_ts'] = max_ts
@@ -342,8 +820,168 @@ class ListenBrainz:
             '/1/user/{username}/listens'.format(username=username),
             params=params,
         )
-        listens = data['payload']['listens']
-        return [_convert_api_payload_to_listen(listen_data) for listen_data in listens]
+        return data['payload']
+
+    def _iter_listen_pages(self, username, min_ts, max_ts, page_size):
+        # Pages are walked backwards in time. max_ts is exclusive, so the next page is requested
+        # with max_ts one second after the oldest listen seen so far. Listens sharing that second
+        # are then fetched again, and the ones already returned are skipped.
+        boundary_ts = None
+        seen_at_boundary = set()
+        request_max_ts = max_ts
+        while True:
+            page = self.get_listens(username, max_ts=request_max_ts, count=page_size)
+            fresh = [
+                listen for listen in page
+                if listen.listened_at != boundary_ts or _listen_identity(listen) not in seen_at_boundary
+            ]
+
+            reached_min_ts = False
+            if min_ts is not None and fresh and fresh[-1].listened_at <= min_ts:
+                fresh = [listen for listen in fresh if listen.listened_at > min_ts]
+                reached_min_ts = True
+            if fresh:
+                yield fresh
+            if reached_min_ts or len(page) < page_size:
+                return
+
+            oldest_ts = page[-1].listened_at
+            if not fresh:
+                # a full page of listens from a single second that have all been returned already,
+                # the remaining listens of that second cannot be reached so move past it
+                request_max_ts = oldest_ts
+                continue
+
+            if oldest_ts != boundary_ts:
+                boundary_ts = oldest_ts
+                seen_at_boundary = set()
+            seen_at_boundary.update(_listen_identity(listen) for listen in page if listen.listened_at == oldest_ts)
+            request_max_ts = oldest_ts + 1
+
+
+    def iter_listens(self, username, min_ts=None, max_ts=None, page_size=100, prefetch=True):
+        """ Iterate over all the listens of user `username`, newest first.
+
+        Listens are fetched lazily, one page at a time, by walking `max_ts` backwards through the
+        listen history. Listens that share a timestamp across a page boundary are returned exactly once.
+
+        :param username: the username of the user whose data is to be fetched
+        :type username: str
+        :param min_ts: only return listens with listened_at greater than (but not including) this value
+        :type min_ts: int, optional
+        :param max_ts: only return listens with listened_at less than (but not including) this value
+        :type max_ts: int, optional
+        :param page_size: the number of listens to fetch per request, maximum is 100.
+        :type page_size: int, optional
+        :param prefetch: if True, fetch the next page in a background thread while the current one is being processed
+        :type prefetch: bool, optional
+        :return: an iterator over the listens of the user `username`
+        :rtype: Iterator[liblistenbrainz.Listen]
+        :raises ListenBrainzAPIException: if the ListenBrainz API returns a non 2xx return code
+        """
+        pages = self._iter_listen_pages(username, min_ts, max_ts, page_size)
+        if prefetch:
+            pages = _prefetch(pages)
+        for page in pages:
+            yield from page
+
+
+    def _get_listen_ts_bounds(self, username):
+        """ Returns the timestamps of the oldest and the newest listen of user `username`,
+        or None if the user has no listens.
+        """
+        payload = self._get_listens_payload(username, count=1)
+        if not payload['listens']:
+            return None
+        latest_ts = payload.get('latest_listen_ts') or payload['listens'][0]['listened_at']
+        oldest_ts = payload.get('oldest_listen_ts')
+        if oldest_ts is None:
+            # with only min_ts set, the API returns the listens right after min_ts
+            oldest = self.get_listens(username, min_ts=0, count=1)
+            oldest_ts = oldest[0].listened_at if oldest else latest_ts
+        return oldest_ts, latest_ts
+
+
+    def _get_listen_shards(self, username, min_ts, max_ts, listens_per_shard):
+        """ Split the listen history of user `username` into disjoint, newest first, (min_ts, max_ts) windows. """
+        bounds = self._get_listen_ts_bounds(username)
+        if bounds is None:
+            return []
+
+        # inclusive range of timestamps that can contain listens
+        first_ts, last_ts = bounds
+        if min_ts is not None:
+            first_ts = max(first_ts, min_ts + 1)
+        if max_ts is not None:
+            last_ts = min(last_ts, max_ts - 1)
+        if first_ts > last_ts:
+            return []
+
+        listen_count = self.get_user_listen_count(username) or 0
+        span = last_ts - first_ts + 1
+        shard_count = max(1, min(-(-listen_count // listens_per_shard), span))
+        boundaries = [first_ts + span * i // shard_count for i in range(shard_count + 1)]
+
+        # shard i contains the listens with boundaries[i] <= listened_at < boundaries[i + 1]
+        return [(boundaries[i] - 1, boundaries[i + 1]) for i in reversed(range(shard_count))]
+
+
+    def iter_listens_sharded(self, username, min_ts=None, max_ts=None, page_size=100, max_workers=4, listens_per_shard=1000):
+        """ Iterate over all the listens of user `username`, newest first, fetching several parts of the history concurrently.
+
+        The history (or the window between `min_ts` and `max_ts`) is split into disjoint time windows,
+        sized using the listen count of the user so that each holds about `listens_per_shard` listens.
+        Up to `max_workers` windows are fetched at the same time, under the rate limit of the client,
+        and the listens are returned in timestamp order as soon as every newer window has been returned.
+
+        :param username: the username of the user whose data is to be fetched
+        :type username: str
+        :param min_ts: only return listens with listened_at greater than (but not including) this value
+        :type min_ts: int, optional
+        :param max_ts: only return listens with listened_at less than (but not including) this value
+        :type max_ts: int, optional
+        :param page_size: the number of listens to fetch per request, maximum is 100.
+        :type page_size: int, optional
+        :param max_workers: the maximum number of windows fetched concurrently
+        :type max_workers: int, optional
+        :param listens_per_shard: the approximate number of listens in each window
+        :type listens_per_shard: int, optional
+        :return: an iterator over the listens of the user `username`
+        :rtype: Iterator[liblistenbrainz.Listen]
+        :raises ListenBrainzAPIException: if the ListenBrainz API returns a non 2xx return code
+        """
+        shards = self._get_listen_shards(username, min_ts, max_ts, listens_per_shard)
+
+        def fetch_shard(shard):
+            shard_min_ts, shard_max_ts = shard
+            return list(self.iter_listens(username, min_ts=shard_min_ts, max_ts=shard_max_ts, page_size=page_size, prefetch=False))
+
+        for listens in _map_concurrently(fetch_shard, shards, max_workers):
+            yield from listens
+
+
+    def export_listens(self, username, min_ts=None, max_ts=None, page_size=100, max_workers=1):
+        """ Get all the listens of user `username`, newest first.
+
+        See :meth:`iter_listens` for details, or :meth:`iter_listens_sharded` when `max_workers` is greater than 1.
+
+        :param username: the username of the user whose data is to be fetched
+        :type username: str
+        :param min_ts: only return listens with listened_at greater than (but not including) this value
+        :type min_ts: int, optional
+        :param max_ts: only return listens with listened_at less than (but not including) this value
+        :type max_ts: int, optional
+        :param page_size: the number of listens to fetch per request, maximum is 100.
+        :type page_size: int, optional
+        :param max_workers: the number of parts of the history to fetch concurrently
+        :type max_workers: int, optional
+        :return: A list of all the listens of the user `username`
+        :rtype: List[liblistenbrainz.Listen]
+        :raises ListenBrainzAPIException: if the ListenBrainz API returns a non 2xx return code
+        """
+        if max_workers > 1:
+            return list(self.iter_listens_sharded(username, min_ts=min_ts, max_ts=max_ts, page_size=page_size, max_workers=max_workers))
+        return list(self.iter_listens(username, min_ts=min_ts, max_ts=max_ts, page_size=page_size))
 
     def _get_user_entity(self, username, entity, count=25, offset=0, time_range='all_time'):
         if time_range not in STATS_SUPPORTED_TIME_RANGES:
@@ -355,13 +993,7 @@ class ListenBrainz:
             'range': time_range,
         }
 
-        try:
-            return self._get(f'/1/stats/user/{username}/{entity}', params=params)
-        except errors.ListenBrainzAPIException as e:
-            if e.status_code == 204:
-                return None
-            else:
-                raise
+        return self._get(f'/1/stats/user/{username}/{entity}', params=params, allow_no_content=True)
 
 
     def get_user_artists(self, username, count=25, offset=0, time_range='all_time'):
@@ -427,6 +1059,118 @@ class ListenBrainz:
         return self._get_user_entity(username, 'releases', count, offset, time_range)
 
 
+    def get_user_top_entities(self, username, entity, time_range='all_time', page_size=100, max_workers=4):
+        """ Get the complete ranked list of the artists, recordings or releases of user `username`.
+
+        The first page is fetched on its own to learn the total number of entities, then the
+        remaining pages are fetched concurrently by offset, under the rate limit of the client.
+        Fetching stops as soon as a page shorter than `page_size` is seen.
+
+        :param username: the username of the user whose statistics are to be fetched.
+        :type username: str
+        :param entity: the type of entity, can be 'artists', 'recordings' or 'releases'
+        :type entity: str
+        :param time_range: the time range, can be 'all_time', 'month', 'week' or 'year'
+        :type time_range: str, optional
+        :param page_size: the number of entities to fetch per request, maximum is 100.
+        :type page_size: int, optional
+        :param max_workers: the maximum number of pages fetched concurrently
+        :type max_workers: int, optional
+        :return: the entities in rank order, in the same format as in the API response, or
+            an empty list if the statistics have not been calculated for the user yet
+        :rtype: List[dict]
+        :raises ListenBrainzAPIException: if the ListenBrainz API returns a non 2xx return code
+        """
+        if entity not in STATS_TOP_ENTITIES:
+            raise ValueError("entity must be one of %s" % ", ".join(STATS_TOP_ENTITIES))
+
+        def fetch_page(offset):
+            data = self._get_user_entity(username, entity, page_size, offset, time_range)
+            return data['payload'] if data else None
+
+        first_payload = fetch_page(0)
+        if not first_payload:
+            return []
+        entities = list(first_payload[entity])
+        if len(entities) < page_size:
+            return entities
+
+        # the total is advertised as e.g. total_artist_count, without it pages are fetched until a short one
+        total = first_payload.get('total_%s_count' % entity[:-1])
+        offsets = range(page_size, total, page_size) if total is not None else itertools.count(page_size, page_size)
+        pages = _map_concurrently(fetch_page, offsets, max_workers)
+        try:
+            for payload in pages:
+                page = payload[entity] if payload else []
+                entities.extend(page)
+                if len(page) < page_size:
+                    break
+        finally:
+            pages.close()
+        return entities
+
+
+    def iter_users_stats(self, usernames, entities=STATS_TOP_ENTITIES, time_ranges=STATS_SUPPORTED_TIME_RANGES, count=25, max_workers=8):
+        """ Fetch the artists, recordings or releases statistics of many users, for many time ranges.
+
+        One request is made for each combination of user, entity and time range. The requests are
+        made from a pool of `max_workers` threads sharing the session and the rate limit of the client,
+        and the results are returned in the order in which they complete. Users for whom ListenBrainz
+        has not calculated the statistics yet get a result whose `data` is None.
+
+        :param usernames: the usernames of the users whose statistics are to be fetched
+        :type usernames: Iterable[str]
+        :param entities: the types of entities, among 'artists', 'recordings' and 'releases'
+        :type entities: Iterable[str], optional
+        :param time_ranges: the time ranges, defaults to all the supported time ranges
+        :type time_ranges: Iterable[str], optional
+        :param count: the number of entities to fetch for each request, maximum is 100.
+        :type count: int, optional
+        :param max_workers: the maximum number of requests made concurrently
+        :type max_workers: int, optional
+        :return: an iterator over the results, with the response of the API as `data`, or the
+            exception raised by the request as `error`
+        :rtype: Iterator[UserStatsResult]
+        """
+        entities = tuple(entities)
+        time_ranges = tuple(time_ranges)
+        for entity in entities:
+            if entity not in STATS_TOP_ENTITIES:
+                raise ValueError("entity must be one of %s" % ", ".join(STATS_TOP_ENTITIES))
+        for time_range in time_ranges:
+            if time_range not in STATS_SUPPORTED_TIME_RANGES:
+                raise errors.ListenBrainzException(f"Invalid time range: {time_range}")
+
+        def fetch(request):
+            username, entity, time_range = request
+            try:
+                data = self._get_user_entity(username, entity, count, 0, time_range)
+            except (errors.ListenBrainzException, requests.RequestException) as e:
+                return UserStatsResult(username, entity, time_range, None, e)
+            return UserStatsResult(username, entity, time_range, data, None)
+
+        # unlike itertools.product, this does not read all the usernames up front
+        combinations = (
+            (username, entity, time_range)
+            for username in usernames
+            for entity in entities
+            for time_range in time_ranges
+        )
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # only a bounded number of requests is queued, usernames can be a lazy iterable of any size
+            pending = {executor.submit(fetch, request) for request in itertools.islice(combinations, 2 * max_workers)}
+            try:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for request in itertools.islice(combinations, len(done)):
+                        pending.add(executor.submit(fetch, request))
+                    for future in done:
+                        yield future.result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+
     def get_user_recommendation_recordings(self, username, artist_type='top', count=25, offset=0):
         """ Get recommended recordings for a user.
 
@@ -509,3 +1253,74 @@ class ListenBrainz:
                 return None
             else:
                 raise
+
+
+    def _iter_feedback_pages(self, username, score, metadata, page_size, offset=0):
+        while True:
+            data = self.get_user_feedback(username, score=score, metadata=metadata, count=page_size, offset=offset)
+            feedback = data['feedback'] if data else []
+            if feedback:
+                yield [_convert_api_payload_to_feedback(item) for item in feedback]
+            if len(feedback) < page_size:
+                return
+            offset += len(feedback)
+
+
+    def _iter_feedback_pages_concurrently(self, username, score, metadata, page_size, max_workers):
+        data = self.get_user_feedback(username, score=score, metadata=metadata, count=page_size, offset=0)
+        first_page = data['feedback'] if data else []
+        if first_page:
+            yield [_convert_api_payload_to_feedback(item) for item in first_page]
+        if len(first_page) < page_size:
+            return
+
+        def fetch_page(offset):
+            data = self.get_user_feedback(username, score=score, metadata=metadata, count=page_size, offset=offset)
+            return data['feedback'] if data else []
+
+        offset = page_size
+        for page in _map_concurrently(fetch_page, range(page_size, data['total_count'], page_size), max_workers):
+            if page:
+                yield [_convert_api_payload_to_feedback(item) for item in page]
+            offset += page_size
+            if len(page) < page_size:
+                return
+
+        # feedback given since the first page was fetched
+        yield from self._iter_feedback_pages(username, score, metadata, page_size, offset=offset)
+
+
+    def iter_user_feedback(self, username, score=None, metadata=False, page_size=100, prefetch=True, max_workers=1):
+        """ Iterate over all the feedback given by user `username`, newest first.
+
+        Feedback is fetched lazily, one page at a time. With `max_workers` greater than 1, the total
+        number of feedbacks is read from the first page, and the remaining pages are then fetched
+        concurrently, under the rate limit of the client.
+
+        Pages are fetched by offset, so feedback given while iterating can make some feedback
+        be returned twice.
+
+        :param username: The user to get the feedbacks from
+        :type username: str
+        :param score: Optional, If 1 then returns the loved recordings, if -1 returns hated recordings.
+        :type score: int, optional
+        :param metadata: Optional, boolean if this call should return the metadata for the feedback.
+        :type metadata: bool, optional
+        :param page_size: the number of feedback items to fetch per request, defaults to 100
+        :type page_size: int, optional
+        :param prefetch: if True, fetch the next page in a background thread while the current one is being processed
+        :type prefetch: bool, optional
+        :param max_workers: the maximum number of pages fetched concurrently
+        :type max_workers: int, optional
+        :return: an iterator over the feedback of the user `username`
+        :rtype: Iterator[liblistenbrainz.Feedback]
+        :raises ListenBrainzAPIException: if the ListenBrainz API returns a non 2xx return code
+        """
+        if max_workers > 1:
+            pages = self._iter_feedback_pages_concurrently(username, score, metadata, page_size, max_workers)
+        else:
+            pages = self._iter_feedback_pages(username, score, metadata, page_size)
+            if prefetch:
+                pages = _prefetch(pages)
+        for page in pages:
+            yield from page
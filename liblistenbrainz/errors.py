@@ -24,6 +24,10 @@ class ListenBrainzAPIException(ListenBrainzException):
         self.message = message
 
 
+class ListenBrainzTimeoutException(ListenBrainzException):
+    pass
+
+
 class AuthTokenRequiredException(ListenBrainzException):
     pass
 
@@ -51,3 +55,7 @@ class TooManyListensException(InvalidSubmitListensPayloadException):
 
 class ListenedAtInPlayingNowException(InvalidSubmitListensPayloadException):
     pass
+
+
+class ListenTooLargeException(InvalidSubmitListensPayloadException):
+    pass
@@ -0,0 +1,76 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+FEEDBACK_LOVED = 1
+FEEDBACK_HATED = -1
+
+
+class Feedback:
+    __slots__ = (
+        'recording_mbid',
+        'recording_msid',
+        'score',
+        'created',
+        'username',
+        'track_metadata',
+    )
+
+    def __init__(self, score, recording_mbid=None, recording_msid=None, created=None, username=None, track_metadata=None):
+        """ Creates a Feedback, the love or hate of a user for a recording.
+
+        :param score: 1 if the recording is loved, -1 if it is hated
+        :type score: int
+        :param recording_mbid: the MusicBrainz ID of the recording
+        :type recording_mbid: str, optional
+        :param recording_msid: the MSID of the recording
+        :type recording_msid: str, optional
+        :param created: the unix timestamp at which the feedback was given
+        :type created: int, optional
+        :param username: the username of the user who gave the feedback
+        :type username: str, optional
+        :param track_metadata: the metadata of the recording, only returned by ListenBrainz when asked for
+        :type track_metadata: dict, optional
+        :return: A feedback object with the passed properties
+        :rtype: Feedback
+        """
+        self.score = score
+        self.recording_mbid = recording_mbid
+        self.recording_msid = recording_msid
+        self.created = created
+        self.username = username
+        self.track_metadata = track_metadata
+
+
+    @property
+    def loved(self):
+        return self.score == FEEDBACK_LOVED
+
+
+    @property
+    def hated(self):
+        return self.score == FEEDBACK_HATED
+
+
+    def __eq__(self, other):
+        if not isinstance(other, Feedback):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+
+    def __repr__(self):
+        return 'Feedback(score=%r, recording_mbid=%r, recording_msid=%r, created=%r, username=%r)' % (
+            self.score, self.recording_mbid, self.recording_msid, self.created, self.username,
+        )
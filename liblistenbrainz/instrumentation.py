@@ -0,0 +1,250 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import bisect
+import logging
+import re
+import socket
+import threading
+
+from collections import defaultdict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+# sent to the hooks of a client after each attempt of a request, see ListenBrainz.add_hook
+# status_code is None and error is set if no response was received, duration is in seconds,
+# attempt is 1 for the first attempt and greater for retries, byte counts are of the bodies only
+RequestEvent = namedtuple('RequestEvent', [
+    'method',
+    'endpoint',
+    'status_code',
+    'duration',
+    'attempt',
+    'bytes_sent',
+    'bytes_received',
+    'error',
+])
+
+# sent to the hooks of a client after it waited for the rate limit to reset before a request
+RateLimitWaitEvent = namedtuple('RateLimitWaitEvent', ['duration'])
+
+# in seconds, the default buckets of the Prometheus client libraries
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# usernames are replaced in endpoints, so that metrics are not kept for every user
+_USERNAME_IN_ENDPOINT = re.compile(r'/user/[^/]+')
+
+
+def endpoint_template(endpoint):
+    """ Returns `endpoint` with the username replaced by ``{username}``, e.g. ``/1/user/{username}/listens``. """
+    return _USERNAME_IN_ENDPOINT.sub('/user/{username}', endpoint)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class MetricsCollector:
+    """ A client hook that aggregates request metrics, by endpoint.
+
+    Add it to one or several clients with :meth:`~liblistenbrainz.ListenBrainz.add_hook`, then read
+    the metrics with :meth:`snapshot` or export them with :meth:`prometheus_text`. Collected:
+
+    - a histogram of the request durations, each attempt of a retried request counting as a request
+    - the number of responses by status code, and of requests that got no response
+    - the number of retries made by the client
+    - the number of bytes sent and received in request and response bodies
+    - the number of waits for the rate limit to reset, and the time spent waiting
+
+    :param buckets: the upper bounds in seconds of the buckets of the duration histograms
+    :type buckets: Tuple[float], optional
+    """
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.reset()
+
+
+    def reset(self):
+        """ Forget everything collected so far. """
+        with self._lock:
+            self._endpoints = defaultdict(lambda: {
+                'bucket_counts': [0] * (len(self.buckets) + 1),
+                'duration_sum': 0.0,
+                'count': 0,
+                'statuses': defaultdict(int),
+                'errors': 0,
+                'retries': 0,
+                'bytes_sent': 0,
+                'bytes_received': 0,
+            })
+            self._rate_limit_waits = 0
+            self._rate_limit_wait_seconds = 0.0
+
+
+    def __call__(self, event):
+        with self._lock:
+            if isinstance(event, RateLimitWaitEvent):
+                self._rate_limit_waits += 1
+                self._rate_limit_wait_seconds += event.duration
+                return
+            if not isinstance(event, RequestEvent):
+                return
+
+            metrics = self._endpoints[(event.method, endpoint_template(event.endpoint))]
+            metrics['bucket_counts'][bisect.bisect_left(self.buckets, event.duration)] += 1
+            metrics['duration_sum'] += event.duration
+            metrics['count'] += 1
+            if event.status_code is None:
+                metrics['errors'] += 1
+            else:
+                metrics['statuses'][event.status_code] += 1
+            metrics['retries'] += event.attempt > 1
+            metrics['bytes_sent'] += event.bytes_sent
+            metrics['bytes_received'] += event.bytes_received
+
+
+    def snapshot(self):
+        """ Get the metrics collected so far.
+
+        :return: a dict with ``'endpoints'``, the metrics of each ``(method, endpoint)``, and the
+            ``'rate_limit_waits'`` and ``'rate_limit_wait_seconds'`` totals
+        :rtype: dict
+        """
+        with self._lock:
+            endpoints = {}
+            for key, metrics in self._endpoints.items():
+                endpoints[key] = dict(metrics, bucket_counts=list(metrics['bucket_counts']), statuses=dict(metrics['statuses']))
+            return {
+                'endpoints': endpoints,
+                'rate_limit_waits': self._rate_limit_waits,
+                'rate_limit_wait_seconds': self._rate_limit_wait_seconds,
+            }
+
+
+    def prometheus_text(self, prefix='listenbrainz_client'):
+        """ Export the metrics in the Prometheus text exposition format, to be served on a metrics endpoint.
+
+        :param prefix: the prefix of the metric names
+        :type prefix: str, optional
+        :rtype: str
+        """
+        snapshot = self.snapshot()
+        endpoints = sorted(snapshot['endpoints'].items())
+        lines = []
+
+        def add_metric(name, kind, description, samples):
+            lines.append('# HELP %s_%s %s' % (prefix, name, description))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+            for suffix, labels, value in samples:
+                label_text = ','.join('%s="%s"' % (key, _escape_label(label)) for key, label in labels)
+                lines.append('%s_%s%s{%s} %s' % (prefix, name, suffix, label_text, value) if label_text else '%s_%s%s %s' % (prefix, name, suffix, value))
+
+        histogram = []
+        for (method, endpoint), metrics in endpoints:
+            labels = (('method', method), ('endpoint', endpoint))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), metrics['bucket_counts']):
+                cumulative += count
+                histogram.append(('_bucket', labels + (('le', bound),), cumulative))
+            histogram.append(('_sum', labels, metrics['duration_sum']))
+            histogram.append(('_count', labels, metrics['count']))
+        add_metric('request_duration_seconds', 'histogram', 'Duration of the requests.', histogram)
+
+        add_metric('responses_total', 'counter', 'Responses by status code.', [
+            ('', (('method', method), ('endpoint', endpoint), ('status', status)), count)
+            for (method, endpoint), metrics in endpoints
+            for status, count in sorted(metrics['statuses'].items())
+        ])
+        for name, key, description in (
+            ('request_errors_total', 'errors', 'Requests that got no response.'),
+            ('retries_total', 'retries', 'Requests that were retries of a failed request.'),
+            ('sent_bytes_total', 'bytes_sent', 'Bytes sent in request bodies.'),
+            ('received_bytes_total', 'bytes_received', 'Bytes received in response bodies.'),
+        ):
+            add_metric(name, 'counter', description, [
+                ('', (('method', method), ('endpoint', endpoint)), metrics[key])
+                for (method, endpoint), metrics in endpoints
+            ])
+
+        add_metric('rate_limit_waits_total', 'counter', 'Waits for the rate limit to reset.', [('', (), snapshot['rate_limit_waits'])])
+        add_metric('rate_limit_wait_seconds_total', 'counter', 'Time spent waiting for the rate limit to reset.', [('', (), snapshot['rate_limit_wait_seconds'])])
+        return '\n'.join(lines) + '\n'
+
+
+class StatsdHook:
+    """ A client hook that sends request metrics to a StatsD server over UDP, as they happen.
+
+    For each request, a ``<prefix>.<method>.<endpoint>.duration`` timer, a ``.status.<code>`` or
+    ``.error`` counter, and ``.retries``, ``.bytes_sent`` and ``.bytes_received`` counters are sent,
+    with the slashes of the endpoint replaced by dots. Waits for the rate limit are sent as the
+    ``<prefix>.rate_limit_wait`` timer.
+
+    :param host: the host of the StatsD server
+    :type host: str, optional
+    :param port: the port of the StatsD server
+    :type port: int, optional
+    :param prefix: the prefix of the metric names
+    :type prefix: str, optional
+    """
+
+    def __init__(self, host='localhost', port=8125, prefix='listenbrainz_client'):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+
+    def _metric_name(self, event):
+        endpoint = endpoint_template(event.endpoint).strip('/').replace('{username}', 'username')
+        return '%s.%s.%s' % (self.prefix, event.method.lower(), re.sub(r'[^\w]+', '.', endpoint))
+
+
+    def lines(self, event):
+        """ Returns the StatsD lines sent for `event`.
+
+        :rtype: List[str]
+        """
+        if isinstance(event, RateLimitWaitEvent):
+            return ['%s.rate_limit_wait:%d|ms' % (self.prefix, event.duration * 1000)]
+        if not isinstance(event, RequestEvent):
+            return []
+        name = self._metric_name(event)
+        lines = ['%s.duration:%d|ms' % (name, event.duration * 1000)]
+        if event.status_code is None:
+            lines.append('%s.error:1|c' % name)
+        else:
+            lines.append('%s.status.%d:1|c' % (name, event.status_code))
+        if event.attempt > 1:
+            lines.append('%s.retries:1|c' % name)
+        lines.append('%s.bytes_sent:%d|c' % (name, event.bytes_sent))
+        lines.append('%s.bytes_received:%d|c' % (name, event.bytes_received))
+        return lines
+
+
+    def __call__(self, event):
+        lines = self.lines(event)
+        if not lines:
+            return
+        try:
+            self._socket.sendto('\n'.join(lines).encode('utf-8'), self.address)
+        except OSError:
+            # metrics are best effort, they must not fail the request
+            logger.debug("Could not send metrics to StatsD", exc_info=True)
+
+
+    def close(self):
+        self._socket.close()
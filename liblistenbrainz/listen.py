@@ -24,7 +24,71 @@ LISTEN_TYPES = (
     LISTEN_TYPE_PLAYING_NOW,
 )
 
+# limits enforced by ListenBrainz on /1/submit-listens
+MAX_LISTENS_PER_REQUEST = 1000
+MAX_LISTEN_SIZE = 10240 # bytes, of a single serialized listen
+MAX_SUBMIT_PAYLOAD_SIZE = MAX_LISTEN_SIZE * MAX_LISTENS_PER_REQUEST # bytes, of the whole request body
+
+# fields of a Listen that are submitted inside additional_info, as (attribute, key) pairs in the order
+# they are submitted. Used to build the payload in Listen._build_submit_payload, and by the serializers
+# that encode it without building it.
+_ADDITIONAL_INFO_FIELDS = (
+    ('recording_mbid', 'recording_mbid'),
+    ('_artist_mbids', 'artist_mbids'),
+    ('release_mbid', 'release_mbid'),
+    ('_tags', 'tags'),
+    ('release_group_mbid', 'release_group_mbid'),
+    ('_work_mbids', 'work_mbids'),
+    ('tracknumber', 'tracknumber'),
+    ('spotify_id', 'spotify_id'),
+    ('listening_from', 'listening_from'),
+    ('isrc', 'isrc'),
+)
+
+
+def _get_additional_info_fields(listen):
+    """ Returns the (key, value) pairs of the fields of `listen` that are submitted inside additional_info. """
+    fields = []
+    for attribute, key in _ADDITIONAL_INFO_FIELDS:
+        value = getattr(listen, attribute)
+        # tracknumber 0 is submitted, every other field only if it is set
+        if value or (key == 'tracknumber' and value is not None):
+            fields.append((key, value))
+    return fields
+
+
+def _get_extra_additional_info(listen, fields):
+    """ Returns a new dict with the items of the additional_info of `listen` that are not overridden by `fields`. """
+    if not listen._additional_info:
+        return {}
+    overridden = {key for key, _ in fields}
+    return {key: value for key, value in listen._additional_info.items() if key not in overridden}
+
+
 class Listen:
+    # Listens are often held in memory by the million, so they don't get an instance __dict__, and
+    # the containers below are stored as None until they are first accessed, see the properties.
+    __slots__ = (
+        'listened_at',
+        'track_name',
+        'artist_name',
+        'release_name',
+        'recording_mbid',
+        '_artist_mbids',
+        'release_mbid',
+        '_tags',
+        'release_group_mbid',
+        '_work_mbids',
+        'tracknumber',
+        'spotify_id',
+        'listening_from',
+        'isrc',
+        '_additional_info',
+        'username',
+        'recording_msid',
+        '_submit_payload_cache',
+    )
+
     def __init__(
         self,
         track_name,
@@ -94,43 +158,110 @@ class Listen:
         self.artist_name = artist_name
         self.release_name = release_name
         self.recording_mbid = recording_mbid
-        self.artist_mbids = artist_mbids or []
+        self._artist_mbids = artist_mbids or None
         self.release_mbid = release_mbid
-        self.tags = tags or []
-        self.release_group_mbid = release_group_mbid or []
-        self.work_mbids = work_mbids or []
+        self._tags = tags or None
+        self.release_group_mbid = release_group_mbid
+        self._work_mbids = work_mbids or None
         self.tracknumber = tracknumber
         self.spotify_id = spotify_id
         self.listening_from = listening_from
         self.isrc = isrc
-        self.additional_info = additional_info or {}
+        self._additional_info = additional_info or None
         self.username = username
         self.recording_msid = recording_msid
+        self._submit_payload_cache = None
+
+
+    @property
+    def artist_mbids(self):
+        if self._artist_mbids is None:
+            self._artist_mbids = []
+        return self._artist_mbids
+
+    @artist_mbids.setter
+    def artist_mbids(self, value):
+        self._artist_mbids = value
+
+
+    @property
+    def tags(self):
+        if self._tags is None:
+            self._tags = []
+        return self._tags
+
+    @tags.setter
+    def tags(self, value):
+        self._tags = value
+
+
+    @property
+    def work_mbids(self):
+        if self._work_mbids is None:
+            self._work_mbids = []
+        return self._work_mbids
+
+    @work_mbids.setter
+    def work_mbids(self, value):
+        self._work_mbids = value
+
+
+    @property
+    def additional_info(self):
+        if self._additional_info is None:
+            self._additional_info = {}
+        return self._additional_info
+
+    @additional_info.setter
+    def additional_info(self, value):
+        self._additional_info = value
+
+
+    def _submit_payload_key(self):
+        # Compared by value against the key the cached payload was built for, so the containers
+        # are copied: modifying tags or additional_info in place then makes the key differ. Values
+        # nested inside additional_info are not copied, changes to them are not detected.
+        return (
+            self.listened_at,
+            self.track_name,
+            self.artist_name,
+            self.release_name,
+            self.recording_mbid,
+            tuple(self._artist_mbids) if self._artist_mbids else None,
+            self.release_mbid,
+            tuple(self._tags) if self._tags else None,
+            self.release_group_mbid,
+            tuple(self._work_mbids) if self._work_mbids else None,
+            self.tracknumber,
+            self.spotify_id,
+            self.listening_from,
+            self.isrc,
+            dict(self._additional_info) if self._additional_info else None,
+        )
 
 
     def _to_submit_payload(self):
-        # create the additional_info dict first
-        additional_info = self.additional_info
-        if self.recording_mbid:
-            additional_info['recording_mbid'] = self.recording_mbid
-        if self.artist_mbids:
-            additional_info['artist_mbids'] = self.artist_mbids
-        if self.release_mbid:
-            additional_info['release_mbid'] = self.release_mbid
-        if self.tags:
-            additional_info['tags'] = self.tags
-        if self.release_group_mbid:
-            additional_info['release_group_mbid'] = self.release_group_mbid
-        if self.work_mbids:
-            additional_info['work_mbids'] = self.work_mbids
-        if self.tracknumber is not None:
-            additional_info['tracknumber'] = self.tracknumber
-        if self.spotify_id:
-            additional_info['spotify_id'] = self.spotify_id
-        if self.listening_from:
-            additional_info['listening_from'] = self.listening_from
-        if self.isrc:
-            additional_info['isrc'] = self.isrc
+        """ Returns the payload of this listen as submitted to ListenBrainz.
+
+        The listen itself is not modified. The payload is built once and reused until a field of
+        the listen changes, callers must not modify it.
+        """
+        key = self._submit_payload_key()
+        cached = self._submit_payload_cache
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        payload = self._build_submit_payload()
+        self._submit_payload_cache = (key, payload)
+        return payload
+
+
+    def _build_submit_payload(self):
+        # create the additional_info dict first, as a copy so that the listen is not modified,
+        # without materializing empty containers
+        fields = _get_additional_info_fields(self)
+        additional_info = _get_extra_additional_info(self, fields)
+        for key, value in fields:
+            additional_info[key] = list(value) if isinstance(value, list) else value
 
         # create track_metadata now and put additional_info into it if it makes sense
         track_metadata = {
@@ -0,0 +1,223 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows, FileRateLimiter cannot be used there
+    fcntl = None
+
+
+def _parse_int_header(headers, name):
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+# seconds between two checks of an empty bucket whose reset time is not known
+_IN_FLIGHT_POLL_INTERVAL = 0.05
+
+
+class RateLimiter:
+    """ A thread-safe token bucket fed by the ``X-RateLimit-*`` headers sent by ListenBrainz.
+
+    Every request takes a token from the bucket before it is sent. The bucket is refilled from the
+    ``X-RateLimit-Remaining`` header of each response, minus the requests that are still in flight,
+    and refilled to ``X-RateLimit-Limit`` once the window advertised by ``X-RateLimit-Reset-In`` is over.
+    When the bucket is empty, callers wait until the window is reset. As long as ListenBrainz has not
+    sent any rate limit headers, requests are not limited.
+
+    A single rate limiter can be shared by several clients to give them a common budget.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = self._initial_state()
+
+
+    @staticmethod
+    def _initial_state():
+        return {
+            'tokens': None,   # None means that the budget is unknown
+            'limit': None,
+            'reset_at': None,
+            'window': None,   # the longest reset time seen, an estimate of the length of a window
+            'in_flight': 0,
+        }
+
+
+    def _clock(self):
+        return time.monotonic()
+
+
+    @contextmanager
+    def _locked_state(self):
+        with self._lock:
+            yield self._state
+
+
+    def _refill(self, state, now):
+        if state['reset_at'] is not None and now >= state['reset_at']:
+            state['tokens'] = state['limit']
+            state['in_flight'] = 0
+            # the next window is assumed to end one window length after this one, until a response
+            # tells when it really ends, so that the new tokens are not handed out without limit
+            window = state.get('window')
+            if window:
+                while state['reset_at'] <= now:
+                    state['reset_at'] += window
+            else:
+                state['reset_at'] = None
+
+
+    def _delay(self, state, now):
+        self._refill(state, now)
+        if state['tokens'] is None or state['tokens'] > 0:
+            return 0
+        if state['reset_at'] is not None:
+            return state['reset_at'] - now
+        # the bucket is empty and it is not known when it is refilled, wait for the responses
+        # to the requests in flight to tell
+        return _IN_FLIGHT_POLL_INTERVAL if state['in_flight'] else 0
+
+
+    def delay(self):
+        """ Returns the number of seconds until a request can be made, without taking a token. """
+        with self._locked_state() as state:
+            return self._delay(state, self._clock())
+
+
+    def reserve(self):
+        """ Take a token if one is available.
+
+        :return: 0 if a token was taken, else the number of seconds until the bucket is refilled
+        :rtype: float
+        """
+        with self._locked_state() as state:
+            delay = self._delay(state, self._clock())
+            if delay > 0:
+                return delay
+            if state['tokens']:
+                state['tokens'] -= 1
+            state['in_flight'] += 1
+            return 0
+
+
+    def acquire(self, timeout=None):
+        """ Take a token, waiting until one is available.
+
+        :param timeout: the maximum number of seconds to wait, None to wait as long as needed
+        :type timeout: float, optional
+        :return: the number of seconds spent waiting, or None if no token could be taken within
+            `timeout` seconds, in which case it returns without waiting for the whole timeout
+        :rtype: float or None
+        """
+        waited = 0
+        delay = self.reserve()
+        while delay > 0:
+            if timeout is not None and waited + delay > timeout:
+                return None
+            time.sleep(delay)
+            waited += delay
+            delay = self.reserve()
+        return waited
+
+
+    def release(self):
+        """ Return the token of a request that failed before a response was received. """
+        with self._locked_state() as state:
+            state['in_flight'] = max(state['in_flight'] - 1, 0)
+
+
+    def update(self, headers):
+        """ Update the bucket from the rate limit headers of a response to a request that took a token.
+
+        :param headers: the response headers
+        :type headers: Mapping[str, str]
+        """
+        remaining = _parse_int_header(headers, 'X-RateLimit-Remaining')
+        reset_in = _parse_int_header(headers, 'X-RateLimit-Reset-In')
+        limit = _parse_int_header(headers, 'X-RateLimit-Limit')
+        with self._locked_state() as state:
+            now = self._clock()
+            self._refill(state, now)
+            state['in_flight'] = max(state['in_flight'] - 1, 0)
+            tokens = None if remaining is None else max(remaining - state['in_flight'], 0)
+            reset_at = now + reset_in if reset_in is not None else None
+            if tokens is not None and state['tokens'] is not None and state['reset_at'] is not None:
+                # responses to concurrent requests can arrive in any order, within a window the
+                # one with the fewest requests remaining is the most recent
+                tokens = min(tokens, state['tokens'])
+                if reset_at is not None:
+                    reset_at = max(reset_at, state['reset_at'])
+            state['tokens'] = tokens
+            state['reset_at'] = reset_at
+            if limit is not None:
+                state['limit'] = limit
+            if reset_in:
+                state['window'] = max(state.get('window') or 0, reset_in)
+
+
+class FileRateLimiter(RateLimiter):
+    """ A :class:`RateLimiter` whose state is kept in a file, so that all the processes on a host
+    that use the same `path` share one budget.
+
+    The file is locked with ``flock`` while the state is read and updated, so this is only available
+    on POSIX systems. Wall clock time is used instead of a monotonic clock, as the monotonic clocks
+    of different processes are not comparable.
+
+    :param path: the path of the state file, created if it does not exist
+    :type path: str
+    """
+
+    def __init__(self, path):
+        if fcntl is None:
+            raise RuntimeError("FileRateLimiter requires fcntl, which is not available on this platform")
+        super(FileRateLimiter, self).__init__()
+        self.path = path
+
+
+    def _clock(self):
+        return time.time()
+
+
+    @contextmanager
+    def _locked_state(self):
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            with os.fdopen(fd, 'r+') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    content = f.read()
+                    try:
+                        state = json.loads(content) if content else self._initial_state()
+                    except ValueError:
+                        state = self._initial_state()
+                    yield state
+                    f.seek(0)
+                    f.truncate()
+                    json.dump(state, f)
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,164 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import random
+import re
+import requests
+import time
+
+from email.utils import parsedate_to_datetime
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError
+
+DEFAULT_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def _parse_retry_after(response):
+    """ Returns the number of seconds to wait advertised by a response, or None. """
+    headers = response.headers
+    names = ('Retry-After',)
+    # ListenBrainz sends X-RateLimit-Reset-In with every response, it is only a reason to wait
+    # when the rate limit was exceeded
+    if response.status_code == 429:
+        names += ('X-RateLimit-Reset-In',)
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return max(float(value), 0)
+        except ValueError:
+            pass
+        # Retry-After can also be an HTTP date
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+def _request_was_not_sent(error):
+    """ Returns True if `error` was raised before the request reached the server, so that it is safe to send it again. """
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.ConnectionError):
+        reason = error.args[0] if error.args else None
+        if isinstance(reason, MaxRetryError):
+            reason = reason.reason
+        # NewConnectionError, the connection could not even be opened, is a ConnectTimeoutError too
+        return isinstance(reason, ConnectTimeoutError)
+    return False
+
+
+class RetryPolicy:
+    """ How a client retries the requests that fail.
+
+    Requests that get a response with one of `retry_statuses`, or fail to get a response at all,
+    are retried up to `max_retries` times. Before each retry, the client waits for the time
+    advertised by the ``Retry-After`` header of the response, or by its ``X-RateLimit-Reset-In``
+    header for a 429, if there is one, else for an exponential backoff with full jitter: a random time between 0 and
+    ``backoff_factor * 2 ** retry`` seconds, at most `backoff_max`. If a `deadline` is set,
+    a request is not retried if the wait would end more than `deadline` seconds after the
+    request was first sent.
+
+    Requests that are not idempotent, like listen submissions, are only retried when the server
+    certainly did not process them: when the connection could not be opened, or when the rate limit
+    was exceeded (429). Set `retry_non_idempotent` to retry them like the other requests.
+    ListenBrainz ignores a listen that is submitted twice with the same timestamp and track, so this
+    is safe as long as every submitted listen has a timestamp.
+
+    :param max_retries: the maximum number of times a request is retried, 0 disables retries
+    :type max_retries: int, optional
+    :param backoff_factor: the upper bound in seconds of the wait before the first retry
+    :type backoff_factor: float, optional
+    :param backoff_max: the maximum number of seconds to wait before a retry
+    :type backoff_max: float, optional
+    :param deadline: the maximum number of seconds between the first attempt and the end of the wait
+        before the last retry, None for no deadline
+    :type deadline: float, optional
+    :param retry_statuses: the status codes of the responses that are retried
+    :type retry_statuses: Iterable[int], optional
+    :param retry_non_idempotent: if True, retry requests that are not idempotent in all cases
+    :type retry_non_idempotent: bool, optional
+    :param overrides: policies to use instead of this one for some endpoints, keyed by a regular
+        expression that is matched against the start of the endpoint, e.g. ``{'/1/submit-listens': RetryPolicy(max_retries=10)}``
+    :type overrides: Mapping[str, RetryPolicy], optional
+    """
+
+    def __init__(
+        self,
+        max_retries=5,
+        backoff_factor=0.5,
+        backoff_max=60,
+        deadline=None,
+        retry_statuses=DEFAULT_RETRY_STATUSES,
+        retry_non_idempotent=False,
+        overrides=None,
+    ):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_non_idempotent = retry_non_idempotent
+        self.overrides = [(re.compile(pattern), policy) for pattern, policy in (overrides or {}).items()]
+
+
+    def for_endpoint(self, endpoint):
+        """ Returns the policy to use for requests to `endpoint`.
+
+        :rtype: RetryPolicy
+        """
+        for pattern, policy in self.overrides:
+            if pattern.match(endpoint):
+                return policy
+        return self
+
+
+    def backoff(self, retry):
+        """ Returns a random number of seconds to wait before retry number `retry`, counting from 1. """
+        return random.uniform(0, min(self.backoff_factor * 2 ** (retry - 1), self.backoff_max))
+
+
+    def get_retry_delay(self, retry, response=None, error=None, idempotent=True):
+        """ Returns the number of seconds to wait before retry number `retry` of a request that got
+        `response` or raised `error`, or None if the request should not be retried.
+
+        :param retry: the number of the retry, counting from 1
+        :type retry: int
+        :param response: the response to the previous attempt, if it got one
+        :type response: requests.Response, optional
+        :param error: the exception raised by the previous attempt, if it got no response
+        :type error: Exception, optional
+        :param idempotent: whether sending the request several times has the same effect as sending it once
+        :type idempotent: bool, optional
+        :rtype: float or None
+        """
+        if retry > self.max_retries:
+            return None
+        if response is not None:
+            if response.status_code not in self.retry_statuses:
+                return None
+            if not idempotent and not self.retry_non_idempotent and response.status_code != 429:
+                return None
+            delay = _parse_retry_after(response)
+            if delay is not None:
+                return delay
+        elif error is not None:
+            if not isinstance(error, requests.RequestException):
+                return None
+            if not idempotent and not self.retry_non_idempotent and not _request_was_not_sent(error):
+                return None
+        return self.backoff(retry)
@@ -0,0 +1,151 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+
+from json.encoder import encode_basestring_ascii
+from liblistenbrainz.listen import _get_additional_info_fields, _get_extra_additional_info
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _encode_json_value(value):
+    if type(value) is str:
+        return encode_basestring_ascii(value)
+    return json.dumps(value, separators=(',', ':'))
+
+
+def _encode_listen_directly(listen):
+    """ Serialize the submit payload of a listen without building the intermediate dicts
+    of Listen._to_submit_payload. Produces the same JSON document, in compact form.
+    """
+    fields = _get_additional_info_fields(listen)
+    extra = _get_extra_additional_info(listen, fields)
+    parts = [json.dumps(extra, separators=(',', ':'))[1:-1]] if extra else []
+    parts.extend('%s:%s' % (encode_basestring_ascii(key), _encode_json_value(value)) for key, value in fields)
+
+    track_metadata = '"track_name":%s,"artist_name":%s' % (
+        _encode_json_value(listen.track_name),
+        _encode_json_value(listen.artist_name),
+    )
+    if listen.release_name:
+        track_metadata += ',"release_name":' + _encode_json_value(listen.release_name)
+    if parts:
+        track_metadata += ',"additional_info":{' + ','.join(parts) + '}'
+
+    if listen.listened_at is not None:
+        encoded = '{"track_metadata":{%s},"listened_at":%s}' % (track_metadata, _encode_json_value(listen.listened_at))
+    else:
+        encoded = '{"track_metadata":{%s}}' % track_metadata
+    return encoded.encode('utf-8')
+
+
+class JSONSerializer:
+    """ Serializes with the ``json`` module of the standard library. """
+
+    name = 'json'
+
+    def dumps(self, obj):
+        """ Serialize `obj` to UTF-8 encoded JSON.
+
+        :rtype: bytes
+        """
+        return json.dumps(obj).encode('utf-8')
+
+
+    def loads(self, data):
+        """ Deserialize a JSON document.
+
+        :param data: the JSON document
+        :type data: bytes or str
+        """
+        return json.loads(data)
+
+
+    def decode_response(self, response):
+        """ Deserialize the JSON body of a response. """
+        return response.json()
+
+
+    def encode_listen(self, listen):
+        """ Serialize the submit payload of a listen to UTF-8 encoded JSON.
+
+        :rtype: bytes
+        """
+        # encoding the fields directly is about twice as fast as json.dumps of the payload dict
+        return _encode_listen_directly(listen)
+
+
+class OrjsonSerializer(JSONSerializer):
+    """ Serializes with `orjson <https://github.com/ijl/orjson>`_. """
+
+    name = 'orjson'
+
+    def dumps(self, obj):
+        return orjson.dumps(obj)
+
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+    def decode_response(self, response):
+        return orjson.loads(response.content)
+
+
+    def encode_listen(self, listen):
+        return orjson.dumps(listen._to_submit_payload())
+
+
+class UjsonSerializer(JSONSerializer):
+    """ Serializes with `ujson <https://github.com/ultrajson/ultrajson>`_. """
+
+    name = 'ujson'
+
+    def dumps(self, obj):
+        return ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+
+    def decode_response(self, response):
+        return ujson.loads(response.content)
+
+
+    def encode_listen(self, listen):
+        return self.dumps(listen._to_submit_payload())
+
+
+def get_default_serializer():
+    """ Get the fastest serializer available, preferring orjson, then ujson, then the standard library.
+
+    :rtype: JSONSerializer
+    """
+    if orjson is not None:
+        return OrjsonSerializer()
+    if ujson is not None:
+        return UjsonSerializer()
+    return JSONSerializer()
@@ -0,0 +1,252 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import logging
+import sqlite3
+import threading
+import time
+
+from liblistenbrainz import errors
+from liblistenbrainz.listen import LISTEN_TYPE_IMPORT, MAX_LISTENS_PER_REQUEST, MAX_LISTEN_SIZE, MAX_SUBMIT_PAYLOAD_SIZE
+from liblistenbrainz.utils import _batch_encoded_listens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 10 # seconds
+MAX_FLUSH_BACKOFF = 10 * 60 # seconds
+
+
+class SubmissionQueue:
+
+    def __init__(self, path, client, synchronous='FULL', max_listens_per_batch=MAX_LISTENS_PER_REQUEST, max_batch_size=MAX_SUBMIT_PAYLOAD_SIZE):
+        """ Creates a durable queue of listens waiting to be submitted to ListenBrainz.
+
+        Listens are written to an SQLite database in write-ahead-log mode when they are enqueued,
+        and removed from it only once ListenBrainz has accepted them, so listens are not lost if
+        the process dies or ListenBrainz cannot be reached. All the listens passed to a single
+        :meth:`enqueue` call are written in one transaction, with one fsync.
+
+        Listens are submitted as import batches by :meth:`flush`, or periodically by a background
+        thread started with :meth:`start`. If the process dies after ListenBrainz accepted a batch
+        but before it was removed from the queue, the batch is submitted again after the restart;
+        ListenBrainz deduplicates listens of a user with the same timestamp and track, so each
+        listen ends up in the listen history exactly once.
+
+        Only one process should use a given queue file at a time.
+
+        :param path: the path of the database file, created if it does not exist
+        :type path: str
+        :param client: the client used to submit the listens, with the auth token of the user set
+        :type client: liblistenbrainz.ListenBrainz
+        :param synchronous: the SQLite ``synchronous`` setting. ``'FULL'`` makes enqueued listens
+            survive power loss, ``'NORMAL'`` only survives the process crashing but enqueues faster.
+        :type synchronous: str, optional
+        :param max_listens_per_batch: the maximum number of listens submitted in one request
+        :type max_listens_per_batch: int, optional
+        :param max_batch_size: the maximum size in bytes of one request body
+        :type max_batch_size: int, optional
+        """
+        if synchronous not in ('FULL', 'NORMAL'):
+            raise ValueError("synchronous must be either FULL or NORMAL")
+
+        self.path = path
+        self._client = client
+        self._max_listens_per_batch = max_listens_per_batch
+        self._max_batch_size = max_batch_size
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(f"PRAGMA synchronous={synchronous}")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload BLOB NOT NULL,
+                enqueued_at REAL NOT NULL
+            )
+        """)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS rejected (
+                id INTEGER PRIMARY KEY,
+                payload BLOB NOT NULL,
+                enqueued_at REAL NOT NULL,
+                status_code INTEGER,
+                message TEXT
+            )
+        """)
+
+        self._stop_event = threading.Event()
+        self._flusher = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT count(*) FROM queue").fetchone()[0]
+
+
+    def enqueue(self, listens):
+        """ Durably add listens to the queue.
+
+        :param listens: the listens to be submitted, they must have a `listened_at` timestamp
+        :type listens: Iterable[liblistenbrainz.Listen]
+        :raises InvalidSubmitListensPayloadException: if a listen has no `listened_at` timestamp
+        :raises ListenTooLargeException: if a listen is too large to be submitted
+        """
+        now = time.time()
+        rows = []
+        for listen in listens:
+            if listen.listened_at is None:
+                raise errors.InvalidSubmitListensPayloadException("Queued listens must have a listened_at timestamp")
+            payload = self._client._serializer.encode_listen(listen)
+            size = len(payload)
+            if size > MAX_LISTEN_SIZE:
+                raise errors.ListenTooLargeException("Listen is %d bytes when serialized, which is too large to submit" % size)
+            rows.append((payload, now))
+
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._connection.executemany("INSERT INTO queue (payload, enqueued_at) VALUES (?, ?)", rows)
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+
+    def _next_rows(self, limit):
+        with self._lock:
+            return self._connection.execute(
+                "SELECT id, payload FROM queue ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+
+
+    def _delete(self, ids):
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            self._connection.executemany("DELETE FROM queue WHERE id = ?", ((row_id,) for row_id in ids))
+            self._connection.execute("COMMIT")
+
+
+    def _reject(self, ids, exception):
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            for row_id in ids:
+                self._connection.execute(
+                    "INSERT INTO rejected (id, payload, enqueued_at, status_code, message) "
+                    "SELECT id, payload, enqueued_at, ?, ? FROM queue WHERE id = ?",
+                    (exception.status_code, exception.message, row_id),
+                )
+                self._connection.execute("DELETE FROM queue WHERE id = ?", (row_id,))
+            self._connection.execute("COMMIT")
+
+
+    def flush(self):
+        """ Submit all the queued listens.
+
+        Listens that ListenBrainz rejects as invalid (with a 400 response) are moved out of the queue
+        into the ``rejected`` table of the database, so that they do not block the listens behind them.
+        The other listens of a batch it rejects are found by splitting the batch, and submitted.
+
+        :return: the number of listens that were submitted
+        :rtype: int
+        :raises ListenBrainzAPIException: if ListenBrainz returns an error other than 400, the listens
+            that were not submitted stay in the queue
+        """
+        submitted = 0
+        with self._flush_lock:
+            while True:
+                rows = self._next_rows(self._max_listens_per_batch)
+                if not rows:
+                    return submitted
+
+                batches = _batch_encoded_listens(rows, LISTEN_TYPE_IMPORT, self._max_listens_per_batch, self._max_batch_size)
+                for ids, encoded_batch in batches:
+                    submitted += self._submit_batch(ids, encoded_batch)
+
+
+    def _submit_batch(self, ids, encoded_batch):
+        """ Submit a batch of queued listens and remove them from the queue, returns the number submitted.
+
+        When ListenBrainz rejects the batch as invalid, its halves are submitted separately, until
+        the listens it rejects are found and moved to the ``rejected`` table, so that the valid
+        listens of the batch are still submitted.
+        """
+        try:
+            # queued listens all have a timestamp, so ListenBrainz ignores them if they are sent twice
+            self._client._post_encoded_listens(encoded_batch, LISTEN_TYPE_IMPORT, idempotent=True)
+        except errors.ListenBrainzAPIException as e:
+            if e.status_code != 400:
+                raise
+            if len(ids) == 1:
+                logger.warning("ListenBrainz rejected a queued listen: %s", e.message)
+                self._reject(ids, e)
+                return 0
+            middle = len(ids) // 2
+            return self._submit_batch(ids[:middle], encoded_batch[:middle]) + self._submit_batch(ids[middle:], encoded_batch[middle:])
+        self._delete(ids)
+        return len(ids)
+
+
+    def start(self, interval=DEFAULT_FLUSH_INTERVAL):
+        """ Start a background thread that flushes the queue every `interval` seconds.
+
+        When a flush fails, the thread backs off exponentially, up to 10 minutes, before trying again.
+
+        :param interval: the number of seconds between flushes
+        :type interval: float, optional
+        """
+        if self._flusher is not None:
+            return
+        self._stop_event.clear()
+        self._flusher = threading.Thread(target=self._run_flusher, args=(interval,), daemon=True)
+        self._flusher.start()
+
+
+    def _run_flusher(self, interval):
+        delay = interval
+        while not self._stop_event.wait(delay):
+            try:
+                self.flush()
+            except Exception:
+                delay = min(delay * 2, MAX_FLUSH_BACKOFF)
+                logger.exception("Could not flush queued listens, retrying in %d seconds", delay)
+            else:
+                delay = interval
+
+
+    def stop(self):
+        """ Stop the background flushing thread, if it is running. """
+        if self._flusher is None:
+            return
+        self._stop_event.set()
+        self._flusher.join()
+        self._flusher = None
+
+
+    def close(self):
+        """ Stop the background flushing thread and close the database. Queued listens stay in the database. """
+        self.stop()
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,247 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import heapq
+import threading
+import time
+
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from liblistenbrainz.client import ListenBrainz, DEFAULT_POOL_CONNECTIONS
+from liblistenbrainz.listen import LISTEN_TYPE_IMPORT, MAX_LISTENS_PER_REQUEST, MAX_SUBMIT_PAYLOAD_SIZE
+from liblistenbrainz.utils import _batch_listens_for_submission
+
+# the number of clients kept for the tokens that were used most recently
+DEFAULT_MAX_CLIENTS = 1024
+
+
+class _WorkItem:
+
+    def __init__(self, listens, future):
+        self.listens = listens
+        self.future = future
+        # the batches of the item are submitted one at a time, so that the worker can be released
+        # while the token is rate limited
+        self.batches = None
+        self.next_batch = None
+        self.results = []
+
+
+class MultiUserSubmitter:
+
+    def __init__(self, max_workers=8, session=None, max_clients=DEFAULT_MAX_CLIENTS):
+        """ Creates a submitter that submits listens for many users concurrently.
+
+        Work items are ``(auth_token, listens)`` pairs. Every auth token gets its own
+        :class:`~liblistenbrainz.ListenBrainz` client, so the ``X-RateLimit-*`` state is tracked
+        per token, while all clients share a single connection pool. Work items for the same
+        token are submitted one after the other by a single worker. When a token is rate limited,
+        its work is put aside until the rate limit resets and the worker moves on to other tokens,
+        so a rate limited user never stalls the submissions of other users.
+
+        :param max_workers: the number of threads submitting listens
+        :type max_workers: int, optional
+        :param session: a session shared by all clients instead of the one created by the submitter.
+            The submitter does not close a session passed in this way.
+        :type session: requests.Session, optional
+        :param max_clients: the maximum number of clients kept, the clients of the tokens used least
+            recently are closed first. Clients of tokens with scheduled work items are always kept.
+        :type max_clients: int, optional
+        """
+        if session is None:
+            self._session = ListenBrainz._create_session(
+                pool_connections=DEFAULT_POOL_CONNECTIONS,
+                pool_maxsize=max_workers,
+                pool_block=False,
+                keep_alive=True,
+            )
+            self._owns_session = True
+        else:
+            self._session = session
+            self._owns_session = False
+
+        self.max_clients = max_clients
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        # notified when a token has no more work, or when rate limited work is put aside
+        self._changed = threading.Condition(self._lock)
+        self._clients = OrderedDict()
+        self._pending = {}
+        # (ready_at, sequence number, auth_token, client) of the tokens waiting for their rate limit to reset
+        self._throttled = []
+        self._throttled_count = 0
+        self._scheduler = None
+        self._closing = False
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def get_client(self, auth_token):
+        """ Get the client used to submit listens for `auth_token`.
+
+        The client can be used to inspect the rate limit state of the token.
+
+        :param auth_token: the auth token of the user
+        :type auth_token: str
+        :rtype: liblistenbrainz.ListenBrainz
+        """
+        with self._lock:
+            client = self._clients.get(auth_token)
+            if client is None:
+                client = ListenBrainz(session=self._session)
+                client.set_auth_token(auth_token, check_validity=False)
+                self._clients[auth_token] = client
+            self._clients.move_to_end(auth_token)
+            evicted = self._evict_clients()
+        for evicted_client in evicted:
+            evicted_client.close()
+        return client
+
+
+    def _evict_clients(self):
+        evicted = []
+        for auth_token in list(self._clients):
+            if len(self._clients) <= self.max_clients:
+                break
+            if auth_token not in self._pending:
+                evicted.append(self._clients.pop(auth_token))
+        return evicted
+
+
+    def submit(self, auth_token, listens):
+        """ Schedule `listens` to be submitted for the user with `auth_token`.
+
+        :param auth_token: the auth token of the user whose listens are being submitted
+        :type auth_token: str
+        :param listens: the listens to be submitted, large lists are split into several import requests
+        :type listens: List[liblistenbrainz.Listen]
+        :return: a future resolving to the list of (batch, API response) tuples for the submitted batches,
+            or raising the exception that stopped the submission
+        :rtype: concurrent.futures.Future
+        """
+        future = Future()
+        with self._lock:
+            queue = self._pending.get(auth_token)
+            if queue is None:
+                queue = self._pending[auth_token] = deque()
+                start_worker = True
+            else:
+                start_worker = False
+            queue.append(_WorkItem(listens, future))
+        # the token has pending work from now on, so its client cannot be evicted
+        client = self.get_client(auth_token)
+
+        if start_worker:
+            self._executor.submit(self._drain, auth_token, client)
+        return future
+
+
+    def submit_many(self, work_items):
+        """ Schedule several ``(auth_token, listens)`` work items at once.
+
+        :param work_items: the work items to be submitted
+        :type work_items: Iterable[Tuple[str, List[liblistenbrainz.Listen]]]
+        :return: one future per work item, in the same order, see :meth:`submit`
+        :rtype: List[concurrent.futures.Future]
+        """
+        return [self.submit(auth_token, listens) for auth_token, listens in work_items]
+
+
+    def _drain(self, auth_token, client):
+        while True:
+            with self._lock:
+                queue = self._pending[auth_token]
+                if not queue:
+                    del self._pending[auth_token]
+                    self._changed.notify_all()
+                    return
+                item = queue[0]
+
+            if item.batches is None and not item.future.set_running_or_notify_cancel():
+                with self._lock:
+                    queue.popleft()
+                continue
+            try:
+                if item.batches is None:
+                    item.batches = _batch_listens_for_submission(
+                        item.listens, LISTEN_TYPE_IMPORT, MAX_LISTENS_PER_REQUEST, MAX_SUBMIT_PAYLOAD_SIZE, client._serializer,
+                    )
+                if item.next_batch is None:
+                    item.next_batch = next(item.batches)
+                delay = client._rate_limit_delay()
+                if delay > 0:
+                    self._throttle(auth_token, client, delay)
+                    return
+                batch, encoded_batch = item.next_batch
+                item.results.append((batch, client._post_encoded_listens(encoded_batch, LISTEN_TYPE_IMPORT)))
+                item.next_batch = None
+            except StopIteration:
+                item.future.set_result(item.results)
+            except Exception as e:
+                item.future.set_exception(e)
+            else:
+                continue
+            with self._lock:
+                queue.popleft()
+
+
+    def _throttle(self, auth_token, client, delay):
+        with self._lock:
+            self._throttled_count += 1
+            heapq.heappush(self._throttled, (time.monotonic() + delay, self._throttled_count, auth_token, client))
+            if self._scheduler is None:
+                self._scheduler = threading.Thread(target=self._schedule_throttled, daemon=True)
+                self._scheduler.start()
+            self._changed.notify_all()
+
+
+    def _schedule_throttled(self):
+        # gives the work of rate limited tokens back to the workers once their rate limit resets
+        with self._lock:
+            while not self._closing or self._throttled:
+                if not self._throttled:
+                    self._changed.wait()
+                    continue
+                delay = self._throttled[0][0] - time.monotonic()
+                if delay > 0:
+                    self._changed.wait(delay)
+                    continue
+                _, _, auth_token, client = heapq.heappop(self._throttled)
+                self._executor.submit(self._drain, auth_token, client)
+
+
+    def close(self):
+        """ Wait for all scheduled work items to be submitted, then close the clients and release the connection pool. """
+        with self._lock:
+            while self._pending:
+                self._changed.wait()
+            self._closing = True
+            self._changed.notify_all()
+            clients = list(self._clients.values())
+            self._clients.clear()
+        if self._scheduler is not None:
+            self._scheduler.join()
+        self._executor.shutdown(wait=True)
+        for client in clients:
+            client.close()
+        if self._owns_session:
+            self._session.close()
@@ -0,0 +1,207 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import logging
+import requests
+import sqlite3
+import threading
+import time
+
+from liblistenbrainz import errors
+from liblistenbrainz.utils import _listen_identity
+
+logger = logging.getLogger(__name__)
+
+
+class ListenSync:
+
+    def __init__(self, path, client, page_size=100):
+        """ Fetches the listens that users submitted since the previous sync.
+
+        The newest `listened_at` synced for each user, its high-water mark, is kept in an SQLite
+        database, so only the listens newer than the mark are fetched, by walking `min_ts` forwards
+        from it. Without new listens, a sync costs one small request per user. Listens that share
+        the timestamp of the mark are remembered too, so that listens submitted later with that
+        same timestamp are still returned once, and the ones already returned are not.
+
+        Users that were never synced are synced from the start of their listen history, unless a
+        starting point is given with :meth:`set_high_water_mark`.
+
+        :param path: the path of the database file, created if it does not exist
+        :type path: str
+        :param client: the client used to fetch the listens
+        :type client: liblistenbrainz.ListenBrainz
+        :param page_size: the number of listens to fetch per request, maximum is 100.
+        :type page_size: int, optional
+        """
+        self.path = path
+        self._client = client
+        self._page_size = page_size
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS high_water_marks (
+                username TEXT PRIMARY KEY,
+                listened_at INTEGER NOT NULL,
+                boundary TEXT NOT NULL,
+                synced_at REAL NOT NULL
+            )
+        """)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def _load_mark(self, username):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT listened_at, boundary FROM high_water_marks WHERE username = ?", (username,)
+            ).fetchone()
+        if row is None:
+            return None, None
+        listened_at, boundary = row
+        boundary = json.loads(boundary)
+        # a null boundary means that all the listens at listened_at are to be skipped
+        if boundary is None:
+            return listened_at, None
+        return listened_at, {tuple(identity) for identity in boundary}
+
+
+    def _save_mark(self, username, listened_at, boundary):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO high_water_marks (username, listened_at, boundary, synced_at) VALUES (?, ?, ?, ?)",
+                (username, listened_at, json.dumps(None if boundary is None else sorted(boundary, key=repr)), time.time()),
+            )
+
+
+    def get_high_water_mark(self, username):
+        """ Get the timestamp of the newest listen synced for user `username`, or None if the user was never synced.
+
+        :rtype: int
+        """
+        return self._load_mark(username)[0]
+
+
+    def set_high_water_mark(self, username, listened_at):
+        """ Set the point from which the next sync of user `username` starts.
+
+        Only listens with listened_at greater than (but not including) `listened_at` will be returned.
+
+        :param username: the username of the user
+        :type username: str
+        :param listened_at: a unix timestamp
+        :type listened_at: int
+        """
+        self._save_mark(username, listened_at, None)
+
+
+    def _fetch_new(self, username, mark_ts, boundary):
+        """ Returns the listens newer than the mark, oldest first, and the new mark with its boundary. """
+        new_listens = []
+        if mark_ts is None:
+            min_ts = 0
+        elif boundary is None:
+            min_ts = mark_ts
+        else:
+            min_ts = mark_ts - 1
+        while True:
+            # with only min_ts set, the API returns the listens right after min_ts, newest first
+            page = self._client.get_listens(username, min_ts=min_ts, count=self._page_size)
+            fresh = [
+                listen for listen in reversed(page)
+                if listen.listened_at != mark_ts or boundary is None or _listen_identity(listen) not in boundary
+            ]
+            new_listens.extend(fresh)
+            if fresh:
+                newest_ts = fresh[-1].listened_at
+                if newest_ts != mark_ts:
+                    mark_ts, boundary = newest_ts, set()
+                boundary.update(_listen_identity(listen) for listen in fresh if listen.listened_at == mark_ts)
+
+            if len(page) < self._page_size:
+                return new_listens, mark_ts, boundary
+            if not fresh:
+                # a full page of listens from a single second that have all been returned already,
+                # the remaining listens of that second cannot be reached so move past it
+                logger.warning("More than %d listens of user %s at %d, some may be skipped", self._page_size, username, mark_ts)
+                min_ts = mark_ts
+                continue
+            min_ts = mark_ts - 1
+
+
+    def sync(self, username):
+        """ Fetch the new listens of user `username` and advance their high-water mark past them.
+
+        :param username: the username of the user
+        :type username: str
+        :return: the listens submitted since the previous sync, oldest first
+        :rtype: List[liblistenbrainz.Listen]
+        :raises ListenBrainzAPIException: if the ListenBrainz API returns a non 2xx return code,
+            the high-water mark is then left unchanged
+        """
+        mark_ts, boundary = self._load_mark(username)
+        new_listens, mark_ts, boundary = self._fetch_new(username, mark_ts, boundary)
+        if new_listens:
+            self._save_mark(username, mark_ts, boundary)
+        return new_listens
+
+
+    def iter_new_listens(self, usernames, skip_errors=True):
+        """ Iterate over the new listens of each user, the delta since the previous sync.
+
+        The high-water mark of a user is only advanced once the next delta is requested, so if the
+        caller stops while processing the listens of a user, they are returned again by the next sync.
+
+        Users whose listens cannot be fetched, because ListenBrainz returns an error or cannot be
+        reached, are logged and skipped, and their high-water mark is left unchanged so that their
+        new listens are returned by a later sync.
+
+        :param usernames: the usernames of the users to sync
+        :type usernames: Iterable[str]
+        :param skip_errors: whether users whose listens cannot be fetched are skipped, if False the
+            error is raised instead
+        :type skip_errors: bool, optional
+        :return: an iterator over (username, listens) pairs, with the listens oldest first, for the
+            users that have new listens
+        :rtype: Iterator[Tuple[str, List[liblistenbrainz.Listen]]]
+        """
+        for username in usernames:
+            mark_ts, boundary = self._load_mark(username)
+            try:
+                new_listens, mark_ts, boundary = self._fetch_new(username, mark_ts, boundary)
+            except (errors.ListenBrainzException, requests.RequestException):
+                if not skip_errors:
+                    raise
+                logger.warning("Could not sync the listens of user %s, skipping", username, exc_info=True)
+                continue
+            if new_listens:
+                yield username, new_listens
+                self._save_mark(username, mark_ts, boundary)
+
+
+    def close(self):
+        """ Close the database. """
+        with self._lock:
+            self._connection.close()
@@ -14,9 +14,22 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import codecs
+import json
+import re
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from itertools import islice
 from liblistenbrainz import errors
+from liblistenbrainz.feedback import Feedback
 from liblistenbrainz.listen import Listen
 from liblistenbrainz.listen import LISTEN_TYPES, LISTEN_TYPE_SINGLE, LISTEN_TYPE_IMPORT, LISTEN_TYPE_PLAYING_NOW
+from liblistenbrainz.listen import MAX_LISTEN_SIZE
+
+# read-only stand-in for payloads without additional_info, never handed out to a Listen
+_EMPTY_ADDITIONAL_INFO = {}
 
 def _validate_submit_listens_payload(listen_type, listens):
     if not listens:
@@ -33,25 +46,198 @@ def _validate_submit_listens_payload(listen_type, listens):
         raise errors.ListenedAtInPlayingNowException("There is a listened_at field in a listen meant to be sent as `playing_now`")
 
 
+def _encode_submit_listens_body(listen_type, encoded_listens):
+    return b'{"listen_type":%s,"payload":[%s]}' % (json.dumps(listen_type).encode('utf-8'), b','.join(encoded_listens))
+
+
+def _batch_listens_for_submission(listens, listen_type, max_listens, max_size, serializer):
+    """ Pack an iterable of listens into batches that fit within both limits.
+
+    Yields tuples of (listens in batch, serialized listens in batch). Each listen is
+    serialized exactly once, and the serialized form is used both to measure the
+    batch and to build the request body.
+    """
+    encoded_listens = ((listen, serializer.encode_listen(listen)) for listen in listens)
+    return _batch_encoded_listens(encoded_listens, listen_type, max_listens, max_size)
+
+
+def _batch_encoded_listens(encoded_listens, listen_type, max_listens, max_size):
+    """ Pack (item, UTF-8 encoded serialized listen) pairs into batches that fit within both limits.
+
+    Yields tuples of (items in batch, serialized listens in batch).
+    """
+    overhead = len(_encode_submit_listens_body(listen_type, []))
+    batch, encoded_batch = [], []
+    batch_size = overhead
+    for item, encoded in encoded_listens:
+        size = len(encoded)
+        if size > MAX_LISTEN_SIZE or overhead + size > max_size:
+            raise errors.ListenTooLargeException("Listen is %d bytes when serialized, which is too large to submit" % size)
+
+        # each listen after the first adds a ',' separator to the body
+        separator = 1 if batch else 0
+        if len(batch) == max_listens or batch_size + separator + size > max_size:
+            yield batch, encoded_batch
+            batch, encoded_batch = [], []
+            batch_size = overhead
+            separator = 0
+
+        batch.append(item)
+        encoded_batch.append(encoded)
+        batch_size += separator + size
+
+    if batch:
+        yield batch, encoded_batch
+
+
+def _intern(value):
+    # names repeat a lot across the listens of a user, so share one copy of each
+    return sys.intern(value) if isinstance(value, str) else value
+
+
 def _convert_api_payload_to_listen(data):
     track_metadata = data['track_metadata']
-    additional_info = track_metadata.get('additional_info', {})
+    # additional_info is not copied, the listen keeps a reference to the dict in the payload
+    additional_info = track_metadata.get('additional_info') or _EMPTY_ADDITIONAL_INFO
     return Listen(
-        track_name=track_metadata['track_name'],
-        artist_name=track_metadata['artist_name'],
+        track_name=_intern(track_metadata['track_name']),
+        artist_name=_intern(track_metadata['artist_name']),
         listened_at=data.get('listened_at'),
-        release_name=track_metadata.get('release_name'),
+        release_name=_intern(track_metadata.get('release_name')),
         recording_mbid=additional_info.get('recording_mbid'),
-        artist_mbids=additional_info.get('artist_mbids', []),
+        artist_mbids=additional_info.get('artist_mbids'),
         release_mbid=additional_info.get('release_mbid'),
-        tags=additional_info.get('tags', []),
+        tags=additional_info.get('tags'),
         release_group_mbid=additional_info.get('release_group_mbid'),
-        work_mbids=additional_info.get('work_mbids', []),
+        work_mbids=additional_info.get('work_mbids'),
         tracknumber=additional_info.get('tracknumber'),
         spotify_id=additional_info.get('spotify_id'),
-        listening_from=additional_info.get('listening_from'),
+        listening_from=_intern(additional_info.get('listening_from')),
         isrc=additional_info.get('isrc'),
-        additional_info=additional_info,
-        username=data.get('username'),
+        additional_info=additional_info or None,
+        username=_intern(data.get('username')),
         recording_msid=data.get('recording_msid'),
     )
+
+
+def _convert_api_payload_to_feedback(data):
+    return Feedback(
+        score=data['score'],
+        recording_mbid=data.get('recording_mbid'),
+        recording_msid=data.get('recording_msid'),
+        created=data.get('created'),
+        username=_intern(data.get('user_id')),
+        track_metadata=data.get('track_metadata'),
+    )
+
+
+def _listen_identity(listen):
+    """ Returns a key that identifies a listen among the listens of a user. """
+    if listen.recording_msid:
+        return listen.listened_at, listen.recording_msid
+    return listen.listened_at, listen.track_name, listen.artist_name
+
+
+_EXHAUSTED = object()
+
+
+def _prefetch(iterator):
+    """ Iterate over `iterator`, computing the next item in a background thread
+    while the caller processes the current one.
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(next, iterator, _EXHAUSTED)
+        while True:
+            item = future.result()
+            if item is _EXHAUSTED:
+                return
+            future = executor.submit(next, iterator, _EXHAUSTED)
+            yield item
+
+
+def _map_concurrently(fn, items, max_workers):
+    """ Iterate over ``fn(item)`` for each item of `items`, in order, computing up to
+    `max_workers` results at the same time in a thread pool.
+
+    Only a bounded number of results is computed ahead of the caller, so that memory use
+    does not grow with the number of items when the caller is slower than `fn`.
+    """
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = deque(executor.submit(fn, item) for item in islice(items, 2 * max_workers))
+        try:
+            while pending:
+                result = pending.popleft().result()
+                for item in islice(items, 1):
+                    pending.append(executor.submit(fn, item))
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+_JSON_ARRAY_SEPARATORS = re.compile(r'[\s,]*')
+
+# how much of the start of a body is kept while looking for the array,
+# so that an array key split across two chunks is still found
+_ARRAY_KEY_LOOKBEHIND = 64
+
+
+def _decode_utf8_chunks(chunks):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b'', final=True)
+    if text:
+        yield text
+
+
+def _iter_streamed_json_array(chunks, array_start):
+    """ Incrementally decode the items of a JSON array inside a JSON document that arrives in chunks.
+
+    :param chunks: the text of the document, in chunks
+    :param array_start: a compiled regular expression matching the text up to and including the
+        opening bracket of the array, e.g. ``"listens": [``
+    :return: an iterator over the decoded items, each one yielded as soon as it has been received
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+
+    buffer = ''
+    while True:
+        match = array_start.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        chunk = next(chunks, None)
+        if chunk is None:
+            return
+        buffer = buffer[-_ARRAY_KEY_LOOKBEHIND:] + chunk
+
+    position = 0
+    exhausted = False
+    while True:
+        position = _JSON_ARRAY_SEPARATORS.match(buffer, position).end()
+        if position < len(buffer):
+            if buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # the item is incomplete, read more of the body unless there is no more
+                if exhausted:
+                    raise
+            else:
+                yield item
+                continue
+        elif exhausted:
+            raise json.JSONDecodeError("Unterminated array", buffer, position)
+
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+        else:
+            buffer = buffer[position:] + chunk
+            position = 0
@@ -0,0 +1,243 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+import threading
+import time
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_INTERVAL = 15 # seconds
+DEFAULT_MAX_INTERVAL = 5 * 60 # seconds
+
+PlayingNowChange = namedtuple('PlayingNowChange', ['username', 'previous', 'current'])
+
+
+def _get_duration(listen):
+    """ Returns the duration of the track in seconds, if the submitter sent it. """
+    additional_info = listen.additional_info
+    try:
+        if additional_info.get('duration_ms'):
+            return int(additional_info['duration_ms']) / 1000
+        if additional_info.get('duration'):
+            return int(additional_info['duration'])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def _playing_now_key(listen):
+    if listen is None:
+        return None
+    return listen.track_name, listen.artist_name, listen.release_name, listen.recording_mbid
+
+
+class PlayingNowWatcher:
+
+    def __init__(self, client, usernames=(), callback=None, min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL, max_workers=8):
+        """ Watches what many users are playing right now, and reports when it changes.
+
+        Each user is polled on their own schedule, adapted to what they are doing: a user playing
+        a track whose duration is known is polled again when the track should end, a user playing
+        a track of unknown duration every `min_interval` seconds, and a user playing nothing less
+        and less often the longer nothing has changed, up to every `max_interval` seconds. The users
+        that are due are polled concurrently, under the rate limit of the client.
+
+        Polls that return what was already playing are coalesced: a :class:`PlayingNowChange` is
+        only reported when a user starts playing another track, or stops playing. Changes are
+        passed to `callback`, and returned by :meth:`poll`. Polling can be run on a background
+        thread with :meth:`start`, or from an event loop with the :meth:`changes` async iterator.
+
+        :param client: the client used to make the requests
+        :type client: liblistenbrainz.ListenBrainz
+        :param usernames: the usernames of the users to watch
+        :type usernames: Iterable[str], optional
+        :param callback: called with each :class:`PlayingNowChange`
+        :type callback: Callable[[PlayingNowChange], None], optional
+        :param min_interval: the minimum number of seconds between two polls of a user
+        :type min_interval: float, optional
+        :param max_interval: the maximum number of seconds between two polls of a user
+        :type max_interval: float, optional
+        :param max_workers: the maximum number of users polled concurrently
+        :type max_workers: int, optional
+        """
+        self._client = client
+        self._callback = callback
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+        self._lock = threading.Lock()
+        self._users = {}
+        for username in usernames:
+            self.add_user(username)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._stop_event = threading.Event()
+        self._poller = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def _clock(self):
+        return time.monotonic()
+
+
+    def add_user(self, username):
+        """ Start watching user `username`, they are polled on the next :meth:`poll`. """
+        with self._lock:
+            self._users.setdefault(username, {
+                'current': None,
+                'changed_at': None, # set by the first poll
+                'next_poll_at': 0,
+                'failures': 0,
+            })
+
+
+    def remove_user(self, username):
+        """ Stop watching user `username`. """
+        with self._lock:
+            self._users.pop(username, None)
+
+
+    def get_playing_now(self, username):
+        """ Get the listen that user `username` was playing when they were last polled.
+
+        :rtype: liblistenbrainz.Listen or None
+        """
+        with self._lock:
+            state = self._users.get(username)
+            return state['current'] if state else None
+
+
+    def _next_interval(self, state, now):
+        if state['failures'] or state['changed_at'] is None:
+            interval = self.min_interval * 2 ** state['failures']
+        elif state['current'] is not None:
+            duration = _get_duration(state['current'])
+            if duration is None:
+                interval = self.min_interval
+            else:
+                interval = state['changed_at'] + duration - now
+        else:
+            # the longer a user has not been playing anything, the less likely they are to start
+            interval = (now - state['changed_at']) / 2
+        return min(max(interval, self.min_interval), self.max_interval)
+
+
+    def _time_until_next_poll(self):
+        with self._lock:
+            if not self._users:
+                return self.min_interval
+            next_poll_at = min(state['next_poll_at'] for state in self._users.values())
+        return max(next_poll_at - self._clock(), 0)
+
+
+    def poll(self):
+        """ Poll the users that are due, and report what changed.
+
+        :return: the changes since the previous poll of these users
+        :rtype: List[PlayingNowChange]
+        """
+        now = self._clock()
+        with self._lock:
+            due = [username for username, state in self._users.items() if state['next_poll_at'] <= now]
+        futures = [(username, self._executor.submit(self._client.get_playing_now, username)) for username in due]
+
+        changes = []
+        for username, future in futures:
+            try:
+                current = future.result()
+            except Exception as e:
+                current = e
+            now = self._clock()
+            with self._lock:
+                state = self._users.get(username)
+                if state is None:
+                    continue
+                if isinstance(current, Exception):
+                    logger.warning("Could not get the listen played by %s right now: %s", username, current)
+                    state['failures'] += 1
+                else:
+                    state['failures'] = 0
+                    if state['changed_at'] is None:
+                        state['changed_at'] = now
+                    if _playing_now_key(current) != _playing_now_key(state['current']):
+                        changes.append(PlayingNowChange(username, state['current'], current))
+                        state['changed_at'] = now
+                    state['current'] = current
+                state['next_poll_at'] = now + self._next_interval(state, now)
+
+        if self._callback is not None:
+            for change in changes:
+                self._callback(change)
+        return changes
+
+
+    def start(self):
+        """ Start a background thread that polls the users when they are due, passing the changes to the callback. """
+        if self._poller is not None:
+            return
+        self._stop_event.clear()
+        self._poller = threading.Thread(target=self._run_poller, daemon=True)
+        self._poller.start()
+
+
+    def _run_poller(self):
+        while not self._stop_event.wait(self._time_until_next_poll()):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Error while polling the listens played right now")
+
+
+    def stop(self):
+        """ Stop the background polling thread, if it is running. """
+        if self._poller is None:
+            return
+        self._stop_event.set()
+        self._poller.join()
+        self._poller = None
+
+
+    async def changes(self):
+        """ Poll the users when they are due, from an event loop.
+
+        The requests are made in threads, so the event loop is not blocked.
+
+        :return: an async iterator over the changes, that never ends
+        :rtype: AsyncIterator[PlayingNowChange]
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self._time_until_next_poll())
+            for change in await loop.run_in_executor(None, self.poll):
+                yield change
+
+
+    def close(self):
+        """ Stop the background polling thread and wait for the requests in flight. """
+        self.stop()
+        self._executor.shutdown(wait=True)
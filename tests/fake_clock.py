@@ -0,0 +1,46 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import requests
+import unittest
+
+from unittest import mock
+
+
+def _response(status_code, headers=None):
+    response = mock.MagicMock(status_code=status_code, headers=headers or {})
+    response.json.return_value = {'payload': {'count': 42}}
+    if status_code >= 400:
+        response.json.return_value = {'code': status_code, 'error': 'error'}
+        response.raise_for_status.side_effect = requests.HTTPError(response=response)
+    return response
+
+
+class FakeClockTestCase(unittest.TestCase):
+    """ Base class for the tests of the client's waits, in which time only passes when the client sleeps.
+
+    ``self.now`` is the value returned by ``time.monotonic``, ``self.mock_sleep`` is the mock of
+    ``time.sleep`` and ``self.session`` is a mock session.
+    """
+
+    def setUp(self):
+        self.now = 1000.0
+        mock_monotonic = mock.patch('time.monotonic', side_effect=lambda: self.now)
+        mock_sleep = mock.patch('time.sleep', side_effect=lambda seconds: setattr(self, 'now', self.now + seconds))
+        mock_monotonic.start()
+        self.mock_sleep = mock_sleep.start()
+        self.addCleanup(mock.patch.stopall)
+        self.session = mock.MagicMock()
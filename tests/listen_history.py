@@ -0,0 +1,57 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import liblistenbrainz
+import os
+import tempfile
+import unittest
+
+from unittest import mock
+
+
+class ListenHistoryTestCase(unittest.TestCase):
+    """ Base class for the tests of classes that store what they fetch with get_listens in a database.
+
+    ``self.client.get_listens`` serves the listens added to ``self.history`` with :meth:`_add_listens`,
+    and ``self.path`` is the path of a database file in a temporary directory.
+    """
+
+    database_name = 'test.sqlite'
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, self.database_name)
+        self.client = liblistenbrainz.ListenBrainz()
+        self.history = {'iliekcomputers': [], 'param': []}
+        self.client.get_listens = mock.MagicMock(side_effect=self._get_listens)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _get_listens(self, username, min_ts, count):
+        # like the API, the listens right after min_ts, newest first
+        listens = sorted((l for l in self.history[username] if l.listened_at > min_ts), key=lambda l: l.listened_at)
+        return list(reversed(listens[:count]))
+
+    def _add_listens(self, username, timestamps, artist_name="Daft Punk", **kwargs):
+        for ts in timestamps:
+            self.history[username].append(liblistenbrainz.Listen(
+                track_name=f"Track {len(self.history[username])}",
+                artist_name=artist_name,
+                listened_at=ts,
+                username=username,
+                **kwargs,
+            ))
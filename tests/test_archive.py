@@ -0,0 +1,130 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import liblistenbrainz
+import unittest
+import uuid
+
+from liblistenbrainz import errors
+from liblistenbrainz.batch import np
+from tests.listen_history import ListenHistoryTestCase
+from unittest import mock
+
+
+class ListenArchiveTestCase(ListenHistoryTestCase):
+
+    database_name = 'archive.sqlite'
+
+    def setUp(self):
+        super().setUp()
+        self.recording_mbid = str(uuid.uuid4())
+
+    def test_update_only_fetches_new_listens(self):
+        self._add_listens('iliekcomputers', [1, 2, 3, 3, 4])
+        with liblistenbrainz.ListenArchive(self.path, self.client, page_size=2) as archive:
+            self.assertEqual(archive.update('iliekcomputers'), 5)
+            self.assertEqual(len(archive), 5)
+
+        self._add_listens('iliekcomputers', [4, 5])
+        self._add_listens('param', [2])
+        with liblistenbrainz.ListenArchive(self.path, self.client, page_size=2) as archive:
+            self.client.get_listens.reset_mock()
+            self.assertEqual(archive.update_many(['iliekcomputers', 'param']), 3)
+            self.assertEqual(len(archive), 8)
+            self.assertEqual(archive.get_usernames(), ['iliekcomputers', 'param'])
+
+            self.client.get_listens.reset_mock()
+            self.assertEqual(archive.update_all(), 0)
+            self.assertEqual(self.client.get_listens.call_count, 2)
+
+    def test_mark_is_kept_when_storing_fails(self):
+        self._add_listens('iliekcomputers', [1, 2])
+        with liblistenbrainz.ListenArchive(self.path, self.client) as archive:
+            with mock.patch.object(archive, 'add', side_effect=RuntimeError):
+                with self.assertRaises(RuntimeError):
+                    archive.update('iliekcomputers')
+            self.assertEqual(archive.update('iliekcomputers'), 2)
+
+    def test_update_raises_fetch_errors(self):
+        self._add_listens('param', [1])
+        get_listens = self.client.get_listens.side_effect
+
+        def failing_get_listens(username, min_ts, count):
+            if username == 'iliekcomputers':
+                raise errors.ListenBrainzAPIException(status_code=500, message='oops')
+            return get_listens(username, min_ts, count)
+        self.client.get_listens.side_effect = failing_get_listens
+
+        with liblistenbrainz.ListenArchive(self.path, self.client) as archive:
+            with self.assertRaises(errors.ListenBrainzAPIException):
+                archive.update('iliekcomputers')
+            # several users are updated even if some of them fail
+            with self.assertLogs('liblistenbrainz.sync', level='WARNING'):
+                self.assertEqual(archive.update_many(['iliekcomputers', 'param']), 1)
+
+    def test_add_ignores_duplicates(self):
+        listen = liblistenbrainz.Listen(track_name="Fade", artist_name="Kanye West", listened_at=1)
+        with liblistenbrainz.ListenArchive(self.path) as archive:
+            self.assertEqual(archive.add([listen, listen], username='iliekcomputers'), 1)
+            self.assertEqual(archive.add([listen], username='param'), 1)
+            self.assertEqual(len(archive), 2)
+            with self.assertRaises(ValueError):
+                archive.add([listen])
+            with self.assertRaises(ValueError):
+                archive.update('iliekcomputers')
+
+    def test_queries(self):
+        self._add_listens('iliekcomputers', [1, 2, 3], tags=['french house'], recording_mbid=self.recording_mbid)
+        self._add_listens('iliekcomputers', [4, 5], artist_name="Kanye West", release_name="The Life of Pablo")
+        self._add_listens('param', [3, 6], artist_name="Kanye West")
+        with liblistenbrainz.ListenArchive(self.path, self.client) as archive:
+            archive.update_many(['iliekcomputers', 'param'])
+
+            listens = archive.get_listens(username='iliekcomputers')
+            self.assertEqual([l.listened_at for l in listens], [5, 4, 3, 2, 1])
+            self.assertEqual(listens[0].release_name, "The Life of Pablo")
+            self.assertEqual(listens[0].username, 'iliekcomputers')
+            self.assertEqual(listens[-1].tags, ['french house'])
+
+            listens = archive.get_listens(artist_name="Kanye West", newest_first=False)
+            self.assertEqual([(l.username, l.listened_at) for l in listens], [('param', 3), ('iliekcomputers', 4), ('iliekcomputers', 5), ('param', 6)])
+
+            listens = archive.get_listens(recording_mbid=self.recording_mbid, min_ts=1, max_ts=3)
+            self.assertEqual([l.listened_at for l in listens], [2])
+            self.assertEqual(listens[0].recording_mbid, self.recording_mbid)
+
+            self.assertEqual(len(archive.get_listens(limit=2)), 2)
+            self.assertEqual(archive.get_listen_count(username='param', min_ts=3), 1)
+
+    def test_iter_listens_reads_in_chunks(self):
+        listens = [liblistenbrainz.Listen(track_name=f"Track {i}", artist_name="Daft Punk", listened_at=i) for i in range(2500)]
+        with liblistenbrainz.ListenArchive(self.path) as archive:
+            archive.add(listens, username='iliekcomputers')
+            iterator = archive.iter_listens(newest_first=False)
+            self.assertEqual(next(iterator).listened_at, 0)
+            # the database can be written while an iteration is in progress
+            archive.add([liblistenbrainz.Listen(track_name="Fade", artist_name="Kanye West", listened_at=1)], username='param')
+            self.assertEqual(len(list(iterator)), 2499)
+
+    @unittest.skipIf(np is None, "numpy is not installed")
+    def test_get_listen_batch(self):
+        self._add_listens('iliekcomputers', [1, 2, 3], recording_mbid=self.recording_mbid)
+        self._add_listens('iliekcomputers', [4], artist_name="Kanye West")
+        with liblistenbrainz.ListenArchive(self.path, self.client) as archive:
+            archive.update('iliekcomputers')
+            batch = archive.get_listen_batch(username='iliekcomputers')
+        self.assertEqual(list(batch.listened_at), [4, 3, 2, 1])
+        self.assertEqual([l.recording_mbid for l in batch.to_listens()], [None] + [self.recording_mbid] * 3)
@@ -0,0 +1,143 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+import liblistenbrainz
+import os
+import threading
+import unittest
+
+from unittest import mock
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'testdata')
+
+
+class AsyncListenBrainzTestCase(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(TEST_DATA_DIR, 'get_listens_happy_path_response.json')) as f:
+            self.response_json = json.load(f)
+        self.session = mock.MagicMock()
+        self.session.get.return_value.status_code = 200
+        self.session.get.return_value.headers = {}
+        self.session.get.return_value.content = json.dumps(self.response_json).encode('utf-8')
+        self.session.get.return_value.json.return_value = self.response_json
+
+    def test_methods_mirror_sync_client(self):
+        for name in ('get_listens', 'get_user_artists', 'submit_multiple_listens', 'set_auth_token'):
+            method = getattr(liblistenbrainz.AsyncListenBrainz, name)
+            self.assertTrue(asyncio.iscoroutinefunction(method))
+            self.assertEqual(method.__doc__, getattr(liblistenbrainz.ListenBrainz, name).__doc__)
+
+    def test_get_listens(self):
+        async def run():
+            async with liblistenbrainz.AsyncListenBrainz(session=self.session) as client:
+                return await client.get_listens('iliekcomputers', count=10)
+
+        listens = asyncio.run(run())
+        self.session.get.assert_called_once_with(
+            'https://api.listenbrainz.org/1/user/iliekcomputers/listens',
+            params={'count': 10},
+            headers={},
+            timeout=liblistenbrainz.client.DEFAULT_TIMEOUT,
+        )
+        expected_listens = self.response_json['payload']['listens']
+        self.assertEqual([listen.listened_at for listen in listens], [listen['listened_at'] for listen in expected_listens])
+
+    def test_requests_run_concurrently(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def get(url, params, headers, timeout):
+            barrier.wait()
+            return self.session.get.return_value
+        self.session.get.side_effect = get
+
+        async def run():
+            async with liblistenbrainz.AsyncListenBrainz(max_concurrency=3, session=self.session) as client:
+                return await asyncio.gather(*(client.get_listens(user) for user in ('a', 'b', 'c')))
+
+        results = asyncio.run(run())
+        self.assertEqual(len(results), 3)
+
+    def test_rate_limit_wait_does_not_block_event_loop(self):
+        async def run():
+            async with liblistenbrainz.AsyncListenBrainz(session=self.session) as client:
+                with mock.patch.object(client._client, '_rate_limit_delay', side_effect=[0.05, 0]), \
+                        mock.patch('liblistenbrainz.async_client.asyncio.sleep', wraps=asyncio.sleep) as mock_sleep, \
+                        mock.patch('liblistenbrainz.client.time.sleep') as mock_time_sleep:
+                    await client._wait_until_rate_limit()
+                mock_sleep.assert_called_once_with(0.05)
+                mock_time_sleep.assert_not_called()
+
+        asyncio.run(run())
+
+    def test_submit_listens_in_batches(self):
+        self.session.post.return_value.status_code = 200
+        self.session.post.return_value.headers = {}
+        self.session.post.return_value.content = b'{"status": "ok"}'
+        self.session.post.return_value.json.return_value = {'status': 'ok'}
+        listens = [liblistenbrainz.Listen(track_name="Fade", artist_name="Kanye West", listened_at=i) for i in range(5)]
+
+        async def run():
+            async with liblistenbrainz.AsyncListenBrainz(session=self.session) as client:
+                await client.set_auth_token('token', check_validity=False)
+                return [batch async for batch, _ in client.submit_listens_in_batches(listens, max_listens_per_batch=2)]
+
+        batches = asyncio.run(run())
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+
+    def test_client_options_are_forwarded(self):
+        rate_limiter = liblistenbrainz.RateLimiter()
+        cache = liblistenbrainz.MemoryCache()
+        hook = mock.MagicMock()
+
+        async def run():
+            async with liblistenbrainz.AsyncListenBrainz(
+                session=self.session,
+                rate_limiter=rate_limiter,
+                cache=cache,
+                api_base_url='http://localhost:8100',
+                hooks=[hook],
+                timeout=5,
+            ) as client:
+                self.assertIs(client._client._rate_limiter, rate_limiter)
+                self.assertIs(client._client._cache, cache)
+                await client.get_listens('iliekcomputers')
+
+        asyncio.run(run())
+        self.assertEqual(self.session.get.call_args.args[0], 'http://localhost:8100/1/user/iliekcomputers/listens')
+        self.assertEqual(self.session.get.call_args.kwargs['timeout'], 5)
+        hook.assert_called_once()
+
+    def test_with_timeout(self):
+        async def run():
+            async with liblistenbrainz.AsyncListenBrainz(session=self.session) as client:
+                limited = client.with_timeout(timeout=2, deadline=1)
+                await limited.get_listens('iliekcomputers')
+                # both timeouts are clamped to the time left before the deadline
+                self.assertLessEqual(self.session.get.call_args.kwargs['timeout'], 1)
+
+                with mock.patch.object(limited._client, '_rate_limit_delay', return_value=30):
+                    with self.assertRaises(liblistenbrainz.errors.ListenBrainzTimeoutException):
+                        await limited.get_listens('iliekcomputers')
+
+                # closing the returned client does not stop the threads of this one
+                limited.close()
+                await client.get_listens('iliekcomputers')
+                self.assertEqual(self.session.get.call_count, 2)
+
+        asyncio.run(run())
@@ -0,0 +1,72 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import liblistenbrainz
+import unittest
+import uuid
+
+from liblistenbrainz.batch import np
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class ListenBatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.recording_mbid = str(uuid.uuid4())
+        self.listens = [
+            liblistenbrainz.Listen(track_name="Fade", artist_name="Kanye West", listened_at=30, recording_mbid=self.recording_mbid),
+            liblistenbrainz.Listen(track_name="Contact", artist_name="Daft Punk", listened_at=10, release_name="Random Access Memories"),
+            liblistenbrainz.Listen(track_name="Get Lucky", artist_name="Daft Punk", listened_at=20, recording_mbid="not an mbid"),
+            liblistenbrainz.Listen(track_name="Fade", artist_name="Kanye West", listened_at=40, recording_mbid=self.recording_mbid),
+        ]
+        self.batch = liblistenbrainz.ListenBatch.from_listens(self.listens)
+
+    def test_columns_are_encoded(self):
+        self.assertEqual(len(self.batch), 4)
+        self.assertEqual(self.batch.listened_at.dtype, np.int64)
+        self.assertEqual(self.batch._dictionaries['artist_name'], ['Kanye West', 'Daft Punk'])
+        self.assertEqual(self.batch._mbids['recording_mbid'].dtype, np.dtype('S16'))
+        self.assertEqual(self.batch.column('release_name'), [None, 'Random Access Memories', None, None])
+        self.assertEqual(self.batch.column('recording_mbid'), [self.recording_mbid, None, None, self.recording_mbid])
+
+    def test_round_trip(self):
+        listens = self.batch.to_listens()
+        for received, expected in zip(listens, self.listens):
+            self.assertEqual(received.listened_at, expected.listened_at)
+            self.assertEqual(received.track_name, expected.track_name)
+            self.assertEqual(received.artist_name, expected.artist_name)
+            self.assertEqual(received.release_name, expected.release_name)
+
+    def test_filters(self):
+        self.assertEqual(self.batch.filter_time_range(min_ts=10, max_ts=40).column('listened_at'), [30, 20])
+        self.assertEqual(self.batch.filter_artist('Daft Punk').column('track_name'), ['Contact', 'Get Lucky'])
+        self.assertEqual(len(self.batch.filter_artist('Unknown')), 0)
+        self.assertEqual(self.batch.filter_recording(self.recording_mbid).column('listened_at'), [30, 40])
+        self.assertEqual(self.batch.sort_by_time().column('listened_at'), [40, 30, 20, 10])
+
+    def test_filter_recording_with_invalid_mbid(self):
+        self.assertEqual(len(self.batch.filter_recording(None)), 0)
+        self.assertEqual(len(self.batch.filter_recording("not an mbid")), 0)
+
+    def test_sort_by_time_keeps_order_of_ties(self):
+        self.listens[1].listened_at = 30
+        batch = liblistenbrainz.ListenBatch.from_listens(self.listens)
+        self.assertEqual(batch.sort_by_time().column('track_name'), ['Fade', 'Fade', 'Contact', 'Get Lucky'])
+        self.assertEqual(batch.sort_by_time(descending=False).column('track_name'), ['Get Lucky', 'Fade', 'Contact', 'Fade'])
+
+    def test_count_by(self):
+        self.assertEqual(self.batch.count_by('artist_name'), [('Kanye West', 2), ('Daft Punk', 2)])
+        self.assertEqual(self.batch.filter_time_range(min_ts=15).count_by('track_name'), [('Fade', 2), ('Get Lucky', 1)])
@@ -0,0 +1,50 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import liblistenbrainz
+import unittest
+
+from benchmarks import run
+from benchmarks.fake_server import FakeListenBrainz
+
+
+class BenchmarkTestCase(unittest.TestCase):
+    """ Runs the benchmarks at a tiny size, so that they keep working as the client changes. """
+
+    def test_scenarios(self):
+        options = run.parse_args(['--latency', '0', '--listens', '250', '--users', '2', '--entities', '30', '--memory'])
+        for name in run.SCENARIOS:
+            results = run.run_scenario(name, options)
+            self.assertEqual(results['scenario'], name)
+            self.assertIn('peak_memory_mb', results)
+        self.assertEqual(run.run_scenario('export', options)['listens'], 250)
+
+        options = run.parse_args(['--latency', '0', '--listens', '2500'])
+        results = run.run_scenario('submit', options)
+        self.assertEqual((results['listens'], results['batches']), (2500, 3))
+
+    def test_fake_server(self):
+        with FakeListenBrainz(listens_per_user=150, no_stats_users=['new_user']) as server:
+            with liblistenbrainz.ListenBrainz(api_base_url=server.url) as client:
+                self.assertEqual(len(list(client.iter_listens('iliekcomputers', prefetch=False))), 150)
+                self.assertIsNone(client.get_user_artists('new_user'))
+                self.assertEqual(client.get_user_listen_count('iliekcomputers'), 150)
+
+        with FakeListenBrainz(rate_limit=2) as server:
+            with liblistenbrainz.ListenBrainz(api_base_url=server.url) as client:
+                client.get_playing_now('iliekcomputers')
+                self.assertEqual(client.remaining_requests, 1)
+                self.assertEqual(client.ratelimit_reset_in, 10)
@@ -0,0 +1,140 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import liblistenbrainz
+import os
+import tempfile
+import unittest
+
+from liblistenbrainz.cache import CacheEntry
+from unittest import mock
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.MagicMock()
+        self.response = self.session.get.return_value
+        self.response.status_code = 200
+        self.response.headers = {'ETag': '"v1"'}
+        self.response.json.return_value = {'payload': {'count': 42}}
+        self.cache = liblistenbrainz.MemoryCache()
+        self.client = liblistenbrainz.ListenBrainz(session=self.session, cache=self.cache, serializer=liblistenbrainz.JSONSerializer())
+
+    def test_cached_response_is_reused_until_ttl(self):
+        self.assertEqual(self.client.get_user_listen_count('iliekcomputers'), 42)
+        self.assertEqual(self.client.get_user_listen_count('iliekcomputers'), 42)
+        self.session.get.assert_called_once()
+
+        with mock.patch('liblistenbrainz.client.time.time', return_value=10 ** 10):
+            self.client.get_user_listen_count('iliekcomputers')
+        self.assertEqual(self.session.get.call_count, 2)
+
+    def test_only_cacheable_endpoints_are_cached(self):
+        self.response.json.return_value = {'payload': {'listens': []}}
+        self.client.get_listens('iliekcomputers')
+        self.client.get_listens('iliekcomputers')
+        self.assertEqual(self.session.get.call_count, 2)
+
+    def test_stale_response_is_revalidated(self):
+        self.client.get_user_artists('iliekcomputers')
+        key = next(iter(self.cache._entries))
+        self.cache.set(key, self.cache.get(key)._replace(expires_at=0))
+
+        self.response.status_code = 304
+        self.response.json.side_effect = ValueError
+        self.assertEqual(self.client.get_user_artists('iliekcomputers'), {'payload': {'count': 42}})
+        self.assertEqual(self.session.get.call_args.kwargs['headers'], {'If-None-Match': '"v1"'})
+        self.assertGreater(self.cache.get(key).expires_at, 0)
+
+    def test_ttl_per_endpoint_group(self):
+        client = liblistenbrainz.ListenBrainz(
+            session=self.session,
+            cache=self.cache,
+            cache_ttls={'listen_count': 0},
+            serializer=liblistenbrainz.JSONSerializer(),
+        )
+        client.get_user_listen_count('iliekcomputers')
+        client.get_user_listen_count('iliekcomputers')
+        self.assertEqual(self.session.get.call_count, 2)
+
+    def test_no_content_response_is_cached(self):
+        self.response.status_code = 204
+        self.assertIsNone(self.client.get_user_artists('iliekcomputers'))
+        self.assertIsNone(self.client.get_user_artists('iliekcomputers'))
+        self.session.get.assert_called_once()
+        self.response.json.assert_not_called()
+
+        # callers that do not expect a 204 still get an exception from a cached one
+        with self.assertRaises(liblistenbrainz.errors.ListenBrainzAPIException):
+            self.client._get('/1/stats/user/iliekcomputers/artists', params={'count': 25, 'offset': 0, 'range': 'all_time'})
+
+    def test_cached_response_is_not_modified_by_callers(self):
+        self.response.json.return_value = {'payload': {'artists': ['Daft Punk']}}
+        self.client.get_user_artists('iliekcomputers')['payload']['artists'].append('Kanye West')
+        artists = self.client.get_user_artists('iliekcomputers')['payload']['artists']
+        self.assertEqual(artists, ['Daft Punk'])
+        artists.clear()
+        self.assertEqual(self.client.get_user_artists('iliekcomputers')['payload']['artists'], ['Daft Punk'])
+        self.session.get.assert_called_once()
+
+    def test_servers_do_not_share_responses(self):
+        other = liblistenbrainz.ListenBrainz(
+            session=self.session,
+            cache=self.cache,
+            api_base_url='https://listenbrainz.example.org',
+            serializer=liblistenbrainz.JSONSerializer(),
+        )
+        self.client.get_user_listen_count('iliekcomputers')
+        other.get_user_listen_count('iliekcomputers')
+        self.assertEqual(self.session.get.call_count, 2)
+
+    def test_memory_cache_is_bounded(self):
+        cache = liblistenbrainz.MemoryCache(maxsize=2)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, CacheEntry(key, 0, None, None))
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('c').data, 'c')
+
+
+class DiskCacheTestCase(unittest.TestCase):
+
+    def test_entries_survive_reopening(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cache.sqlite')
+            cache = liblistenbrainz.DiskCache(path, maxsize=2)
+            cache.set('a', CacheEntry({'count': 1}, 100.0, '"v1"', None))
+            cache.set('b', CacheEntry({'count': 2}, 100.0, None, None))
+            cache.get('a')
+            cache.set('c', CacheEntry({'count': 3}, 100.0, None, None))
+            cache.close()
+
+            cache = liblistenbrainz.DiskCache(path, maxsize=2)
+            self.assertEqual(cache.get('a'), CacheEntry({'count': 1}, 100.0, '"v1"', None))
+            self.assertIsNone(cache.get('b'))
+            self.assertEqual(cache.get('c').data, {'count': 3})
+            cache.close()
+
+    def test_failed_set_is_rolled_back(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = liblistenbrainz.DiskCache(os.path.join(directory, 'cache.sqlite'))
+            cache.set('a', CacheEntry({'count': 1}, 100.0, None, None))
+            with self.assertRaises(Exception):
+                cache.set('b', CacheEntry({'count': 2}, object(), None, None))
+            cache.set('c', CacheEntry({'count': 3}, 100.0, None, None))
+            self.assertIsNone(cache.get('b'))
+            self.assertEqual(cache.get('c').data, {'count': 3})
+            cache.close()
@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import itertools
 import json
 import os
 import liblistenbrainz
@@ -31,7 +32,7 @@ TEST_DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'testd
 class ListenBrainzClientTestCase(unittest.TestCase):
 
     def setUp(self):
-        self.client = liblistenbrainz.ListenBrainz()
+        self.client = liblistenbrainz.ListenBrainz(serializer=liblistenbrainz.JSONSerializer())
 
     @mock.patch('liblistenbrainz.client.requests.Session.get')
     def test_get_injects_auth_token_if_available(self, mock_requests_get):
@@ -41,6 +42,7 @@ class ListenBrainzClientTestCase(unittest.TestCase):
             'https://api.listenbrainz.org/1/user/iliekcomputers/listens',
             params={},
             headers={},
+            timeout=liblistenbrainz.client.DEFAULT_TIMEOUT,
         )
 
         mock_requests_get.reset_mock()
@@ -51,7 +53,8 @@ class ListenBrainzClientTestCase(unittest.TestCase):
         mock_requests_get.assert_called_once_with(
             'https://api.listenbrainz.org/1/user/iliekcomputers/listens',
             params={},
-            headers={'Authorization': f'Token {auth_token}'}
+            headers={'Authorization': f'Token {auth_token}'},
+            timeout=liblistenbrainz.client.DEFAULT_TIMEOUT,
         )
 
 
@@ -63,6 +66,7 @@ class ListenBrainzClientTestCase(unittest.TestCase):
             'https://api.listenbrainz.org/1/user/iliekcomputers/listens',
             data=None,
             headers={},
+            timeout=liblistenbrainz.client.DEFAULT_TIMEOUT,
         )
 
         mock_requests_post.reset_mock()
@@ -73,10 +77,44 @@ class ListenBrainzClientTestCase(unittest.TestCase):
         mock_requests_post.assert_called_once_with(
             'https://api.listenbrainz.org/1/user/iliekcomputers/listens',
             data=None,
-            headers={'Authorization': f'Token {auth_token}'}
+            headers={'Authorization': f'Token {auth_token}'},
+            timeout=liblistenbrainz.client.DEFAULT_TIMEOUT,
         )
 
 
+    @mock.patch('liblistenbrainz.client.requests.Session.get')
+    def test_requests_share_one_session(self, mock_requests_get):
+        mock_requests_get.return_value = mock.MagicMock()
+        session = self.client._session
+        self.client._get('/1/user/iliekcomputers/listens')
+        self.client._get('/1/user/iliekcomputers/playing-now')
+        self.assertIs(self.client._session, session)
+        self.assertEqual(mock_requests_get.call_count, 2)
+
+    def test_client_pool_configuration(self):
+        client = liblistenbrainz.ListenBrainz(pool_connections=2, pool_maxsize=20, pool_block=True, keep_alive=False)
+        adapter = client._session.get_adapter('https://api.listenbrainz.org')
+        self.assertEqual(adapter._pool_connections, 2)
+        self.assertEqual(adapter._pool_maxsize, 20)
+        self.assertTrue(adapter._pool_block)
+        self.assertEqual(client._session.headers['Connection'], 'close')
+
+    def test_client_injected_session_is_not_closed(self):
+        session = mock.MagicMock()
+        session.get.return_value.status_code = 200
+        session.get.return_value.json.return_value = {'valid': True}
+        with liblistenbrainz.ListenBrainz(session=session, serializer=liblistenbrainz.JSONSerializer()) as client:
+            self.assertTrue(client.is_token_valid('token'))
+        session.get.assert_called_once()
+        session.close.assert_not_called()
+
+    @mock.patch('liblistenbrainz.client.requests.Session.close')
+    def test_client_close(self, mock_session_close):
+        with liblistenbrainz.ListenBrainz():
+            pass
+        mock_session_close.assert_called_once()
+
+
     def test_client_get_listens(self):
         self.client._get = mock.MagicMock()
         with open(os.path.join(TEST_DATA_DIR, 'get_listens_happy_path_response.json')) as f:
@@ -143,6 +181,113 @@ class ListenBrainzClientTestCase(unittest.TestCase):
             self.assertEqual(received_listens[i].track_name, expected_listens[i]['track_metadata']['track_name'])
 
 
+    def _mock_listen_history(self, timestamps):
+        history = [
+            liblistenbrainz.Listen(track_name=f"Track {i}", artist_name="Daft Punk", listened_at=ts, recording_msid=str(i))
+            for i, ts in enumerate(sorted(timestamps, reverse=True))
+        ]
+
+        def get_listens(username, max_ts=None, min_ts=None, count=None):
+            listens = [listen for listen in history if max_ts is None or listen.listened_at < max_ts]
+            return listens[:count]
+        self.client.get_listens = mock.MagicMock(side_effect=get_listens)
+        return history
+
+    def test_iter_listens_walks_whole_history(self):
+        history = self._mock_listen_history(range(1000, 1250))
+        received = list(self.client.iter_listens('iliekcomputers', page_size=100))
+        self.assertEqual([listen.recording_msid for listen in received], [listen.recording_msid for listen in history])
+        self.assertEqual(self.client.get_listens.call_count, 3)
+        self.assertEqual(self.client.get_listens.call_args_list[0], mock.call('iliekcomputers', max_ts=None, count=100))
+
+    def test_iter_listens_deduplicates_ties_at_page_boundaries(self):
+        # 4 listens share a timestamp across the boundary of the first and second page
+        history = self._mock_listen_history([10, 9, 8, 7, 7, 7, 7, 6, 5, 4, 3])
+        received = list(self.client.iter_listens('iliekcomputers', page_size=5, prefetch=False))
+        self.assertEqual([listen.recording_msid for listen in received], [listen.recording_msid for listen in history])
+
+    def test_iter_listens_time_window(self):
+        self._mock_listen_history(range(100))
+        received = list(self.client.iter_listens('iliekcomputers', min_ts=20, max_ts=80, page_size=25))
+        self.assertEqual([listen.listened_at for listen in received], list(range(79, 20, -1)))
+
+    def test_export_listens(self):
+        history = self._mock_listen_history(range(30))
+        received = self.client.export_listens('iliekcomputers', page_size=7)
+        self.assertEqual(len(received), len(history))
+
+    def test_iter_listens_sharded(self):
+        timestamps = [ts for ts in range(1000, 5000, 7)] + [2000, 2000, 2001, 3000]
+        history = self._mock_listen_history(timestamps)
+        self.client._get_listens_payload = mock.MagicMock(return_value={
+            'listens': [{'listened_at': history[0].listened_at}],
+            'latest_listen_ts': history[0].listened_at,
+            'oldest_listen_ts': history[-1].listened_at,
+        })
+        self.client.get_user_listen_count = mock.MagicMock(return_value=len(history))
+
+        received = list(self.client.iter_listens_sharded('iliekcomputers', page_size=20, max_workers=3, listens_per_shard=50))
+        self.assertEqual([listen.recording_msid for listen in received], [listen.recording_msid for listen in history])
+        # each window was fetched separately
+        self.assertGreater(self.client.get_listens.call_count, len(history) // 20)
+
+        received = self.client.export_listens('iliekcomputers', min_ts=1999, max_ts=3001, max_workers=2)
+        self.assertEqual(
+            [listen.recording_msid for listen in received],
+            [listen.recording_msid for listen in history if 1999 < listen.listened_at < 3001],
+        )
+
+    def test_iter_listens_sharded_no_listens(self):
+        self.client._get_listens_payload = mock.MagicMock(return_value={'listens': [], 'count': 0})
+        self.assertEqual(list(self.client.iter_listens_sharded('iliekcomputers')), [])
+
+    @mock.patch('liblistenbrainz.client.requests.Session.get')
+    def test_stream_listens(self, mock_requests_get):
+        with open(os.path.join(TEST_DATA_DIR, 'get_listens_happy_path_response.json'), 'rb') as f:
+            body = f.read()
+        response_json = json.loads(body)
+
+        # deliver the body in small chunks, splitting multi-byte characters and the array key
+        chunks_read = []
+        def iter_content(chunk_size):
+            for i in range(0, len(body), 7):
+                chunks_read.append(i)
+                yield body[i:i + 7]
+        mock_requests_get.return_value.status_code = 200
+        mock_requests_get.return_value.iter_content.side_effect = iter_content
+
+        listens = self.client.stream_listens('iliekcomputers', count=25)
+        first = next(listens)
+        self.assertLess(len(chunks_read) * 7, len(body))
+        received_listens = [first] + list(listens)
+
+        mock_requests_get.assert_called_once_with(
+            'https://api.listenbrainz.org/1/user/iliekcomputers/listens',
+            params={'count': 25},
+            headers={},
+            stream=True,
+            timeout=liblistenbrainz.client.DEFAULT_TIMEOUT,
+        )
+        mock_requests_get.return_value.close.assert_called_once()
+        expected_listens = response_json['payload']['listens']
+        self.assertEqual(len(received_listens), len(expected_listens))
+        for received, expected in zip(received_listens, expected_listens):
+            self.assertEqual(received.listened_at, expected['listened_at'])
+            self.assertEqual(received.track_name, expected['track_metadata']['track_name'])
+
+    def test_iter_streamed_json_array(self):
+        from liblistenbrainz.utils import _iter_streamed_json_array, _decode_utf8_chunks
+        from liblistenbrainz.client import _LISTENS_ARRAY_START
+
+        body = '{"payload": {"count": 2, "listens": [{"a": "é]"}, {"b": [1, 2]}], "user_id": "x"}}'.encode('utf-8')
+        for size in (1, 3, len(body)):
+            chunks = _decode_utf8_chunks(body[i:i + size] for i in range(0, len(body), size))
+            self.assertEqual(list(_iter_streamed_json_array(chunks, _LISTENS_ARRAY_START)), [{'a': 'é]'}, {'b': [1, 2]}])
+
+        self.assertEqual(list(_iter_streamed_json_array(['{"payload": {"listens": []}}'], _LISTENS_ARRAY_START)), [])
+        with self.assertRaises(json.JSONDecodeError):
+            list(_iter_streamed_json_array(['{"payload": {"listens": [{"a": 1}, {"b"'], _LISTENS_ARRAY_START))
+
     def test_client_get_playing_now(self):
         self.client._get = mock.MagicMock()
         with open(os.path.join(TEST_DATA_DIR, 'get_playing_now_happy_path_response.json')) as f:
@@ -170,8 +315,7 @@ class ListenBrainzClientTestCase(unittest.TestCase):
         self.assertIsNone(received_listen)
 
     @mock.patch('liblistenbrainz.client.requests.Session.post')
-    @mock.patch('liblistenbrainz.client.json.dumps')
-    def test_submit_single_listen(self, mock_json_dumps, mock_requests_post):
+    def test_submit_single_listen(self, mock_requests_post):
         ts = int(time.time())
         listen = liblistenbrainz.Listen(
             track_name="Fade",
@@ -194,7 +338,6 @@ class ListenBrainzClientTestCase(unittest.TestCase):
             ]
         }
 
-        mock_json_dumps.return_value = "mock data to be sent"
         mock_requests_post.return_value.json.return_value = {'status': 'ok'}
         auth_token = str(uuid.uuid4())
         self.client.is_token_valid = mock.MagicMock(return_value=True)
@@ -202,10 +345,11 @@ class ListenBrainzClientTestCase(unittest.TestCase):
         response = self.client.submit_single_listen(listen)
         mock_requests_post.assert_called_once_with(
             'https://api.listenbrainz.org/1/submit-listens',
-            data="mock data to be sent",
-            headers={'Authorization': f'Token {auth_token}'}
+            data=mock.ANY,
+            headers={'Authorization': f'Token {auth_token}'},
+            timeout=liblistenbrainz.client.DEFAULT_TIMEOUT,
         )
-        mock_json_dumps.assert_called_once_with(expected_payload)
+        self.assertEqual(json.loads(mock_requests_post.call_args.kwargs['data']), expected_payload)
         self.assertEqual(response['status'], 'ok')
 
     def test_submit_payload_exceptions(self):
@@ -246,6 +390,44 @@ class ListenBrainzClientTestCase(unittest.TestCase):
         with self.assertRaises(errors.ListenedAtInPlayingNowException):
             self.client.submit_playing_now(listen)
 
+    def test_submit_listens_in_batches(self):
+        self.client._post = mock.MagicMock(return_value={'status': 'ok'})
+        self.client.is_token_valid = mock.MagicMock(return_value=True)
+        self.client.set_auth_token(str(uuid.uuid4()))
+
+        ts = int(time.time())
+        listens = (
+            liblistenbrainz.Listen(track_name=f"Track {i}", artist_name="Daft Punk", listened_at=ts + i)
+            for i in range(25)
+        )
+        results = list(self.client.submit_listens_in_batches(listens, max_listens_per_batch=10))
+
+        self.assertEqual([len(batch) for batch, _ in results], [10, 10, 5])
+        self.assertEqual(self.client._post.call_count, 3)
+        for (batch, response), call in zip(results, self.client._post.call_args_list):
+            self.assertEqual(response, {'status': 'ok'})
+            self.assertEqual(call.args[0], '/1/submit-listens')
+            body = json.loads(call.kwargs['data'])
+            self.assertEqual(body['listen_type'], 'import')
+            self.assertEqual(body['payload'], [listen._to_submit_payload() for listen in batch])
+
+    def test_submit_listens_in_batches_respects_size_limit(self):
+        self.client._post = mock.MagicMock(return_value={'status': 'ok'})
+        self.client.is_token_valid = mock.MagicMock(return_value=True)
+        self.client.set_auth_token(str(uuid.uuid4()))
+
+        listens = [liblistenbrainz.Listen(track_name="x" * 100, artist_name="Daft Punk", listened_at=i) for i in range(10)]
+        max_batch_size = 600
+        results = list(self.client.submit_listens_in_batches(listens, max_batch_size=max_batch_size))
+
+        self.assertEqual(sum(len(batch) for batch, _ in results), 10)
+        self.assertGreater(len(results), 1)
+        for call in self.client._post.call_args_list:
+            self.assertLessEqual(len(call.kwargs['data']), max_batch_size)
+
+        with self.assertRaises(errors.ListenTooLargeException):
+            list(self.client.submit_listens_in_batches(listens, max_batch_size=100))
+
     def test_set_auth_token_invalid_token(self):
         self.client.is_token_valid = mock.MagicMock(return_value=False)
 
@@ -258,7 +440,7 @@ class ListenBrainzClientTestCase(unittest.TestCase):
         self.client.set_auth_token(auth_token)
         self.assertEqual(auth_token, self.client._auth_token)
 
-    @mock.patch('liblistenbrainz.client.requests.post')
+    @mock.patch('liblistenbrainz.client.requests.Session.post')
     def test_post_api_exceptions(self, mock_requests_post):
         response = mock.MagicMock()
         response.json.return_value = {'code': 401, 'error': 'Unauthorized'}
@@ -312,6 +494,7 @@ class ListenBrainzClientTestCase(unittest.TestCase):
                     'offset': 3
                    },
             headers={},
+            timeout=liblistenbrainz.client.DEFAULT_TIMEOUT,
         )
 
         mock_requests_get.reset_mock()
@@ -325,6 +508,7 @@ class ListenBrainzClientTestCase(unittest.TestCase):
                     'offset': 3
                    },
             headers={},
+            timeout=liblistenbrainz.client.DEFAULT_TIMEOUT,
         )
 
     def test_get_user_listen_count(self):
@@ -337,3 +521,162 @@ class ListenBrainzClientTestCase(unittest.TestCase):
         
         self.assertEqual(returned_count, test_response['payload']['count'])
 
+
+
+    def test_submit_user_feedback_bulk(self):
+        self.client._auth_token = 'token'
+        self.client.get_user_feedback = mock.MagicMock(side_effect=[
+            {'feedback': [
+                {'recording_mbid': 'loved', 'score': 1},
+                {'recording_mbid': 'hated', 'score': -1},
+            ], 'count': 2, 'offset': 0, 'total_count': 2},
+        ])
+        def submit_user_feedback(score, recording_mbid):
+            if recording_mbid == 'bad':
+                raise errors.ListenBrainzAPIException(400, 'bad mbid')
+            if recording_mbid == 'unreachable':
+                raise requests.ConnectionError('Connection refused')
+        self.client.submit_user_feedback = mock.MagicMock(side_effect=submit_user_feedback)
+
+        result = self.client.submit_user_feedback_bulk([
+            ('loved', 1),
+            ('hated', 1),
+            ('new', -1),
+            ('unknown', 0),
+            ('bad', 1),
+            ('unreachable', 1),
+            ('new', 1),
+        ], username='iliekcomputers')
+
+        self.client.get_user_feedback.assert_called_once_with('iliekcomputers', score=None, metadata=False, count=100, offset=0)
+        self.assertEqual(sorted(result['submitted']), ['hated', 'new'])
+        self.assertEqual(sorted(result['skipped']), ['loved', 'unknown'])
+        self.assertEqual(sorted(result['failed']), ['bad', 'unreachable'])
+        self.assertIsInstance(result['failed']['unreachable'], requests.ConnectionError)
+        self.client.submit_user_feedback.assert_any_call(1, 'hated')
+        self.client.submit_user_feedback.assert_any_call(1, 'new')
+        self.assertEqual(self.client.submit_user_feedback.call_count, 4)
+
+
+    def test_submit_user_feedback_bulk_requires_token(self):
+        with self.assertRaises(errors.AuthTokenRequiredException):
+            self.client.submit_user_feedback_bulk([('mbid', 1)])
+
+
+    def _mock_feedback_history(self, total):
+        feedback = [
+            {'recording_mbid': str(i), 'recording_msid': None, 'score': 1, 'created': 1000 - i, 'user_id': 'iliekcomputers'}
+            for i in range(total)
+        ]
+        def get_user_feedback(username, score, metadata, count, offset):
+            page = feedback[offset:offset + count]
+            if not page:
+                return None
+            return {'feedback': page, 'count': len(page), 'offset': offset, 'total_count': total}
+        self.client.get_user_feedback = mock.MagicMock(side_effect=get_user_feedback)
+
+
+    def test_iter_user_feedback(self):
+        self._mock_feedback_history(25)
+        feedback = list(self.client.iter_user_feedback('iliekcomputers', page_size=10))
+        self.assertEqual([f.recording_mbid for f in feedback], [str(i) for i in range(25)])
+        self.assertIsInstance(feedback[0], liblistenbrainz.Feedback)
+        self.assertTrue(feedback[0].loved)
+        self.assertEqual(feedback[0].username, 'iliekcomputers')
+        self.assertEqual(feedback[0].created, 1000)
+        self.assertEqual(self.client.get_user_feedback.call_count, 3)
+
+
+    def test_iter_user_feedback_concurrently(self):
+        self._mock_feedback_history(30)
+        feedback = list(self.client.iter_user_feedback('iliekcomputers', page_size=10, max_workers=3))
+        self.assertEqual([f.recording_mbid for f in feedback], [str(i) for i in range(30)])
+        offsets = sorted(call.kwargs['offset'] for call in self.client.get_user_feedback.call_args_list)
+        self.assertEqual(offsets, [0, 10, 20, 30])
+
+        self._mock_feedback_history(0)
+        self.assertEqual(list(self.client.iter_user_feedback('iliekcomputers', max_workers=3)), [])
+
+
+    def _mock_user_artists(self, total, advertise_total=True):
+        artists = [{'artist_name': str(i), 'listen_count': 1000 - i} for i in range(total)]
+        def get_user_entity(username, entity, count, offset, time_range):
+            payload = {'artists': artists[offset:offset + count], 'count': count, 'offset': offset, 'range': time_range}
+            if advertise_total:
+                payload['total_artist_count'] = total
+            return {'payload': payload}
+        self.client._get_user_entity = mock.MagicMock(side_effect=get_user_entity)
+
+
+    def test_get_user_top_entities(self):
+        self._mock_user_artists(250)
+        artists = self.client.get_user_top_entities('iliekcomputers', 'artists', time_range='year', page_size=100, max_workers=2)
+        self.assertEqual([a['artist_name'] for a in artists], [str(i) for i in range(250)])
+        offsets = sorted(call.args[3] for call in self.client._get_user_entity.call_args_list)
+        self.assertEqual(offsets, [0, 100, 200])
+        self.client._get_user_entity.assert_any_call('iliekcomputers', 'artists', 100, 0, 'year')
+
+        # without a total, pages are fetched until a short one is seen
+        self._mock_user_artists(250, advertise_total=False)
+        artists = self.client.get_user_top_entities('iliekcomputers', 'artists', page_size=100, max_workers=2)
+        self.assertEqual([a['artist_name'] for a in artists], [str(i) for i in range(250)])
+
+        self.client._get_user_entity = mock.MagicMock(return_value=None)
+        self.assertEqual(self.client.get_user_top_entities('iliekcomputers', 'artists'), [])
+
+        with self.assertRaises(ValueError):
+            self.client.get_user_top_entities('iliekcomputers', 'labels')
+
+
+    def test_iter_users_stats(self):
+        def get_user_entity(username, entity, count, offset, time_range):
+            if username == 'new_user':
+                return None
+            if username == 'broken':
+                raise errors.ListenBrainzAPIException(500, 'oops')
+            if username == 'unreachable':
+                raise requests.ConnectionError('Connection refused')
+            return {'payload': {entity: [], 'range': time_range}}
+        self.client._get_user_entity = mock.MagicMock(side_effect=get_user_entity)
+
+        usernames = ['iliekcomputers', 'new_user', 'broken', 'unreachable']
+        results = list(self.client.iter_users_stats(
+            (name for name in usernames),
+            entities=['artists', 'releases'],
+            time_ranges=['week', 'all_time'],
+            max_workers=2,
+        ))
+        self.assertEqual(len(results), 16)
+        self.assertEqual(
+            {(r.username, r.entity, r.time_range) for r in results},
+            {(u, e, t) for u in usernames for e in ['artists', 'releases'] for t in ['week', 'all_time']},
+        )
+        for result in results:
+            if result.username == 'iliekcomputers':
+                self.assertEqual(result.data['payload']['range'], result.time_range)
+                self.assertIsNone(result.error)
+            elif result.username == 'new_user':
+                self.assertIsNone(result.data)
+                self.assertIsNone(result.error)
+            elif result.username == 'broken':
+                self.assertEqual(result.error.status_code, 500)
+            else:
+                self.assertIsInstance(result.error, requests.ConnectionError)
+
+        with self.assertRaises(errors.ListenBrainzException):
+            list(self.client.iter_users_stats(['iliekcomputers'], time_ranges=['decade']))
+
+
+    def test_iter_users_stats_reads_usernames_lazily(self):
+        self.client._get_user_entity = mock.MagicMock(return_value={'payload': {}})
+        consumed = []
+
+        def usernames():
+            for i in itertools.count():
+                consumed.append(i)
+                yield f'user{i}'
+
+        results = self.client.iter_users_stats(usernames(), entities=['artists'], time_ranges=['week'], max_workers=2)
+        next(results)
+        results.close()
+        self.assertLessEqual(len(consumed), 10)
@@ -0,0 +1,128 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import liblistenbrainz
+import socket
+import unittest
+
+from benchmarks.fake_server import FakeListenBrainz
+from liblistenbrainz import errors
+from liblistenbrainz.instrumentation import RateLimitWaitEvent, RequestEvent, endpoint_template
+from unittest import mock
+
+
+class InstrumentationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.MagicMock()
+        self.response = self.session.get.return_value
+        self.response.status_code = 200
+        self.response.headers = {'Content-Length': '42'}
+        self.response.json.return_value = {'payload': {'count': 42}}
+        self.events = []
+        self.client = liblistenbrainz.ListenBrainz(
+            session=self.session,
+            serializer=liblistenbrainz.JSONSerializer(),
+            hooks=[self.events.append],
+        )
+
+    def test_request_events(self):
+        self.client.get_user_listen_count('iliekcomputers')
+        event, = self.events
+        self.assertEqual((event.method, event.endpoint, event.status_code), ('GET', '/1/user/iliekcomputers/listen-count', 200))
+        self.assertEqual((event.attempt, event.bytes_sent, event.bytes_received), (1, 0, 42))
+        self.assertGreaterEqual(event.duration, 0)
+
+        self.session.post.return_value = self.response
+        self.client.set_auth_token('token', check_validity=False)
+        self.client.delete_listen(liblistenbrainz.Listen('Track', 'Artist', listened_at=1, recording_msid='msid'))
+        self.assertEqual(self.events[-1].method, 'POST')
+        self.assertGreater(self.events[-1].bytes_sent, 0)
+
+        self.session.get.side_effect = ConnectionError
+        with self.assertRaises(ConnectionError):
+            self.client.get_user_listen_count('iliekcomputers')
+        self.assertIsNone(self.events[-1].status_code)
+        self.assertIsInstance(self.events[-1].error, ConnectionError)
+
+    def test_failing_hook_does_not_fail_request(self):
+        self.client.add_hook(mock.MagicMock(side_effect=ValueError))
+        self.assertEqual(self.client.get_user_listen_count('iliekcomputers'), 42)
+        self.assertEqual(len(self.events), 1)
+
+    def test_rate_limit_wait_event(self):
+        self.client._rate_limiter.acquire = mock.MagicMock(return_value=1.5)
+        self.client.get_user_listen_count('iliekcomputers')
+        self.assertEqual(self.events[0], RateLimitWaitEvent(duration=1.5))
+
+    def test_rate_limit_wait_event_before_retry(self):
+        limited = mock.MagicMock(status_code=429, headers={'Retry-After': '3'})
+        self.session.get.side_effect = [limited, self.response]
+        with mock.patch('time.sleep') as mock_sleep:
+            self.client.get_user_listen_count('iliekcomputers')
+        mock_sleep.assert_called_once_with(3)
+        self.assertEqual([event.attempt for event in self.events if isinstance(event, RequestEvent)], [1, 2])
+        self.assertIn(RateLimitWaitEvent(duration=3), self.events)
+
+    def test_metrics_collector(self):
+        collector = liblistenbrainz.MetricsCollector(buckets=(0.1, 1))
+        for duration, status in ((0.05, 200), (0.5, 200), (5, 429), (0.1, None)):
+            collector(RequestEvent('GET', '/1/user/iliekcomputers/listens', status, duration, 2, 0, 100, None))
+        collector(RateLimitWaitEvent(2.5))
+
+        metrics = collector.snapshot()['endpoints'][('GET', '/1/user/{username}/listens')]
+        self.assertEqual(metrics['bucket_counts'], [2, 1, 1])
+        self.assertEqual(metrics['statuses'], {200: 2, 429: 1})
+        self.assertEqual((metrics['errors'], metrics['retries'], metrics['bytes_received']), (1, 4, 400))
+        self.assertEqual(collector.snapshot()['rate_limit_wait_seconds'], 2.5)
+
+        text = collector.prometheus_text()
+        self.assertIn('listenbrainz_client_request_duration_seconds_bucket{method="GET",endpoint="/1/user/{username}/listens",le="1"} 3', text)
+        self.assertIn('listenbrainz_client_request_duration_seconds_bucket{method="GET",endpoint="/1/user/{username}/listens",le="+Inf"} 4', text)
+        self.assertIn('listenbrainz_client_responses_total{method="GET",endpoint="/1/user/{username}/listens",status="429"} 1', text)
+        self.assertIn('listenbrainz_client_rate_limit_wait_seconds_total 2.5', text)
+
+    def test_metrics_with_retries_against_fake_server(self):
+        collector = liblistenbrainz.MetricsCollector()
+        with FakeListenBrainz(error_rate=0.5, error_statuses=(503,), seed=1) as server:
+            retry_policy = liblistenbrainz.RetryPolicy(max_retries=2, backoff_factor=0.001)
+            with liblistenbrainz.ListenBrainz(api_base_url=server.url, hooks=[collector], retry_policy=retry_policy) as client:
+                for _ in range(5):
+                    try:
+                        client.get_playing_now('iliekcomputers')
+                    except errors.ListenBrainzAPIException:
+                        pass
+        metrics = collector.snapshot()['endpoints'][('GET', '/1/user/{username}/playing-now')]
+        self.assertEqual(metrics['count'], sum(server.requests.values()))
+        self.assertEqual(metrics['retries'], metrics['count'] - 5)
+        self.assertGreater(metrics['retries'], 0)
+
+    def test_statsd_hook(self):
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(('127.0.0.1', 0))
+        receiver.settimeout(5)
+        hook = liblistenbrainz.StatsdHook('127.0.0.1', receiver.getsockname()[1], prefix='lb')
+        try:
+            hook(RequestEvent('GET', '/1/stats/user/iliekcomputers/artists', 200, 0.25, 1, 0, 10, None))
+            lines = receiver.recv(4096).decode('utf-8').split('\n')
+        finally:
+            hook.close()
+            receiver.close()
+        self.assertEqual(lines[:2], ['lb.get.1.stats.user.username.artists.duration:250|ms', 'lb.get.1.stats.user.username.artists.status.200:1|c'])
+
+    def test_endpoint_template(self):
+        self.assertEqual(endpoint_template('/1/stats/user/rob/artists'), '/1/stats/user/{username}/artists')
+        self.assertEqual(endpoint_template('/1/submit-listens'), '/1/submit-listens')
@@ -0,0 +1,118 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import liblistenbrainz
+import os
+import unittest
+
+from liblistenbrainz import serialization
+from liblistenbrainz.utils import _convert_api_payload_to_listen
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'testdata')
+
+
+class ListenTestCase(unittest.TestCase):
+
+    def test_listen_has_no_instance_dict(self):
+        listen = liblistenbrainz.Listen(track_name="Fade", artist_name="Kanye West")
+        self.assertFalse(hasattr(listen, '__dict__'))
+        with self.assertRaises(AttributeError):
+            listen.unknown_field = 1
+
+    def test_empty_containers_are_created_on_access(self):
+        listen = liblistenbrainz.Listen(track_name="Fade", artist_name="Kanye West")
+        self.assertIsNone(listen._tags)
+        self.assertEqual(listen._to_submit_payload(), {
+            'track_metadata': {'track_name': 'Fade', 'artist_name': 'Kanye West'},
+        })
+        self.assertIsNone(listen._tags)
+
+        listen.tags.append('rap')
+        listen.additional_info['discnumber'] = 1
+        self.assertEqual(listen.tags, ['rap'])
+        self.assertEqual(listen.additional_info, {'discnumber': 1})
+        self.assertIsNot(listen.tags, liblistenbrainz.Listen(track_name="a", artist_name="b").tags)
+
+    def test_submit_payload_does_not_modify_listen(self):
+        additional_info = {'discnumber': 1}
+        listen = liblistenbrainz.Listen(
+            track_name="Fade",
+            artist_name="Kanye West",
+            recording_mbid="ae29cef0-4132-49d1-aee8-eeae67763e66",
+            tags=['rap'],
+            additional_info=additional_info,
+        )
+        payload = listen._to_submit_payload()
+        self.assertEqual(payload['track_metadata']['additional_info'], {
+            'discnumber': 1,
+            'recording_mbid': 'ae29cef0-4132-49d1-aee8-eeae67763e66',
+            'tags': ['rap'],
+        })
+        self.assertEqual(additional_info, {'discnumber': 1})
+        self.assertEqual(listen.additional_info, {'discnumber': 1})
+
+    def test_submit_payload_is_cached_until_a_field_changes(self):
+        listen = liblistenbrainz.Listen(track_name="Fade", artist_name="Kanye West", listened_at=1, tags=['rap'])
+        payload = listen._to_submit_payload()
+        self.assertIs(listen._to_submit_payload(), payload)
+
+        listen.tags.append('hip hop')
+        self.assertEqual(listen._to_submit_payload()['track_metadata']['additional_info']['tags'], ['rap', 'hip hop'])
+
+        listen.listened_at = 2
+        updated = listen._to_submit_payload()
+        self.assertIsNot(updated, payload)
+        self.assertEqual(updated['listened_at'], 2)
+
+        listen.additional_info = {'discnumber': 2}
+        self.assertEqual(listen._to_submit_payload()['track_metadata']['additional_info']['discnumber'], 2)
+
+        # containers modified in place after the payload was built
+        listen.additional_info['discnumber'] = 3
+        self.assertEqual(listen._to_submit_payload()['track_metadata']['additional_info']['discnumber'], 3)
+        listen.tags.clear()
+        self.assertNotIn('tags', listen._to_submit_payload()['track_metadata']['additional_info'])
+
+    def test_serializers_see_additional_info_modified_between_submits(self):
+        listen = liblistenbrainz.Listen(track_name="Fade", artist_name="Kanye West", listened_at=1, additional_info={'duration_ms': 1})
+        serializers = [liblistenbrainz.JSONSerializer()]
+        if serialization.orjson is not None:
+            serializers.append(liblistenbrainz.OrjsonSerializer())
+        if serialization.ujson is not None:
+            serializers.append(liblistenbrainz.UjsonSerializer())
+
+        for serializer in serializers:
+            listen.additional_info['duration_ms'] = 1
+            serializer.encode_listen(listen)
+            listen.additional_info['duration_ms'] = 999
+            encoded = json.loads(serializer.encode_listen(listen))
+            self.assertEqual(encoded['track_metadata']['additional_info']['duration_ms'], 999, serializer.name)
+
+    def test_convert_api_payload_shares_strings_and_additional_info(self):
+        with open(os.path.join(TEST_DATA_DIR, 'get_listens_happy_path_response.json')) as f:
+            response_json = json.load(f)
+        payloads = response_json['payload']['listens']
+        first, second = (_convert_api_payload_to_listen(json.loads(json.dumps(payloads[0]))) for _ in range(2))
+
+        self.assertIs(first.artist_name, second.artist_name)
+        self.assertEqual(first.artist_name, payloads[0]['track_metadata']['artist_name'])
+        self.assertEqual(first.additional_info, payloads[0]['track_metadata']['additional_info'])
+        self.assertEqual(first.isrc, payloads[0]['track_metadata']['additional_info']['isrc'])
+
+        listen = _convert_api_payload_to_listen({'track_metadata': {'track_name': 'Fade', 'artist_name': 'Kanye West'}})
+        self.assertIsNone(listen._additional_info)
+        self.assertEqual(listen.artist_mbids, [])
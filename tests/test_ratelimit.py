@@ -0,0 +1,131 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import liblistenbrainz
+import os
+import tempfile
+import threading
+import unittest
+
+from unittest import mock
+
+
+class RateLimiterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.limiter = liblistenbrainz.RateLimiter()
+        self.limiter._clock = lambda: self.now
+
+    def test_unlimited_until_headers_are_seen(self):
+        for _ in range(100):
+            self.assertEqual(self.limiter.reserve(), 0)
+
+    def test_waits_for_reset_when_bucket_is_empty(self):
+        self.limiter.reserve()
+        self.limiter.update({'X-RateLimit-Remaining': '2', 'X-RateLimit-Reset-In': '10', 'X-RateLimit-Limit': '30'})
+        self.assertEqual(self.limiter.reserve(), 0)
+        self.assertEqual(self.limiter.reserve(), 0)
+        self.assertEqual(self.limiter.reserve(), 10)
+        self.now += 4
+        self.assertEqual(self.limiter.delay(), 6)
+
+        # the bucket is refilled to the limit once the window is reset
+        self.now += 6
+        for _ in range(30):
+            self.assertEqual(self.limiter.reserve(), 0)
+        self.assertEqual(self.limiter.reserve(), 10)
+        self.limiter.update({'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset-In': '10'})
+        self.assertEqual(self.limiter.reserve(), 10)
+
+    def test_late_responses_do_not_refill_the_bucket(self):
+        for _ in range(3):
+            self.limiter.reserve()
+        self.limiter.update({'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset-In': '10', 'X-RateLimit-Limit': '3'})
+        # the response to the first request of the window arrives last
+        self.limiter.update({'X-RateLimit-Remaining': '1', 'X-RateLimit-Reset-In': '10', 'X-RateLimit-Limit': '3'})
+        self.limiter.update({'X-RateLimit-Remaining': '2', 'X-RateLimit-Reset-In': '10', 'X-RateLimit-Limit': '3'})
+        self.assertEqual(self.limiter.reserve(), 10)
+
+    def test_waits_after_reset_before_any_response(self):
+        self.limiter.reserve()
+        self.limiter.update({'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset-In': '10', 'X-RateLimit-Limit': '3'})
+        self.now += 10
+        # no response has been received in the new window yet, its end is estimated from the last one
+        for _ in range(3):
+            self.assertEqual(self.limiter.reserve(), 0)
+        self.assertEqual(self.limiter.reserve(), 10)
+
+    def test_empty_bucket_with_unknown_reset_waits_for_requests_in_flight(self):
+        self.limiter.reserve()
+        self.limiter.update({'X-RateLimit-Remaining': '1'})
+        self.assertEqual(self.limiter.reserve(), 0)
+        self.assertGreater(self.limiter.reserve(), 0)
+        self.limiter.release()
+        self.assertEqual(self.limiter.reserve(), 0)
+
+    def test_requests_in_flight_are_not_counted_twice(self):
+        for _ in range(3):
+            self.limiter.reserve()
+        # the server saw one request, two are still in flight
+        self.limiter.update({'X-RateLimit-Remaining': '3', 'X-RateLimit-Reset-In': '10'})
+        self.assertEqual(self.limiter.reserve(), 0)
+        self.assertEqual(self.limiter.reserve(), 10)
+
+    def test_acquire_is_thread_safe(self):
+        self.limiter.update({'X-RateLimit-Remaining': '50', 'X-RateLimit-Reset-In': '10'})
+        delays = []
+        lock = threading.Lock()
+
+        def reserve():
+            for _ in range(20):
+                delay = self.limiter.reserve()
+                with lock:
+                    delays.append(delay)
+
+        threads = [threading.Thread(target=reserve) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(delays.count(0), 50)
+
+    def test_client_uses_rate_limiter(self):
+        session = mock.MagicMock()
+        session.get.return_value.status_code = 200
+        session.get.return_value.headers = {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset-In': '5'}
+        client = liblistenbrainz.ListenBrainz(session=session, rate_limiter=self.limiter, serializer=liblistenbrainz.JSONSerializer())
+        client._get('/1/validate-token')
+        self.assertEqual(client.remaining_requests, 0)
+        with mock.patch('liblistenbrainz.ratelimit.time.sleep') as mock_sleep:
+            mock_sleep.side_effect = lambda seconds: setattr(self, 'now', self.now + seconds)
+            client._get('/1/validate-token')
+            mock_sleep.assert_called_once_with(5)
+
+
+class FileRateLimiterTestCase(unittest.TestCase):
+
+    def test_state_is_shared_through_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ratelimit.json')
+            first = liblistenbrainz.FileRateLimiter(path)
+            second = liblistenbrainz.FileRateLimiter(path)
+
+            first.reserve()
+            first.update({'X-RateLimit-Remaining': '1', 'X-RateLimit-Reset-In': '60'})
+            self.assertEqual(second.reserve(), 0)
+            self.assertGreater(first.reserve(), 0)
+            self.assertGreater(second.delay(), 0)
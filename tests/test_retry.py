@@ -0,0 +1,124 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import liblistenbrainz
+import requests
+
+from liblistenbrainz import errors
+from liblistenbrainz.retry import RetryPolicy, _parse_retry_after
+from tests.fake_clock import FakeClockTestCase, _response
+from unittest import mock
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+
+def _connection_refused():
+    reason = NewConnectionError(None, 'Connection refused')
+    return requests.ConnectionError(MaxRetryError(None, '/', reason))
+
+
+class RetryPolicyTestCase(FakeClockTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.listen = liblistenbrainz.Listen(track_name="Fade", artist_name="Kanye West", listened_at=1)
+
+    def _client(self, **kwargs):
+        client = liblistenbrainz.ListenBrainz(
+            session=self.session,
+            serializer=liblistenbrainz.JSONSerializer(),
+            retry_policy=RetryPolicy(**kwargs),
+        )
+        client.set_auth_token('token', check_validity=False)
+        return client
+
+    def test_server_errors_are_retried_with_backoff(self):
+        self.session.get.side_effect = [_response(503), _response(502), _response(200)]
+        client = self._client(backoff_factor=1)
+        with mock.patch('liblistenbrainz.retry.random.uniform', side_effect=lambda low, high: high):
+            client.get_user_listen_count('iliekcomputers')
+        self.assertEqual(self.session.get.call_count, 3)
+        self.assertEqual([c.args[0] for c in self.mock_sleep.call_args_list], [1, 2])
+
+    def test_gives_up_after_max_retries(self):
+        self.session.get.return_value = _response(500)
+        with self.assertRaises(errors.ListenBrainzAPIException) as cm:
+            self._client(max_retries=2).get_user_listen_count('iliekcomputers')
+        self.assertEqual(cm.exception.status_code, 500)
+        self.assertEqual(self.session.get.call_count, 3)
+
+    def test_429_waits_for_advertised_reset(self):
+        self.session.get.side_effect = [
+            _response(429, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset-In': '7'}),
+            _response(200),
+        ]
+        self._client().get_user_listen_count('iliekcomputers')
+        self.assertEqual(self.now, 1007)
+
+    def test_deadline(self):
+        self.session.get.return_value = _response(429, {'Retry-After': '30'})
+        with self.assertRaises(errors.ListenBrainzAPIException):
+            self._client(deadline=10).get_user_listen_count('iliekcomputers')
+        self.session.get.assert_called_once()
+        self.assertEqual(self.now, 1000)
+
+    def test_submissions_are_only_retried_when_not_processed(self):
+        client = self._client()
+
+        self.session.post.side_effect = [_response(503)]
+        with self.assertRaises(errors.ListenBrainzAPIException):
+            client.submit_single_listen(self.listen)
+
+        self.session.post.side_effect = [requests.ReadTimeout()]
+        with self.assertRaises(errors.ListenBrainzTimeoutException):
+            client.submit_single_listen(self.listen)
+
+        self.session.post.reset_mock()
+        self.session.post.side_effect = [_connection_refused(), _response(429, {'Retry-After': '1'}), _response(200)]
+        client.submit_single_listen(self.listen)
+        self.assertEqual(self.session.post.call_count, 3)
+
+        # playing now submissions and feedback can be sent twice safely
+        self.session.post.reset_mock()
+        self.session.post.side_effect = [_response(503), _response(200)]
+        client.submit_playing_now(liblistenbrainz.Listen(track_name="Fade", artist_name="Kanye West"))
+        self.assertEqual(self.session.post.call_count, 2)
+
+        self.session.post.reset_mock()
+        self.session.post.side_effect = [_response(503), _response(200)]
+        self._client(retry_non_idempotent=True).submit_single_listen(self.listen)
+        self.assertEqual(self.session.post.call_count, 2)
+
+    def test_endpoint_overrides(self):
+        self.session.get.return_value = _response(503)
+        client = self._client(overrides={r'/1/user/[^/]+/listen-count': RetryPolicy(max_retries=0)})
+        with self.assertRaises(errors.ListenBrainzAPIException):
+            client.get_user_listen_count('iliekcomputers')
+        self.session.get.assert_called_once()
+
+    def test_parse_retry_after(self):
+        self.assertEqual(_parse_retry_after(_response(429, {'Retry-After': '3'})), 3)
+        self.assertEqual(_parse_retry_after(_response(429, {'X-RateLimit-Reset-In': '5'})), 5)
+        self.assertEqual(_parse_retry_after(_response(503, {'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})), 0)
+        self.assertIsNone(_parse_retry_after(_response(503)))
+        # the rate limit headers are sent with every response, they only matter for a 429
+        self.assertIsNone(_parse_retry_after(_response(503, {'X-RateLimit-Remaining': '40', 'X-RateLimit-Reset-In': '9'})))
+
+    def test_server_errors_use_backoff_despite_rate_limit_headers(self):
+        headers = {'X-RateLimit-Remaining': '40', 'X-RateLimit-Reset-In': '9'}
+        self.session.get.side_effect = [_response(503, headers), _response(503, headers), _response(200, headers)]
+        with mock.patch('liblistenbrainz.retry.random.uniform', side_effect=lambda low, high: high):
+            self._client(backoff_factor=1).get_user_listen_count('iliekcomputers')
+        self.assertEqual([c.args[0] for c in self.mock_sleep.call_args_list], [1, 2])
@@ -0,0 +1,96 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import liblistenbrainz
+import unittest
+
+from liblistenbrainz import serialization
+from unittest import mock
+
+
+def _make_listens():
+    return [
+        liblistenbrainz.Listen(track_name="Fade", artist_name="Kanye West"),
+        liblistenbrainz.Listen(
+            track_name="Ünïcode \"quoted\" \\ track",
+            artist_name="Sigur Rós",
+            listened_at=1587245842,
+            release_name="Ágætis byrjun",
+            recording_mbid="ae29cef0-4132-49d1-aee8-eeae67763e66",
+            artist_mbids=["f938216f-647c-4de3-8006-f793a7df4efa"],
+            tags=["post-rock", "ambient"],
+            tracknumber=0,
+            listening_from="spotify",
+            additional_info={'discnumber': 1, 'recording_mbid': 'overridden', 'nested': {'a': [1, None]}},
+        ),
+    ]
+
+
+class SerializerTestCase(unittest.TestCase):
+
+    def test_default_serializer_prefers_fastest(self):
+        with mock.patch.object(serialization, 'orjson', None), mock.patch.object(serialization, 'ujson', None):
+            self.assertIsInstance(serialization.get_default_serializer(), liblistenbrainz.JSONSerializer)
+        if serialization.orjson is not None:
+            self.assertIsInstance(serialization.get_default_serializer(), liblistenbrainz.OrjsonSerializer)
+
+    def test_direct_listen_encoding_matches_payload(self):
+        serializer = liblistenbrainz.JSONSerializer()
+        for listen in _make_listens():
+            encoded = serializer.encode_listen(listen)
+            self.assertIsInstance(encoded, bytes)
+            self.assertEqual(json.loads(encoded), listen._to_submit_payload())
+
+    def test_serializers_encode_the_same_document(self):
+        serializers = [liblistenbrainz.JSONSerializer()]
+        if serialization.orjson is not None:
+            serializers.append(liblistenbrainz.OrjsonSerializer())
+        if serialization.ujson is not None:
+            serializers.append(liblistenbrainz.UjsonSerializer())
+
+        def canonical(encoded):
+            # decoded and encoded again, so that documents with the same keys in the same order are equal
+            return json.dumps(json.loads(encoded))
+
+        for listen in _make_listens():
+            expected = canonical(json.dumps(listen._build_submit_payload()))
+            for cached in (False, True):
+                # the second time around, the payload of the listen has been cached
+                for serializer in serializers:
+                    self.assertEqual(canonical(serializer.encode_listen(listen)), expected, (serializer.name, cached))
+                listen._to_submit_payload()
+
+            listen.tags.clear()
+            listen.additional_info['discnumber'] = 2
+            expected = canonical(json.dumps(listen._build_submit_payload()))
+            for serializer in serializers:
+                self.assertEqual(canonical(serializer.encode_listen(listen)), expected, serializer.name)
+
+    @unittest.skipIf(serialization.orjson is None, "orjson is not installed")
+    def test_orjson_serializer(self):
+        serializer = liblistenbrainz.OrjsonSerializer()
+        for listen in _make_listens():
+            self.assertEqual(json.loads(serializer.encode_listen(listen)), listen._to_submit_payload())
+        self.assertEqual(serializer.loads(serializer.dumps({'a': [1, 'é']})), {'a': [1, 'é']})
+        self.assertEqual(serializer.decode_response(mock.MagicMock(content=b'{"valid": true}')), {'valid': True})
+
+    @unittest.skipIf(serialization.ujson is None, "ujson is not installed")
+    def test_ujson_serializer(self):
+        serializer = liblistenbrainz.UjsonSerializer()
+        for listen in _make_listens():
+            self.assertEqual(json.loads(serializer.encode_listen(listen)), listen._to_submit_payload())
+        self.assertEqual(serializer.loads(serializer.dumps({'a': [1, 'é']})), {'a': [1, 'é']})
@@ -0,0 +1,109 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import liblistenbrainz
+import os
+import tempfile
+import unittest
+
+from liblistenbrainz import errors
+from unittest import mock
+
+
+class SubmissionQueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'queue.sqlite')
+        self.client = liblistenbrainz.ListenBrainz()
+        self.client.set_auth_token('token', check_validity=False)
+        self.client._post = mock.MagicMock(return_value={'status': 'ok'})
+        self.listens = [liblistenbrainz.Listen(track_name=f"Track {i}", artist_name="Daft Punk", listened_at=i) for i in range(25)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _submitted_timestamps(self):
+        return [
+            listen['listened_at']
+            for call in self.client._post.call_args_list
+            for listen in json.loads(call.kwargs['data'])['payload']
+        ]
+
+    def test_queued_listens_survive_restart(self):
+        with liblistenbrainz.SubmissionQueue(self.path, self.client) as queue:
+            queue.enqueue(self.listens[:10])
+            queue.enqueue(self.listens[10:])
+            self.assertEqual(len(queue), 25)
+
+        with liblistenbrainz.SubmissionQueue(self.path, self.client, max_listens_per_batch=10) as queue:
+            self.assertEqual(queue.flush(), 25)
+            self.assertEqual(len(queue), 0)
+            self.assertEqual(queue.flush(), 0)
+
+        self.assertEqual(self.client._post.call_count, 3)
+        self.assertEqual(self._submitted_timestamps(), list(range(25)))
+
+    def test_failed_flush_keeps_listens(self):
+        self.client._post.side_effect = [{'status': 'ok'}, errors.ListenBrainzAPIException(status_code=503)]
+        with liblistenbrainz.SubmissionQueue(self.path, self.client, max_listens_per_batch=10) as queue:
+            queue.enqueue(self.listens)
+            with self.assertRaises(errors.ListenBrainzAPIException):
+                queue.flush()
+            self.assertEqual(len(queue), 15)
+
+            self.client._post.side_effect = None
+            self.client._post.reset_mock()
+            self.assertEqual(queue.flush(), 15)
+            self.assertEqual(self._submitted_timestamps(), list(range(10, 25)))
+
+    def test_rejected_listens_do_not_block_queue(self):
+        accepted = []
+
+        def post(endpoint, data, idempotent):
+            timestamps = [listen['listened_at'] for listen in json.loads(data)['payload']]
+            if 7 in timestamps or 12 in timestamps:
+                raise errors.ListenBrainzAPIException(status_code=400, message='bad listen')
+            accepted.extend(timestamps)
+            return {'status': 'ok'}
+        self.client._post.side_effect = post
+
+        with liblistenbrainz.SubmissionQueue(self.path, self.client, max_listens_per_batch=20) as queue:
+            queue.enqueue(self.listens)
+            self.assertEqual(queue.flush(), 23)
+            self.assertEqual(len(queue), 0)
+            rejected = queue._connection.execute("SELECT payload, message FROM rejected ORDER BY id").fetchall()
+            self.assertEqual([(json.loads(payload)['listened_at'], message) for payload, message in rejected], [(7, 'bad listen'), (12, 'bad listen')])
+
+        self.assertEqual(sorted(accepted), [ts for ts in range(25) if ts not in (7, 12)])
+
+    def test_enqueue_requires_timestamp(self):
+        with liblistenbrainz.SubmissionQueue(self.path, self.client) as queue:
+            with self.assertRaises(errors.InvalidSubmitListensPayloadException):
+                queue.enqueue([self.listens[0], liblistenbrainz.Listen(track_name="Fade", artist_name="Kanye West")])
+            self.assertEqual(len(queue), 0)
+
+    def test_background_flusher(self):
+        with liblistenbrainz.SubmissionQueue(self.path, self.client) as queue:
+            queue.enqueue(self.listens)
+            queue.start(interval=0.01)
+            for _ in range(500):
+                if len(queue) == 0:
+                    break
+                queue._stop_event.wait(0.01)
+            queue.stop()
+            self.assertEqual(len(queue), 0)
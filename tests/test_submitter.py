@@ -0,0 +1,115 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import liblistenbrainz
+import requests
+import threading
+import unittest
+
+from liblistenbrainz import errors
+from unittest import mock
+
+
+class MultiUserSubmitterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.MagicMock()
+        self.session.post.return_value.status_code = 200
+        self.session.post.return_value.content = b'{"status": "ok"}'
+        self.session.post.return_value.json.return_value = {'status': 'ok'}
+        self.session.post.return_value.headers = {}
+
+    def test_submit_uses_token_of_work_item(self):
+        listen = liblistenbrainz.Listen(track_name="Fade", artist_name="Kanye West", listened_at=1)
+        with liblistenbrainz.MultiUserSubmitter(max_workers=4, session=self.session) as submitter:
+            futures = submitter.submit_many([('token-a', [listen]), ('token-b', [listen, listen])])
+            results = [future.result() for future in futures]
+
+        self.assertEqual([len(batch) for batch, _ in results[0]], [1])
+        self.assertEqual([len(batch) for batch, _ in results[1]], [2])
+        tokens = sorted(call.kwargs['headers']['Authorization'] for call in self.session.post.call_args_list)
+        self.assertEqual(tokens, ['Token token-a', 'Token token-b'])
+        self.session.close.assert_not_called()
+
+    def test_rate_limit_state_is_tracked_per_token(self):
+        self.session.post.side_effect = lambda url, data, headers, timeout: mock.MagicMock(
+            status_code=200,
+            content=b'{"status": "ok"}',
+            headers={'X-RateLimit-Remaining': '0' if headers['Authorization'] == 'Token slow' else '10', 'X-RateLimit-Reset-In': '5'},
+        )
+        listen = liblistenbrainz.Listen(track_name="Fade", artist_name="Kanye West", listened_at=1)
+        with liblistenbrainz.MultiUserSubmitter(session=self.session) as submitter:
+            submitter.submit('slow', [listen]).result()
+            submitter.submit('fast', [listen]).result()
+            self.assertEqual(submitter.get_client('slow').remaining_requests, 0)
+            self.assertEqual(submitter.get_client('fast').remaining_requests, 10)
+
+    def test_throttled_token_does_not_block_other_tokens(self):
+        release = threading.Event()
+
+        def post(url, data, headers, timeout):
+            if headers['Authorization'] == 'Token slow':
+                release.wait(5)
+            return mock.MagicMock(status_code=200, headers={}, content=b'{"status": "ok"}')
+        self.session.post.side_effect = post
+
+        listen = liblistenbrainz.Listen(track_name="Fade", artist_name="Kanye West", listened_at=1)
+        with liblistenbrainz.MultiUserSubmitter(max_workers=2, session=self.session) as submitter:
+            slow = [submitter.submit('slow', [listen]) for _ in range(3)]
+            fast = submitter.submit('fast', [listen])
+            fast.result(timeout=2)
+            self.assertFalse(any(future.done() for future in slow))
+            release.set()
+            for future in slow:
+                future.result(timeout=2)
+
+    def test_throttled_token_does_not_occupy_a_worker(self):
+        listen = liblistenbrainz.Listen(track_name="Fade", artist_name="Kanye West", listened_at=1)
+        with liblistenbrainz.MultiUserSubmitter(max_workers=1, session=self.session) as submitter:
+            submitter.get_client('slow')._update_rate_limit_variables(
+                mock.MagicMock(headers={'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset-In': '1'})
+            )
+            with mock.patch('time.sleep') as mock_sleep:
+                slow = submitter.submit('slow', [listen])
+                fast = submitter.submit('fast', [listen])
+                fast.result(timeout=0.5)
+                self.assertFalse(slow.done())
+                slow.result(timeout=5)
+            mock_sleep.assert_not_called()
+
+    def test_clients_are_bounded(self):
+        with mock.patch.object(liblistenbrainz.ListenBrainz, 'close', autospec=True) as mock_close:
+            with liblistenbrainz.MultiUserSubmitter(session=self.session, max_clients=2) as submitter:
+                first = submitter.get_client('a')
+                submitter.get_client('b')
+                submitter.get_client('a')
+                second = submitter.get_client('b')
+                submitter.get_client('c')
+                mock_close.assert_called_once_with(first)
+                self.assertIs(submitter.get_client('b'), second)
+                self.assertIsNot(submitter.get_client('a'), first)
+
+    def test_errors_are_reported_through_future(self):
+        response = mock.MagicMock(headers={})
+        response.json.return_value = {'code': 401, 'error': 'Unauthorized'}
+        response.raise_for_status.side_effect = requests.HTTPError(response=response)
+        self.session.post.return_value = response
+
+        listen = liblistenbrainz.Listen(track_name="Fade", artist_name="Kanye West", listened_at=1)
+        with liblistenbrainz.MultiUserSubmitter(session=self.session) as submitter:
+            future = submitter.submit('token', [listen])
+            with self.assertRaises(errors.ListenBrainzAPIException):
+                future.result()
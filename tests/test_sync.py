@@ -0,0 +1,85 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import liblistenbrainz
+import requests
+
+from liblistenbrainz import errors
+from tests.listen_history import ListenHistoryTestCase
+
+
+class ListenSyncTestCase(ListenHistoryTestCase):
+
+    database_name = 'sync.sqlite'
+
+    def test_sync_returns_only_new_listens(self):
+        self._add_listens('iliekcomputers', [1, 2, 3, 3, 3, 4, 5, 5])
+        with liblistenbrainz.ListenSync(self.path, self.client, page_size=3) as sync:
+            listens = sync.sync('iliekcomputers')
+            self.assertEqual([l.listened_at for l in listens], [1, 2, 3, 3, 3, 4, 5, 5])
+            self.assertEqual(len({l.track_name for l in listens}), 8)
+            self.assertEqual(sync.get_high_water_mark('iliekcomputers'), 5)
+
+            self.client.get_listens.reset_mock()
+            self.assertEqual(sync.sync('iliekcomputers'), [])
+            self.client.get_listens.assert_called_once_with('iliekcomputers', min_ts=4, count=3)
+
+        # a listen submitted late with the timestamp of the mark is still returned, after a restart
+        self._add_listens('iliekcomputers', [5, 6])
+        with liblistenbrainz.ListenSync(self.path, self.client, page_size=3) as sync:
+            listens = sync.sync('iliekcomputers')
+            self.assertEqual([(l.listened_at, l.track_name) for l in listens], [(5, 'Track 8'), (6, 'Track 9')])
+
+    def test_set_high_water_mark(self):
+        self._add_listens('iliekcomputers', [1, 2, 2, 3])
+        with liblistenbrainz.ListenSync(self.path, self.client) as sync:
+            sync.set_high_water_mark('iliekcomputers', 2)
+            self.assertEqual([l.listened_at for l in sync.sync('iliekcomputers')], [3])
+
+    def test_iter_new_listens_commits_after_processing(self):
+        self._add_listens('iliekcomputers', [1, 2])
+        self._add_listens('param', [3])
+        with liblistenbrainz.ListenSync(self.path, self.client) as sync:
+            deltas = sync.iter_new_listens(['iliekcomputers', 'param'])
+            username, listens = next(deltas)
+            self.assertEqual(username, 'iliekcomputers')
+            self.assertIsNone(sync.get_high_water_mark('iliekcomputers'))
+            deltas.close()
+
+            deltas = list(sync.iter_new_listens(['iliekcomputers', 'param']))
+            self.assertEqual([(u, len(l)) for u, l in deltas], [('iliekcomputers', 2), ('param', 1)])
+            self.assertEqual(sync.get_high_water_mark('param'), 3)
+            self.assertEqual(list(sync.iter_new_listens(['iliekcomputers', 'param'])), [])
+
+    def test_iter_new_listens_skips_failing_users(self):
+        self._add_listens('iliekcomputers', [1, 2])
+        self._add_listens('param', [3])
+        get_listens = self.client.get_listens.side_effect
+
+        def failing_get_listens(username, min_ts, count):
+            if username == 'broken':
+                raise errors.ListenBrainzAPIException(status_code=500, message='oops')
+            if username == 'unreachable':
+                raise requests.ConnectionError('Connection refused')
+            return get_listens(username, min_ts, count)
+        self.client.get_listens.side_effect = failing_get_listens
+
+        with liblistenbrainz.ListenSync(self.path, self.client) as sync:
+            with self.assertLogs('liblistenbrainz.sync', level='WARNING'):
+                deltas = list(sync.iter_new_listens(['broken', 'iliekcomputers', 'unreachable', 'param']))
+            self.assertEqual([(u, len(l)) for u, l in deltas], [('iliekcomputers', 2), ('param', 1)])
+            self.assertIsNone(sync.get_high_water_mark('broken'))
+            self.assertEqual(sync.get_high_water_mark('param'), 3)
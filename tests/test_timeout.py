@@ -0,0 +1,116 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import liblistenbrainz
+import requests
+
+from liblistenbrainz import errors
+from liblistenbrainz.ratelimit import RateLimiter
+from tests.fake_clock import FakeClockTestCase, _response
+from unittest import mock
+from urllib3.exceptions import ReadTimeoutError
+
+
+class TimeoutTestCase(FakeClockTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.session.get.return_value = _response(200)
+
+    def _client(self, **kwargs):
+        return liblistenbrainz.ListenBrainz(session=self.session, serializer=liblistenbrainz.JSONSerializer(), **kwargs)
+
+    def test_timeout_is_passed_to_session(self):
+        self._client().get_user_listen_count('iliekcomputers')
+        self.assertEqual(self.session.get.call_args.kwargs['timeout'], liblistenbrainz.client.DEFAULT_TIMEOUT)
+
+        self.session.get.reset_mock()
+        self._client(timeout=5).get_user_listen_count('iliekcomputers')
+        self.assertEqual(self.session.get.call_args.kwargs['timeout'], 5)
+
+    def test_timeout_is_clamped_to_deadline(self):
+        self._client(timeout=(10, None), deadline=3).get_user_listen_count('iliekcomputers')
+        self.assertEqual(self.session.get.call_args.kwargs['timeout'], (3, 3))
+
+    def test_requests_timeout_is_converted(self):
+        self.session.get.side_effect = requests.ConnectTimeout()
+        client = self._client(retry_policy=liblistenbrainz.RetryPolicy(max_retries=0))
+        with self.assertRaises(errors.ListenBrainzTimeoutException) as cm:
+            client.get_user_listen_count('iliekcomputers')
+        self.assertIsInstance(cm.exception.__cause__, requests.ConnectTimeout)
+
+    def test_stalled_stream_is_converted(self):
+        response = _response(200)
+        response.iter_content.return_value = iter_content = mock.MagicMock()
+        iter_content.__iter__.side_effect = requests.ConnectionError(ReadTimeoutError(None, '/', 'Read timed out'))
+        self.session.get.return_value = response
+        with self.assertRaises(errors.ListenBrainzTimeoutException):
+            list(self._client().stream_listens('iliekcomputers'))
+        response.close.assert_called_once()
+
+    def test_deadline_covers_retries(self):
+        self.session.get.side_effect = [_response(503), _response(503), _response(200)]
+        client = self._client(deadline=10, retry_policy=liblistenbrainz.RetryPolicy(backoff_factor=4))
+        with mock.patch('liblistenbrainz.retry.random.uniform', side_effect=lambda low, high: high):
+            with self.assertRaises(errors.ListenBrainzTimeoutException):
+                client.get_user_listen_count('iliekcomputers')
+        # the second retry would have waited until after the deadline
+        self.assertEqual(self.session.get.call_count, 2)
+        self.assertEqual(self.now, 1004)
+
+    def test_deadline_covers_rate_limit_wait(self):
+        self.session.get.return_value = _response(200, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset-In': '30'})
+        client = self._client(deadline=10)
+        client.get_user_listen_count('iliekcomputers')
+        with self.assertRaises(errors.ListenBrainzTimeoutException):
+            client.get_user_listen_count('iliekcomputers')
+        self.session.get.assert_called_once()
+        self.mock_sleep.assert_not_called()
+
+    def test_with_timeout(self):
+        client = self._client()
+        limited = client.with_timeout(timeout=2, deadline=5)
+        limited.get_user_listen_count('iliekcomputers')
+        self.assertEqual(self.session.get.call_args.kwargs['timeout'], 2)
+
+        # the deadline is shared by all the calls made with the returned client
+        self.now += 4
+        limited.get_user_listen_count('iliekcomputers')
+        self.assertEqual(self.session.get.call_args.kwargs['timeout'], 1)
+        self.now += 1
+        with self.assertRaises(errors.ListenBrainzTimeoutException):
+            limited.get_user_listen_count('iliekcomputers')
+        self.assertEqual(self.session.get.call_count, 2)
+
+        # the original client is unaffected
+        client.get_user_listen_count('iliekcomputers')
+        self.assertEqual(self.session.get.call_args.kwargs['timeout'], liblistenbrainz.client.DEFAULT_TIMEOUT)
+        self.assertIs(limited._rate_limiter, client._rate_limiter)
+
+    def test_with_timeout_does_not_close_session(self):
+        with mock.patch('requests.Session.close') as mock_close:
+            client = liblistenbrainz.ListenBrainz()
+            client.with_timeout(deadline=5).close()
+            mock_close.assert_not_called()
+            client.close()
+            mock_close.assert_called_once()
+
+    def test_rate_limiter_acquire_timeout(self):
+        limiter = RateLimiter()
+        limiter.update({'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset-In': '30'})
+        self.assertIsNone(limiter.acquire(timeout=10))
+        self.mock_sleep.assert_not_called()
+        self.assertEqual(limiter.acquire(timeout=60), 30)
@@ -0,0 +1,115 @@
+# liblistenbrainz - A simple client library for ListenBrainz
+# Copyright (C) 2020 Param Singh <iliekcomputers@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import liblistenbrainz
+import unittest
+
+from liblistenbrainz import errors
+from unittest import mock
+
+
+class PlayingNowWatcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = liblistenbrainz.ListenBrainz()
+        self.playing = {}
+        self.client.get_playing_now = mock.MagicMock(side_effect=self._get_playing_now)
+        self.now = 1000.0
+        self.changes = []
+        self.watcher = liblistenbrainz.PlayingNowWatcher(
+            self.client,
+            ['iliekcomputers', 'param'],
+            callback=self.changes.append,
+            min_interval=10,
+            max_interval=300,
+            max_workers=2,
+        )
+        self.watcher._clock = lambda: self.now
+
+    def tearDown(self):
+        self.watcher.close()
+
+    def _get_playing_now(self, username):
+        playing = self.playing.get(username)
+        if isinstance(playing, Exception):
+            raise playing
+        return playing
+
+    def _listen(self, track_name, duration=None):
+        return liblistenbrainz.Listen(
+            track_name=track_name,
+            artist_name="Daft Punk",
+            additional_info={'duration': duration} if duration else None,
+        )
+
+    def test_changes_are_coalesced(self):
+        self.playing['iliekcomputers'] = self._listen("One More Time", duration=320)
+        changes = self.watcher.poll()
+        self.assertEqual([(c.username, c.previous, c.current.track_name) for c in changes], [('iliekcomputers', None, "One More Time")])
+        self.assertEqual(self.changes, changes)
+
+        # the same track, fetched again, is not a change
+        self.now += 300
+        self.playing['iliekcomputers'] = self._listen("One More Time", duration=320)
+        self.assertEqual(self.watcher.poll(), [])
+
+        self.now += 20
+        self.playing['iliekcomputers'] = None
+        changes = self.watcher.poll()
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(changes[0].previous.track_name, "One More Time")
+        self.assertIsNone(changes[0].current)
+        self.assertIsNone(self.watcher.get_playing_now('iliekcomputers'))
+
+    def test_intervals_adapt_to_the_user(self):
+        self.playing['iliekcomputers'] = self._listen("Aerodynamic", duration=212)
+        self.playing['param'] = None
+        self.watcher.poll()
+        self.assertEqual(self.client.get_playing_now.call_count, 2)
+
+        # param is idle so is polled again after the minimum interval, iliekcomputers when the track ends
+        self.now += 10
+        self.watcher.poll()
+        self.client.get_playing_now.assert_called_with('param')
+        self.assertEqual(self.client.get_playing_now.call_count, 3)
+        self.now += 202
+        self.watcher.poll()
+        self.assertEqual(self.client.get_playing_now.call_count, 5)
+
+        # the longer a user is idle, the less often they are polled, up to max_interval
+        self.now += 10 ** 4
+        self.watcher.poll()
+        self.assertEqual(self.watcher._users['param']['next_poll_at'], self.now + 300)
+
+    def test_failures_back_off(self):
+        self.playing['iliekcomputers'] = errors.ListenBrainzAPIException(500)
+        self.watcher.remove_user('param')
+        self.assertEqual(self.watcher.poll(), [])
+        self.assertEqual(self.watcher._users['iliekcomputers']['next_poll_at'], self.now + 20)
+        self.now += 20
+        self.watcher.poll()
+        self.assertEqual(self.watcher._users['iliekcomputers']['next_poll_at'], self.now + 40)
+
+    def test_async_changes(self):
+        self.playing['param'] = self._listen("Digital Love")
+
+        async def first_change():
+            async for change in self.watcher.changes():
+                return change
+
+        change = asyncio.run(first_change())
+        self.assertEqual((change.username, change.current.track_name), ('param', "Digital Love"))